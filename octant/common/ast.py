@@ -263,13 +263,15 @@ class BoolConstant(Expr):
 class IpConstant(Expr):
     """An ip address constant
 
-    :param val: ip address represented as a string
+    :param val: ip address represented as a string. IPv6 addresses are
+        typed as ipv6_address.
     """
 
     # pylint: disable=too-few-public-methods
 
     def __init__(self, val):
-        super(IpConstant, self).__init__(dtype='ip_address')
+        super(IpConstant, self).__init__(
+            dtype='ipv6_address' if ':' in val else 'ip_address')
         self.val = val
 
     def __repr__(self):
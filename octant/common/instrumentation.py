@@ -0,0 +1,112 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Timing of the phases of octant and counters
+
+Phases are timed with the ``phase`` context manager. Both the wall clock
+time and the CPU time of the process are recorded. A phase entered several
+times accumulates its times. Counters are incremented with ``count``.
+
+Hooks registered with ``add_hook`` are called on each event with the kind
+of the event (``'phase'`` or ``'counter'``), its name and its value: a
+dictionary with the ``wall`` and ``cpu`` times of a phase or the increment
+of a counter.
+"""
+
+from collections import OrderedDict
+import contextlib
+import json
+import time
+
+try:
+    cpu_time = time.process_time
+except AttributeError:
+    # Python 2
+    cpu_time = time.clock
+
+
+class Instrumentation(object):
+    """Records phase times and counters"""
+
+    def __init__(self):
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+        self.hooks = []
+
+    def reset(self):
+        """Forgets the recorded values (hooks are kept)"""
+        self.phases = OrderedDict()
+        self.counters = OrderedDict()
+
+    def notify(self, kind, name, value):
+        for hook in self.hooks:
+            hook(kind, name, value)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Times the execution of a block"""
+        start_wall = time.time()
+        start_cpu = cpu_time()
+        try:
+            yield
+        finally:
+            wall = time.time() - start_wall
+            cpu = cpu_time() - start_cpu
+            record = self.phases.setdefault(
+                name, {'wall': 0.0, 'cpu': 0.0, 'calls': 0})
+            record['wall'] += wall
+            record['cpu'] += cpu
+            record['calls'] += 1
+            self.notify('phase', name, {'wall': wall, 'cpu': cpu})
+
+    def count(self, name, value=1):
+        """Increments a counter"""
+        self.counters[name] = self.counters.get(name, 0) + value
+        self.notify('counter', name, value)
+
+    def report(self):
+        """The recorded values as a dictionary"""
+        return {
+            'phases': OrderedDict(
+                (name, dict(record))
+                for name, record in self.phases.items()),
+            'counters': OrderedDict(self.counters)}
+
+    def to_json(self):
+        """The recorded values as a JSON string"""
+        return json.dumps(self.report(), indent=2)
+
+
+#: Instrumentation shared by the whole process
+INSTRUMENTATION = Instrumentation()
+
+phase = INSTRUMENTATION.phase
+count = INSTRUMENTATION.count
+report = INSTRUMENTATION.report
+to_json = INSTRUMENTATION.to_json
+reset = INSTRUMENTATION.reset
+
+
+def add_hook(hook):
+    """Registers a callable called on each event
+
+    :param hook: a callable taking the kind, the name and the value of
+        the event.
+    """
+    INSTRUMENTATION.hooks.append(hook)
+
+
+def remove_hook(hook):
+    """Unregisters a hook"""
+    INSTRUMENTATION.hooks.remove(hook)
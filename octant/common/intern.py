@@ -0,0 +1,296 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Persistent table of interned strings
+
+An intern table gives a stable integer code to each string. Codes are kept
+in a file so that they do not change between runs. The file layout is:
+
+* a header: the magic string ``OCTINTN1`` followed by the number of
+  strings ``n`` and the number of slots ``s`` of the hash table (two little
+  endian unsigned 64 bits integers),
+* the hashes of the ``n`` strings (unsigned 64 bits),
+* ``n + 1`` offsets of the strings in the blob (unsigned 64 bits),
+* the ``s`` slots of an open addressing hash table. A slot contains one
+  plus the code of a string or zero if it is empty (unsigned 32 bits),
+* the blob: the utf-8 encoding of the strings.
+
+The file is memory mapped and never decoded as a whole. Lookups hash the
+string searched and probe the slots. The code 0 is reserved for ``None``.
+The code of the string at index ``i`` in the file is ``i + 1``.
+
+New strings are kept in memory until ``save`` is called. The layout does
+not allow appending in place (the hash table is before the blob): the whole
+file is rewritten in a temporary file with the new strings after the stored
+ones and renamed over the table. Stored strings keep their codes. The hash
+table is rebuilt from the stored hashes, so existing strings are never
+hashed again. The new file keeps the permissions of the file it replaces.
+
+Codes of new strings are provisional until they are saved. If another
+process saved strings in the meantime, the strings of this table are
+stored after them and get new codes. ``save`` reloads the table and gives
+back the codes that changed so that their users can translate them.
+
+Codes are never reused: they grow with the number of strings ever stored
+in the table, not with the number of strings in use.
+"""
+
+import errno
+import fcntl
+import hashlib
+import logging
+import mmap
+import os
+import stat
+import struct
+import tempfile
+
+import six
+
+from octant.common import base
+
+MAGIC = b'OCTINTN1'
+HEADER = struct.Struct('<8sQQ')
+HASH = struct.Struct('<Q')
+OFFSET = struct.Struct('<Q')
+SLOT = struct.Struct('<I')
+NONE_CODE = 0
+
+
+def string_hash(data):
+    """Stable 64 bits hash of an utf-8 encoded string"""
+    return HASH.unpack(hashlib.md5(data).digest()[:HASH.size])[0]
+
+
+def slot_count(count):
+    """Number of slots of the hash table for a number of strings"""
+    slots = 16
+    while slots < 2 * count:
+        slots *= 2
+    return slots
+
+
+def file_mode(filename):
+    """Permissions of a file rewritten through a temporary file
+
+    :return: the permissions of the existing file or, for a new file, the
+        default ones (0666 minus the umask). Temporary files are only
+        readable by their owner.
+    """
+    try:
+        return stat.S_IMODE(os.stat(filename).st_mode)
+    except OSError as exc:
+        if exc.errno != errno.ENOENT:
+            raise
+    umask = os.umask(0)
+    os.umask(umask)
+    return 0o666 & ~umask
+
+
+class InternTable(object):
+    """Stable codes for strings backed by a memory mapped file"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.mapped = None
+        self.fd = None
+        self.count = 0
+        self.slots = 0
+        self.new_codes = {}
+        self.new_values = []
+        self.load()
+
+    def load(self):
+        """Maps the content of the file (if it exists)"""
+        self.close()
+        try:
+            self.fd = open(self.filename, 'rb')
+        except IOError as exc:
+            if exc.errno != errno.ENOENT:
+                raise
+            return
+        size = os.fstat(self.fd.fileno()).st_size
+        if size < HEADER.size:
+            self.close()
+            raise base.Z3SourceError(
+                'Truncated intern table {}'.format(self.filename))
+        self.mapped = mmap.mmap(
+            self.fd.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, self.count, self.slots) = HEADER.unpack_from(self.mapped, 0)
+        if magic != MAGIC:
+            self.close()
+            raise base.Z3SourceError(
+                'Not an intern table: {}'.format(self.filename))
+        self.hashes_pos = HEADER.size
+        self.offsets_pos = self.hashes_pos + HASH.size * self.count
+        self.slots_pos = self.offsets_pos + OFFSET.size * (self.count + 1)
+        self.blob_pos = self.slots_pos + SLOT.size * self.slots
+
+    def close(self):
+        """Unmaps the file. New strings not saved are kept."""
+        if self.mapped is not None:
+            self.mapped.close()
+            self.mapped = None
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+        self.count = 0
+        self.slots = 0
+
+    def __len__(self):
+        """Number of codes (including the one of None)"""
+        return 1 + self.count + len(self.new_values)
+
+    def stored_hash(self, index):
+        return HASH.unpack_from(
+            self.mapped, self.hashes_pos + HASH.size * index)[0]
+
+    def stored_bytes(self, index):
+        pos = self.offsets_pos + OFFSET.size * index
+        start = OFFSET.unpack_from(self.mapped, pos)[0]
+        end = OFFSET.unpack_from(self.mapped, pos + OFFSET.size)[0]
+        return self.mapped[self.blob_pos + start:self.blob_pos + end]
+
+    def find(self, data, hsh):
+        """Index of an encoded string in the file or None"""
+        if self.count == 0:
+            return None
+        mask = self.slots - 1
+        slot = hsh & mask
+        while True:
+            entry = SLOT.unpack_from(
+                self.mapped, self.slots_pos + SLOT.size * slot)[0]
+            if entry == 0:
+                return None
+            index = entry - 1
+            if (self.stored_hash(index) == hsh and
+                    self.stored_bytes(index) == data):
+                return index
+            slot = (slot + 1) & mask
+
+    def code(self, value):
+        """Code of a string. A new code is allocated if necessary."""
+        if value is None:
+            return NONE_CODE
+        code = self.new_codes.get(value, None)
+        if code is not None:
+            return code
+        data = six.text_type(value).encode('utf-8')
+        index = self.find(data, string_hash(data))
+        if index is not None:
+            return index + 1
+        code = len(self)
+        self.new_codes[value] = code
+        self.new_values.append(value)
+        return code
+
+    def value(self, code):
+        """String associated to a code"""
+        if code == NONE_CODE:
+            return None
+        if code <= self.count:
+            return self.stored_bytes(code - 1).decode('utf-8')
+        return self.new_values[code - self.count - 1]
+
+    def items(self):
+        """Iterates over the pairs of strings and codes"""
+        for code in six.moves.range(1, len(self)):
+            yield self.value(code), code
+
+    def save(self):
+        """Writes the new strings in the file
+
+        The file is locked while it is rewritten and the table is then
+        reloaded. If another process saved strings since the file was
+        loaded, the new strings of this table are stored after them and
+        their codes change.
+
+        :return: a dictionary from the codes of new strings that changed to
+            their codes in the file. It is empty if the file was not
+            modified concurrently.
+        """
+        if not self.new_values:
+            return {}
+        with open(self.filename + '.lock', 'w') as lock:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            current = InternTable(self.filename)
+            try:
+                added = []
+                for value in self.new_values:
+                    data = six.text_type(value).encode('utf-8')
+                    hsh = string_hash(data)
+                    if current.find(data, hsh) is None:
+                        added.append((data, hsh))
+                current.write(added)
+            finally:
+                current.close()
+        provisional = self.new_codes
+        self.new_codes = {}
+        self.new_values = []
+        self.load()
+        changed = {}
+        for (value, code) in six.iteritems(provisional):
+            stored = self.code(value)
+            if stored != code:
+                changed[code] = stored
+        if changed:
+            logging.getLogger().warning(
+                "Intern table %s modified concurrently: %d codes changed",
+                self.filename, len(changed))
+        return changed
+
+    def write(self, added):
+        """Rewrites the file with additional encoded strings and hashes"""
+        count = self.count + len(added)
+        slots = slot_count(count)
+        hashes = [self.stored_hash(i) for i in six.moves.range(self.count)]
+        hashes.extend(hsh for (_, hsh) in added)
+        if self.count > 0:
+            old_blob_len = OFFSET.unpack_from(
+                self.mapped,
+                self.offsets_pos + OFFSET.size * self.count)[0]
+            old_blob = self.mapped[
+                self.blob_pos:self.blob_pos + old_blob_len]
+            offsets = [
+                OFFSET.unpack_from(
+                    self.mapped, self.offsets_pos + OFFSET.size * i)[0]
+                for i in six.moves.range(self.count + 1)]
+        else:
+            old_blob = b''
+            offsets = [0]
+        for (data, _) in added:
+            offsets.append(offsets[-1] + len(data))
+        table = [0] * slots
+        mask = slots - 1
+        for (index, hsh) in enumerate(hashes):
+            slot = hsh & mask
+            while table[slot] != 0:
+                slot = (slot + 1) & mask
+            table[slot] = index + 1
+        directory = os.path.dirname(os.path.abspath(self.filename))
+        (handle, tmpname) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            os.fchmod(handle, file_mode(self.filename))
+            with os.fdopen(handle, 'wb') as fd:
+                fd.write(HEADER.pack(MAGIC, count, slots))
+                fd.write(struct.pack('<%dQ' % count, *hashes))
+                fd.write(struct.pack('<%dQ' % (count + 1), *offsets))
+                fd.write(struct.pack('<%dI' % slots, *table))
+                fd.write(old_blob)
+                for (data, _) in added:
+                    fd.write(data)
+            os.rename(tmpname, self.filename)
+        except Exception:
+            os.remove(tmpname)
+            raise
@@ -15,10 +15,13 @@
 """Primitive tables exported from OpenStack for Datalog"""
 import abc
 import ipaddress
+import os
 import six
 import z3
 
 from octant.common import ast
+from octant.common import base
+from octant.common import intern
 
 
 MARSHALLED_NONE = "-*-None-*-"
@@ -26,16 +29,33 @@ MARSHALLED_NONE = "-*-None-*-"
 
 @six.add_metaclass(abc.ABCMeta)
 class Z3Type(object):
-    """Translate Openstack values to Z3"""
+    """Translate Openstack values to Z3
+
+    Values are first encoded as integers with ``to_int``. Z3 bit vectors
+    are only built by ``to_z3`` and kept in a cache of constants. Subclasses
+    must define at least one of the two methods.
+    """
 
     def __init__(self, name, type_instance):
         self.name = name
         self.type_instance = type_instance
+        self.constants = {}
+
+    def to_int(self, val):
+        """Transforms a value from OpenStack in an integer"""
+        return self.to_z3(val).as_long()
 
-    @abc.abstractmethod
     def to_z3(self, val):
         """Transforms a value from OpenStack in a Z3 value"""
-        raise NotImplementedError
+        return self.constant(self.to_int(val))
+
+    def constant(self, code):
+        """The Z3 bit vector of an integer code"""
+        bvect = self.constants.get(code, None)
+        if bvect is None:
+            bvect = z3.BitVecVal(code, self.type_instance)
+            self.constants[code] = bvect
+        return bvect
 
     @abc.abstractmethod
     def to_os(self, val):
@@ -70,10 +90,8 @@ class BoolType(Z3Type):
     def __init__(self):
         super(BoolType, self).__init__('bool', z3.BitVecSort(1))
 
-    def to_z3(self, val):
-        if val:
-            return z3.BitVecVal(1, self.type_instance)
-        return z3.BitVecVal(0, self.type_instance)
+    def to_int(self, val):
+        return 1 if val else 0
 
     def marshall(self, val):
         return str(val)
@@ -86,26 +104,120 @@ class BoolType(Z3Type):
 
 
 class StringType(Z3Type):
-    """Transcode strings in Z3"""
+    """Transcode strings in Z3
+
+    When no size is given, the size of the bit vectors is computed with
+    ``fit`` from the number of codes in use. Until then, the type uses
+    ``DEFAULT_STRING_SIZE`` bits.
+    """
 
     def __init__(self, name, size=16):
+        self.auto = size is None
+        self.fitted = False
+        if self.auto:
+            size = DEFAULT_STRING_SIZE
         super(StringType, self).__init__(name, z3.BitVecSort(size))
+        self.size = size
         self.map = {}
         self.back = {}
+        self.table = None
+
+    def use_table(self, table):
+        """Takes the codes of strings from a persistent intern table"""
+        self.table = table
+        self.map = {}
+        self.back = {}
+        self.constants = {}
+
+    def to_int(self, val):
+        code = self.map.get(val, None)
+        if code is None:
+            if self.table is None:
+                code = len(self.map)
+            else:
+                code = self.table.code(val)
+            if not self.auto:
+                self.check(code)
+            self.map[val] = code
+            self.back[code] = val
+        return code
+
+    def remap(self, codes):
+        """Translates codes changed by the save of the intern table
+
+        :param codes: a dictionary from old codes to new codes
+        """
+        self.map = {
+            val: codes.get(code, code)
+            for (val, code) in six.iteritems(self.map)}
+        self.back = {code: val for (val, code) in six.iteritems(self.map)}
 
     def to_z3(self, val):
-        if val in self.map:
-            return self.map[val]
-        code = len(self.map)
-        bvect = z3.BitVecVal(code, self.type_instance)
-        self.map[val] = bvect
-        self.back[code] = val
-        return bvect
+        if self.fitted and val not in self.map:
+            # Once fitted, all the values of the data have a code. Other
+            # values (constants of queries) share the reserved code.
+            return self.constant(self.reserved())
+        return super(StringType, self).to_z3(val)
+
+    def reserved(self):
+        """The code of values that do not occur in the data
+
+        It is the largest code of the sort and fit keeps it out of the codes
+        in use.
+        """
+        return (1 << self.size) - 1
+
+    def check(self, code):
+        """Checks that a code can be represented with the size of the type"""
+        if code >> self.size:
+            raise base.Z3TypeError(
+                "Too many values for type {} ({} bits)".format(
+                    self.name, self.size))
+
+    def constant(self, code):
+        if self.fitted:
+            self.check(code)
+        return super(StringType, self).constant(code)
+
+    def fit(self):
+        """Sizes the type from the codes in use
+
+        One more bit than necessary is used so that new values can be
+        found later when the data is refreshed. The largest code is reserved
+        for the values of queries that are not in the data. The size
+        only grows once computed. With an intern table, the size depends on
+        the largest code in use, which grows with the number of strings
+        ever stored in the table.
+
+        :return: True if the size changed.
+        """
+        if not self.auto:
+            return False
+        bound = max(self.back) + 1 if self.back else 1
+        size = max(1, (bound - 1).bit_length()) + 1
+        if self.fitted and bound <= self.reserved():
+            return False
+        self.fitted = True
+        if size == self.size:
+            return False
+        self.resize(size)
+        return True
+
+    def unfit(self):
+        """Forgets the size computed by fit"""
+        if self.auto:
+            self.fitted = False
+            self.resize(DEFAULT_STRING_SIZE)
+
+    def resize(self, size):
+        self.size = size
+        self.type_instance = z3.BitVecSort(size)
+        self.constants = {}
 
     def dump(self):
         return (
-            "; {} -> {}\n".format(z3.sexpr(), val)
-            for (val, z3) in six.iteritems(self.map))
+            "; {} -> {}\n".format(self.constant(code).sexpr(), val)
+            for (val, code) in six.iteritems(self.map))
 
     def marshall(self, val):
         return MARSHALLED_NONE if val is None else val
@@ -114,7 +226,10 @@ class StringType(Z3Type):
         return None if val == MARSHALLED_NONE else val
 
     def to_os(self, val):
-        return self.back[val.as_long()]
+        code = val.as_long()
+        if code not in self.back and self.table is not None:
+            return self.table.value(code)
+        return self.back[code]
 
 
 class NumType(Z3Type):
@@ -122,11 +237,10 @@ class NumType(Z3Type):
 
     def __init__(self, name, size=32):
         super(NumType, self).__init__(name, z3.BitVecSort(size))
-        self.map = {}
-        self.back = {}
+        self.mask = (1 << size) - 1
 
-    def to_z3(self, val):
-        return z3.BitVecVal(val, self.type_instance)
+    def to_int(self, val):
+        return int(val) & self.mask
 
     def marshall(self, val):
         return val
@@ -139,14 +253,24 @@ class NumType(Z3Type):
 
 
 class IpAddressType(Z3Type):
-    """Transcode IP address in Z3"""
+    """Transcode IP address in Z3
+
+    IPv6 addresses are not IPv4 addresses and are represented as 0.0.0.0.
+    """
 
     def __init__(self, size=32):
         super(IpAddressType, self).__init__('ipaddress', z3.BitVecSort(size))
-
-    def to_z3(self, val):
-        return z3.BitVecVal(int(ipaddress.ip_address(six.text_type(val))),
-                            self.type_instance)
+        self.mask = (1 << size) - 1
+        self.codes = {}
+
+    def to_int(self, val):
+        # Addresses are parsed once.
+        code = self.codes.get(val, None)
+        if code is None:
+            address = ipaddress.ip_address(six.text_type(val))
+            code = int(address) & self.mask if address.version == 4 else 0
+            self.codes[val] = code
+        return code
 
     def marshall(self, val):
         return val
@@ -158,10 +282,62 @@ class IpAddressType(Z3Type):
         return ipaddress.ip_address(val.as_long()).compressed
 
 
+#: Z3 datalog engine considers bit vectors of 64 bits or more as infinite
+MAX_DATALOG_SIZE = 63
+
+
+class Ipv6AddressType(Z3Type):
+    """Transcode IPv6 address in Z3
+
+    Relations of the Z3 datalog engine cannot use 128 bits bit vectors.
+    The most significant bit of addresses is dropped (it is 0 for global
+    unicast addresses) and only the ``size`` following bits are kept. With
+    the default size, prefixes and masks up to /64 are exact but addresses
+    of the same /64 network are confused. IPv4 addresses are not IPv6
+    addresses and are represented as ``::``.
+    """
+
+    def __init__(self, size=MAX_DATALOG_SIZE):
+        super(Ipv6AddressType, self).__init__(
+            'ipv6address', z3.BitVecSort(size))
+        self.shift = 127 - size
+        self.mask = (1 << size) - 1
+        self.codes = {}
+        # most significant bit of the addresses seen for each code
+        self.top = {}
+
+    def to_int(self, val):
+        code = self.codes.get(val, None)
+        if code is None:
+            address = ipaddress.ip_address(six.text_type(val))
+            if address.version == 6:
+                value = int(address)
+                code = (value >> self.shift) & self.mask
+                self.top.setdefault(code, value >> 127)
+            else:
+                code = 0
+            self.codes[val] = code
+        return code
+
+    def marshall(self, val):
+        return val
+
+    def unmarshall(self, val):
+        return val
+
+    def to_os(self, val):
+        code = val.as_long()
+        return ipaddress.IPv6Address(
+            (self.top.get(code, 0) << 127) | (code << self.shift)).compressed
+
+
+#: Size of string types before they are fitted to their content.
+DEFAULT_STRING_SIZE = 16
+
 TYPES = {
     'bool': BoolType(),
-    'string': StringType('string'),
-    'id': StringType('id'),
+    'string': StringType('string', size=None),
+    'id': StringType('id', size=None),
     'int': NumType('int'),
     'int1': NumType('int1', size=1),
     'int4': NumType('int4', size=4),
@@ -171,11 +347,67 @@ TYPES = {
     'direction': StringType('direction', size=2),
     'status': StringType('status', size=3),
     'ip_address': IpAddressType(),
+    'ipv6_address': Ipv6AddressType(),
     'ip_version': StringType('ip_version', size=2),
     'fw_action': StringType('fw_action', size=2)
 }
 
 
+#: Types whose codes can be kept in persistent intern tables
+INTERNED_TYPES = ['string', 'id']
+
+
+def use_intern_tables(directory):
+    """Uses persistent intern tables for string types
+
+    :param directory: the directory containing one table per type.
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    for name in INTERNED_TYPES:
+        TYPES[name].use_table(intern.InternTable(
+            os.path.join(directory, name + '.intern')))
+
+
+def fit_types():
+    """Sizes the types from their content
+
+    :return: True if the size of a type changed.
+    """
+    changed = False
+    for typ in TYPES.values():
+        if isinstance(typ, StringType) and typ.fit():
+            changed = True
+    return changed
+
+
+def unfit_types():
+    """Gives back their default size to the types sized with fit_types"""
+    for typ in TYPES.values():
+        if isinstance(typ, StringType):
+            typ.unfit()
+
+
+def save_intern_tables():
+    """Stores the new codes of the persistent intern tables
+
+    Types are updated if codes changed because a table was modified by
+    another process.
+
+    :return: a dictionary from the names of the types whose codes changed
+        to a dictionary from their old codes to their new codes.
+    """
+    changed = {}
+    for (name, typ) in six.iteritems(TYPES):
+        table = getattr(typ, 'table', None)
+        if table is not None:
+            codes = table.save()
+            if codes:
+                typ.remap(codes)
+                changed[name] = codes
+    return changed
+
+
 def bits_of_mask(mask):
     """Bit size of a network mask
 
@@ -192,7 +424,8 @@ def bits_of_mask(mask):
 def prefix_of_network(cidr):
     """Returns the prefix of a network in CIDR format
 
-    If cidr is a single address, returns that address.
+    If cidr is a single address, returns that address. Works for both IPv4
+    and IPv6 networks: the result is in the family of the network.
     """
     return (
         u'0.0.0.0' if cidr is None
@@ -203,7 +436,8 @@ def prefix_of_network(cidr):
 def mask_of_network(cidr):
     """Returns the mask of a network in CIDR format
 
-    If cidr is a single address, the mask will be 255.255.255.255
+    If cidr is a single address, the mask will be 255.255.255.255 (or
+    ffff:ffff:ffff:ffff:ffff:ffff:ffff:ffff for IPv6).
     """
     return (
         u'0.0.0.0' if cidr is None
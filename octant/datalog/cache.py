@@ -0,0 +1,154 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""On-disk cache of compiled theories
+
+The result of the front-end analysis of a theory (rewritten rules, typed
+tables, unfolding plan and projection) only depends on the parsed rules of
+the theory, on the tables provided by the datasources and on a few options.
+It is stored in a pickle file named after a hash of all those inputs.
+"""
+
+import hashlib
+import logging
+import os
+import tempfile
+
+from oslo_config import cfg
+from six.moves import cPickle as pickle
+
+from octant.common import ast
+
+#: Changed when the format of the compiled artifacts changes.
+CACHE_VERSION = 2
+
+#: Options changing the result of the compilation
+COMPILATION_OPTIONS = [
+    'doc', 'spec', 'unfold', 'magic', 'ipsize', 'ipv6size']
+
+
+def expr_text(expr):
+    """A text describing an AST expression with its type"""
+    if isinstance(expr, ast.Variable):
+        return '{}:{}'.format(expr.id, expr.type)
+    if isinstance(expr, ast.Operation):
+        return '{}({}):{}'.format(
+            expr.operation, ','.join(expr_text(arg) for arg in expr.args),
+            expr.type)
+    if isinstance(expr, ast.Constant):
+        return '@{}'.format(expr.name)
+    return '{}<{}>:{}'.format(expr.__class__.__name__, expr.val, expr.type)
+
+
+def atom_text(atom):
+    """A text describing an AST atom
+
+    Unlike the representation of atoms, it gives the types of constants.
+    """
+    args = [expr_text(arg) for arg in atom.args]
+    if atom.labels is not None:
+        args = [
+            '{}={}'.format(label, arg)
+            for (label, arg) in zip(atom.labels, args)]
+    return '{}{}({})'.format(
+        '~' if atom.negated else '', atom.table, ','.join(args))
+
+
+def theory_key(rules, datasource, goals=None, adornments=None):
+    """Computes the cache key of a theory
+
+    Rules are hashed without their identifiers which change with each
+    parse.
+
+    :param rules: the AST rules of the theory
+    :param datasource: the datasource defining the extensible tables
+    :param goals: the tables the theory is restricted to (or None)
+    :param adornments: the binding patterns of the queries used for the
+        magic sets rewriting (or None)
+    :return: an hexadecimal digest
+    """
+    digest = hashlib.sha256()
+
+    def add(text):
+        digest.update(text.encode('utf-8'))
+        digest.update(b'\0')
+
+    add('octant-cache-{}'.format(CACHE_VERSION))
+    for option in COMPILATION_OPTIONS:
+        add('{}={}'.format(option, getattr(cfg.CONF, option)))
+    for rule in rules:
+        add('{} :- {}'.format(
+            atom_text(rule.head),
+            ', '.join(
+                atom_text(atom) for atom in rule.body if atom is not None)))
+    for table in sorted(datasource.datasources):
+        fields = datasource.datasources[table].fields
+        add(table)
+        for field in sorted(fields):
+            add('{}:{}'.format(field, fields[field][0]))
+    if goals is not None:
+        add('goals')
+        for table in sorted(goals):
+            add(table)
+    if adornments is not None:
+        add('adornments')
+        for (table, pattern) in adornments:
+            add('{}/{}'.format(table, pattern))
+    return digest.hexdigest()
+
+
+def cache_file(directory, key):
+    """Name of the cache file for a key"""
+    return os.path.join(directory, key + '.pickle')
+
+
+def load(directory, key):
+    """Get the compiled artifacts of a theory
+
+    :param directory: the cache directory
+    :param key: the key of the theory
+    :return: the artifacts stored or None if they are not available.
+    """
+    filename = cache_file(directory, key)
+    if not os.path.exists(filename):
+        return None
+    try:
+        with open(filename, 'rb') as fd:
+            return pickle.load(fd)
+    except Exception as exc:
+        logging.getLogger().warning(
+            "Ignoring unreadable cache file %s: %s", filename, exc)
+        return None
+
+
+def store(directory, key, artifacts):
+    """Stores the compiled artifacts of a theory
+
+    The file is written under a temporary name and then renamed so that
+    concurrent runs never read a partial file.
+
+    :param directory: the cache directory
+    :param key: the key of the theory
+    :param artifacts: a picklable object
+    """
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    (handle, tmpname) = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as fd:
+            pickle.dump(artifacts, fd, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmpname, cache_file(directory, key))
+    except Exception:
+        os.remove(tmpname)
+        raise
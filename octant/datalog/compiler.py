@@ -14,12 +14,17 @@
 
 """Transform an AST describing a theory in a Z3 context"""
 import copy
+import logging
 from six import moves
 
 from oslo_config import cfg
 
 from octant.common import ast
 from octant.common import base
+from octant.common import instrumentation as instr
+from octant.datalog import cache
+from octant.datalog import dependency
+from octant.datalog import magic
 from octant.datalog import operations
 from octant.datalog import projection
 from octant.datalog import typechecker
@@ -29,36 +34,150 @@ from octant.datalog import unfolding
 class Z3Compiler(object):
     """Prepare octant Datalog for compilation to Z3 (extensible tables)."""
 
-    def __init__(self, rules, constants, datasource):
+    def __init__(self, rules, constants, datasource, goals=None,
+                 adornments=None):
+        """Compiler constructor
+
+        :param goals: when given, the tables queried. Only the rules they
+            depend on are kept.
+        :param adornments: when given, the pairs of a queried table and of
+            the binding pattern of its arguments. They are used for the magic
+            sets rewriting if it is enabled.
+        """
+        self.goals = None if goals is None else sorted(goals)
+        self.adornments = (
+            sorted(set(adornments)) if adornments and cfg.CONF.magic
+            else None)
+        self.magic = {}
         self.rules = rules
         self.extensible_tables = {}
         self.var_count = 0
         self.datasource = datasource
+        if goals is not None:
+            self.rules = dependency.relevant_rules(rules, goals)
+            self.report_dropped(rules)
         self.constants = constants
         self.typed_tables = {}
         self.unfold_plan = None
         self.project = None
 
+    def report_dropped(self, rules):
+        """Records the rules and extensible tables not used by the goals
+
+        :param rules: the rules before the restriction to the goals
+        """
+        kept = set(rule.id for rule in self.rules)
+        dropped = [rule for rule in rules if rule.id not in kept]
+        used = set(
+            table for rule in self.rules for table in rule.body_tables())
+        skipped = set(
+            atom.table for rule in dropped for atom in rule.body
+            if self.datasource.is_extensible(atom)) - used
+        instr.count('dropped_rules', len(dropped))
+        instr.count('skipped_tables', len(skipped))
+        if skipped:
+            logging.getLogger().debug(
+                "Tables not retrieved: %s", ", ".join(sorted(skipped)))
+
     def compile(self, z3compiler):
         """Compile preprocess high level Datalog.
 
         It removes constants, make variables unique and
         extract columns used in extensible tables. It also
         controls the type-checker.
+
+        When a cache directory is configured, the result is taken from the
+        cache if the rules, the datasources and the options are unchanged.
         """
+        with instr.phase('compile'):
+            key = None
+            if cfg.CONF.cache is not None:
+                key = cache.theory_key(
+                    self.rules, self.datasource, self.goals,
+                    self.adornments)
+                artifacts = cache.load(cfg.CONF.cache, key)
+                if artifacts is not None:
+                    instr.count('cache_hits')
+                    self.restore_artifacts(artifacts, z3compiler)
+                    return
+            self.analyze(z3compiler)
+            if key is not None:
+                cache.store(cfg.CONF.cache, key, self.artifacts())
+
+    def analyze(self, z3compiler):
+        """Front-end analysis of the theory"""
         self.substitute_constants()
+        if self.adornments is not None:
+            self.magic_sets()
         self.find_base_relations()
-        self.typed_tables = typechecker.type_theory(
-            self.rules, self.extensible_tables, self.datasource)
+        with instr.phase('typecheck'):
+            self.typed_tables = typechecker.type_theory(
+                self.rules, self.extensible_tables, self.datasource)
         if cfg.CONF.doc:
             if cfg.CONF.unfold:
-                unfolder = unfolding.Unfolding(
-                    self.rules, self.extensible_tables, z3compiler)
-                self.unfold_plan = unfolder.proceed()
+                with instr.phase('unfolding'):
+                    unfolder = unfolding.Unfolding(
+                        self.rules, self.extensible_tables, z3compiler)
+                    self.unfold_plan = unfolder.proceed()
             if cfg.CONF.spec:
-                self.project = projection.Projection(
-                    self.rules, self.unfold_plan)
-                self.project.compute()
+                with instr.phase('projection'):
+                    self.project = projection.Projection(
+                        self.rules, self.unfold_plan)
+                    self.project.compute()
+
+    def magic_sets(self):
+        """Rewrites the rules for the queries with bound arguments
+
+        Original rules that are no longer needed by the queries are removed.
+        """
+        (rules, self.magic) = magic.rewrite(self.rules, self.adornments)
+        targets = [
+            self.magic[query][0] if query in self.magic else query[0]
+            for query in self.adornments]
+        self.rules[:] = dependency.relevant_rules(rules, targets)
+
+    def artifacts(self):
+        """The result of the compilation as a picklable dictionary
+
+        The content of ground idb tables is kept as AST constants because
+        the Z3 encoding of strings is not stable across runs.
+        """
+        unfold_plan = self.unfold_plan
+        if unfold_plan is not None:
+            unfold_plan = unfolding.UnfoldPlan(
+                unfold_plan.plan, unfolding.idb_constants(self.rules))
+        return {
+            'rules': self.rules,
+            'extensible_tables': self.extensible_tables,
+            'typed_tables': self.typed_tables,
+            'var_count': self.var_count,
+            'unfold_plan': unfold_plan,
+            'project': self.project,
+            'magic': self.magic,
+        }
+
+    def restore_artifacts(self, artifacts, z3compiler):
+        """Restores the result of a previous compilation
+
+        The list of rules is updated in place as it is shared with the
+        theory.
+        """
+        self.rules[:] = artifacts['rules']
+        self.extensible_tables = artifacts['extensible_tables']
+        self.typed_tables = artifacts['typed_tables']
+        self.var_count = artifacts['var_count']
+        unfold_plan = artifacts['unfold_plan']
+        if unfold_plan is not None:
+            unfold_plan.idb = unfolding.compile_idb(
+                unfold_plan.idb, z3compiler)
+        self.unfold_plan = unfold_plan
+        self.project = artifacts['project']
+        self.magic = artifacts['magic']
+        if self.project is not None:
+            self.project.rules = self.rules
+        # Rules created later must not reuse the identifiers of cached rules.
+        ast.Rule.rule_counter = max(
+            [ast.Rule.rule_counter] + [rule.id + 1 for rule in self.rules])
 
     def substitutes_constants_in_array(self, args):
         """Substitute constants in arguments arrays"""
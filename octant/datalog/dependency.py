@@ -0,0 +1,101 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Dependencies between the tables of a theory
+
+A table depends on the tables used in the body of the rules defining it.
+Only the rules a queried table transitively depends on are needed to
+answer the query. Queries that do not share any intensional table (a table
+defined by rules) can be answered by separate Z3 contexts.
+"""
+
+from collections import OrderedDict
+
+
+def dependency_graph(rules):
+    """Tables used by the rules defining each intensional table
+
+    :param rules: a list of AST rules
+    :return: a dictionary from table names to the set of tables used in
+        the bodies of their rules.
+    """
+    graph = {}
+    for rule in rules:
+        graph.setdefault(rule.head_table(), set()).update(rule.body_tables())
+    return graph
+
+
+def closure(graph, tables):
+    """Tables on which some tables transitively depend
+
+    :param graph: a dependency graph
+    :param tables: an iterable of table names
+    :return: the set of tables reachable from tables (they are included).
+    """
+    reached = set()
+    todo = list(tables)
+    while todo:
+        table = todo.pop()
+        if table in reached:
+            continue
+        reached.add(table)
+        todo.extend(graph.get(table, ()))
+    return reached
+
+
+def relevant_rules(rules, tables):
+    """Rules needed to compute some tables
+
+    :param rules: a list of AST rules
+    :param tables: an iterable of table names
+    :return: the rules defining the tables the given tables depend on, in
+        their original order.
+    """
+    needed = closure(dependency_graph(rules), tables)
+    return [rule for rule in rules if rule.head_table() in needed]
+
+
+def components(rules, tables):
+    """Groups tables that depend on common intensional tables
+
+    Two tables end up in the same group if the intensional tables they
+    depend on intersect. Extensible tables shared by two groups do not merge
+    them.
+
+    :param rules: a list of AST rules
+    :param tables: an iterable of table names
+    :return: a list of sets of table names. Groups are ordered by the first
+        occurrence of one of their tables.
+    """
+    graph = dependency_graph(rules)
+    # each group is a pair of its tables and of the intensional tables
+    # they depend on.
+    groups = []
+    for table in OrderedDict.fromkeys(tables):
+        members = {table}
+        depends = closure(graph, [table]).intersection(graph)
+        kept = []
+        first = None
+        for (pos, (group_members, group_depends)) in enumerate(groups):
+            if (table in group_members or
+                    not group_depends.isdisjoint(depends)):
+                members |= group_members
+                depends |= group_depends
+                first = pos if first is None else first
+            else:
+                kept.append((group_members, group_depends))
+        position = len(kept) if first is None else first
+        kept.insert(position, (members, depends))
+        groups = kept
+    return [members for (members, _) in groups]
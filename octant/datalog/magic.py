@@ -0,0 +1,181 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Magic sets rewriting of rules for queries with constant arguments
+
+An adornment describes which arguments of an atom are bound (``b``) or free
+(``f``). For a query ``p(c, X)`` with adornment ``bf``, each rule defining
+``p`` is copied as a rule of the adorned predicate ``_adorned_bf_p``
+guarded by the magic predicate ``_magic_bf_p`` that contains the values of
+the bound arguments that are actually needed. Body atoms of intensional
+predicates with bound arguments are adorned in turn (sideways information
+passing from left to right) and a magic rule propagates the bindings to
+them. The magic predicate of a query is fed by a seed relation
+``_seed_bf_p`` whose facts are the constants of the queries. They are
+added when the query is asked, so the rewritten program does not depend on
+the value of the constants.
+
+Original rules are kept for the predicates used negatively or without
+bound arguments. Negated atoms never bind variables and always refer to the
+original predicate so that the rewritten program stays stratified.
+"""
+
+import copy
+
+from octant.common import ast
+from octant.datalog import operations
+
+BOUND = 'b'
+FREE = 'f'
+
+GROUND_TYPES = (
+    ast.NumConstant, ast.StringConstant, ast.BoolConstant, ast.IpConstant,
+    ast.Constant)
+
+
+def adornment(args, bound=None):
+    """Binding pattern of the arguments of an atom
+
+    :param args: the arguments of the atom
+    :param bound: the set of variables already bound (None for a query)
+    :return: a string of ``b`` and ``f``
+    """
+    return ''.join(
+        BOUND
+        if (isinstance(arg, GROUND_TYPES) or
+            (bound is not None and isinstance(arg, ast.Variable) and
+             arg in bound))
+        else FREE
+        for arg in args)
+
+
+def adorned_name(table, pattern):
+    return '_adorned_{}_{}'.format(pattern, table)
+
+
+def magic_name(table, pattern):
+    return '_magic_{}_{}'.format(pattern, table)
+
+
+def seed_name(table, pattern):
+    return '_seed_{}_{}'.format(pattern, table)
+
+
+def bound_args(args, pattern):
+    """Copies of the arguments at bound positions"""
+    return [
+        copy.deepcopy(arg)
+        for (arg, mode) in zip(args, pattern) if mode == BOUND]
+
+
+def bound_variables(atom):
+    """Variables bound after a body atom is evaluated"""
+    if atom.negated or operations.is_primitive(atom):
+        return set()
+    return atom.variables()
+
+
+def is_safe(atom, bound):
+    """Checks that an atom can be used when only some variables are bound
+
+    Negated atoms and comparisons do not bind variables. They are kept in
+    magic rules only when all their variables are bound.
+    """
+    if atom.negated or operations.is_primitive(atom):
+        return atom.variables() <= bound
+    return True
+
+
+def rewrite(rules, queries):
+    """Magic sets rewriting
+
+    :param rules: the list of rules (after the substitution of constants)
+    :param queries: a list of pairs of a queried table and its adornment.
+        Queries without bound argument or on a table without rules are
+        ignored.
+    :return: a pair of the new list of rules and a dictionary associating
+        to each pair of a query table and an adornment the pair of the
+        adorned table name to query and of the seed table name.
+    """
+    by_head = {}
+    for rule in rules:
+        by_head.setdefault(rule.head_table(), []).append(rule)
+    new_rules = list(rules)
+    done = set()
+    todo = []
+    entries = {}
+    for (table, pattern) in queries:
+        if BOUND not in pattern or table not in by_head:
+            continue
+        todo.append((table, pattern))
+        entries[(table, pattern)] = (
+            adorned_name(table, pattern), seed_name(table, pattern))
+        variables = [
+            ast.Variable('V%d' % i) for i in range(pattern.count(BOUND))]
+        new_rules.append(ast.Rule(
+            ast.Atom(magic_name(table, pattern), variables),
+            [ast.Atom(
+                seed_name(table, pattern), copy.deepcopy(variables))]))
+    while todo:
+        (table, pattern) = todo.pop()
+        if (table, pattern) in done:
+            continue
+        done.add((table, pattern))
+        for rule in by_head[table]:
+            new_rules.extend(
+                adorn_rule(rule, pattern, by_head, todo))
+    return new_rules, entries
+
+
+def adorn_rule(rule, pattern, idb, todo):
+    """Adorned version of a rule and the magic rules of its body
+
+    :param rule: the original rule
+    :param pattern: the adornment of its head
+    :param idb: the intensional tables (a dictionary or a set)
+    :param todo: list receiving the adorned body predicates to define
+    :return: the list of new rules
+    """
+    table = rule.head_table()
+    head = copy.deepcopy(rule.head)
+    head.table = adorned_name(table, pattern)
+    guard = ast.Atom(
+        magic_name(table, pattern), bound_args(rule.head.args, pattern))
+    bound = set(
+        arg for (arg, mode) in zip(rule.head.args, pattern)
+        if mode == BOUND and isinstance(arg, ast.Variable))
+    prefix = [guard]
+    body = [copy.deepcopy(guard)]
+    result = []
+    for atom in rule.body:
+        new_atom = copy.deepcopy(atom)
+        if (atom.table in idb and not atom.negated and
+                not operations.is_primitive(atom)):
+            sub_pattern = adornment(atom.args, bound)
+            if BOUND in sub_pattern:
+                todo.append((atom.table, sub_pattern))
+                new_atom.table = adorned_name(atom.table, sub_pattern)
+                magic_atom = ast.Atom(
+                    magic_name(atom.table, sub_pattern),
+                    bound_args(atom.args, sub_pattern))
+                # A rule whose head is in its body is useless.
+                if magic_atom not in prefix:
+                    result.append(
+                        ast.Rule(magic_atom, copy.deepcopy(prefix)))
+        body.append(new_atom)
+        if is_safe(atom, bound):
+            prefix.append(copy.deepcopy(new_atom))
+        bound |= bound_variables(atom)
+    result.append(ast.Rule(head, body))
+    return result
@@ -12,19 +12,33 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-"""Primitive operations"""
+"""Primitive operations
+
+Operations and comparisons on bit vector constants are evaluated on Python
+integers. Z3 is only used when an argument is symbolic. Results on
+constants are memoized as the same values occur in many environments after
+unfolding.
+"""
 
 import collections
+import operator
+
+from oslo_config import cfg
+import z3
+
 from octant.datalog import z3_comparison as z3c
 
 Operation = collections.namedtuple(
     'Operation',
-    ['args', 'result', 'ty_vars', 'z3'])
+    ['args', 'result', 'ty_vars', 'z3', 'ground'])
 
 OPERATIONS = {
-    "&": Operation(args=[0, 0], result=0, ty_vars=1, z3=(lambda x, y: x & y)),
-    "|": Operation(args=[0, 0], result=0, ty_vars=1, z3=(lambda x, y: x | y)),
-    "~": Operation(args=[0], result=0, ty_vars=1, z3=(lambda x: ~x))
+    "&": Operation(args=[0, 0], result=0, ty_vars=1, z3=(lambda x, y: x & y),
+                   ground=(lambda size, x, y: x & y)),
+    "|": Operation(args=[0, 0], result=0, ty_vars=1, z3=(lambda x, y: x | y),
+                   ground=(lambda size, x, y: x | y)),
+    "~": Operation(args=[0], result=0, ty_vars=1, z3=(lambda x: ~x),
+                   ground=(lambda size, x: ~x & ((1 << size) - 1)))
 }
 
 COMPARISON = {
@@ -35,7 +49,88 @@ COMPARISON = {
     "<=": (lambda args: z3c.z3_le(args[0], args[1])),
 }
 
+GROUND_COMPARISON = {
+    "=": operator.eq,
+    ">": operator.gt,
+    ">=": operator.ge,
+    "<": operator.lt,
+    "<=": operator.le,
+}
+
+ground_operations = {}
+ground_comparisons = {}
+
+
+def reset():
+    """Reset the memoized results on constants"""
+    global ground_operations
+    global ground_comparisons
+    ground_operations = {}
+    ground_comparisons = {}
+
 
 def is_primitive(atom):
     """Checks if the atom is a primitive predicate"""
     return atom.table in COMPARISON
+
+
+def signed(value, size):
+    """Interprets the integer value of a bit vector as a signed integer"""
+    return value - (1 << size) if value >> (size - 1) else value
+
+
+def ground_values(args):
+    """Values of bit vector constants
+
+    :param args: a list of Z3 expressions
+    :return: the size and the list of integer values of the arguments or
+        None if one of them is not a constant.
+    """
+    if not all(z3c.is_ground(arg) for arg in args):
+        return None
+    return args[0].size(), [arg.as_long() for arg in args]
+
+
+def operation(name, args):
+    """Applies a primitive operation to compiled arguments
+
+    :param name: the name of the operation in OPERATIONS
+    :param args: the list of compiled arguments
+    :return: the Z3 expression of the result
+    """
+    schema = OPERATIONS[name]
+    ground = ground_values(args)
+    if ground is None:
+        return schema.z3(*args)
+    size, values = ground
+    key = (name, size, tuple(values))
+    result = ground_operations.get(key, None)
+    if result is None:
+        result = z3.BitVecVal(schema.ground(size, *values), args[0].sort())
+        ground_operations[key] = result
+    return result
+
+
+def comparison(name, args):
+    """Compiles a primitive comparison of compiled arguments
+
+    :param name: the name of the comparison in COMPARISON
+    :param args: the list of compiled arguments
+    :return: the simplified Z3 formula. It is a Boolean value if all the
+        arguments are constants.
+    """
+    ground = ground_values(args)
+    if ground is None:
+        return z3.simplify(COMPARISON[name](args))
+    size, values = ground
+    # Comparisons to constants of the difference of cubes engine are
+    # unsigned whereas Z3 comparisons of bit vectors are signed.
+    unsigned = bool(cfg.CONF.doc)
+    key = (name, size, tuple(values), unsigned)
+    result = ground_comparisons.get(key, None)
+    if result is None:
+        if not unsigned:
+            values = [signed(value, size) for value in values]
+        result = z3.BoolVal(GROUND_COMPARISON[name](*values))
+        ground_comparisons[key] = result
+    return result
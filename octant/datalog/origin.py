@@ -73,14 +73,17 @@ class UFGround(UFType):
         self.pos = pos
         self.table = table
         self.occurrence = occurrence
+        self.hash = hash((pos, table, occurrence))
 
     def __eq__(self, other):
         return (
-            isinstance(other, self.__class__) and other.pos == self.pos and
-            other.table == self.table and other.occurrence == self.occurrence)
+            other is self or
+            isinstance(other, self.__class__) and other.hash == self.hash and
+            other.pos == self.pos and other.table == self.table and
+            other.occurrence == self.occurrence)
 
     def __hash__(self):
-        return hash((self.pos, self.table, self.occurrence))
+        return self.hash
 
     def __repr__(self):
         return "UFGround(%s,%d,%s)" % (self.table, self.pos, self.occurrence)
@@ -95,12 +98,19 @@ class UFConj(UFType):
     def __init__(self, args):
         #: the members of the conjunct: args. It must be a tuple
         self.args = args
+        #: the members as a set: their order is not significant. The hash
+        #: is computed once as types are compared many times.
+        self.members = frozenset(args)
+        self.hash = hash(self.members)
 
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and other.args == self.args
+        return (
+            other is self or
+            isinstance(other, self.__class__) and other.hash == self.hash and
+            other.members == self.members)
 
     def __hash__(self):
-        return hash(self.args)
+        return self.hash
 
     def __repr__(self):
         return "UFConj%s" % (self.args,)
@@ -115,12 +125,19 @@ class UFDisj(UFType):
     def __init__(self, args):
         #: the members of the disjunct: args. It must be a tuple
         self.args = args
+        #: the members as a set: their order is not significant. The hash
+        #: is computed once as types are compared many times.
+        self.members = frozenset(args)
+        self.hash = hash(self.members)
 
     def __eq__(self, other):
-        return isinstance(other, self.__class__) and other.args == self.args
+        return (
+            other is self or
+            isinstance(other, self.__class__) and other.hash == self.hash and
+            other.members == self.members)
 
     def __hash__(self):
-        return hash(self.args)
+        return self.hash
 
     def __repr__(self):
         return "UFDisj%s" % (self.args,)
@@ -261,7 +278,8 @@ def reduce_disj(l):
 def reduce_conj(l):
     """Conjunct simplification
 
-    First it removes embedded conjunctions.
+    First it removes embedded conjunctions and top (it brings no constraint)
+    unless it is alone.
     If there is at least one ground type in the conjunct, keep all those ground
     types. Otherwise only keep the best of the conjunct and throw away the
     others.
@@ -276,6 +294,8 @@ def reduce_conj(l):
         x
         for e in l
         for x in (e.args if isinstance(e, UFConj) else (e,))}
+    if len(flatset) > 1:
+        flatset.discard(top)
     flat = sorted(flatset, key=weight_type)
     if len(flat) > 1 and is_ground(flat[0]):
         flat = tuple(filter(is_ground, flat))
@@ -303,6 +323,7 @@ class Origin(object):
         self.grounds = {}
         self.table_types = {}
         self.var_types = {}
+        self.wrapped = {}
         self.populate_tables(extensible_tables)
 
     def populate_tables(self, extensible_tables):
@@ -375,17 +396,30 @@ class Origin(object):
             return typ[i] if i < len(typ) else None
         return None
 
-    def type_variables(self):
-        """Builds a variables type from table types.
+    def wrap_type(self, typ, mark):
+        """Memoized version of wrap_type
+
+        Types are rebuilt from the same table types at each iteration. Reusing
+        the wrapped types avoids walking their occurrences again.
+        """
+        key = (typ, mark)
+        wrapped = self.wrapped.get(key, None)
+        if wrapped is None:
+            wrapped = wrap_type(typ, mark)
+            self.wrapped[key] = wrapped
+        return wrapped
+
+    def type_rule_variables(self, rule):
+        """Types the variables of a rule from table types
 
         Several types may be found for each variables as they are constrained
         by multiple tables.
 
-        var_types is updated with a map from variable full ids to types.
+        :return: a map from the full ids of the variables of the rule to
+            their type.
         """
         constraints = [
-            (arg.full_id(), wrap_type(typ_arg, (rule.id, j)))
-            for rule in self.rules                  # iterate over rules
+            (arg.full_id(), self.wrap_type(typ_arg, (rule.id, j)))
             for (j, atom) in enumerate(rule.body)   # iterate over body atoms
             for (i, arg) in enumerate(atom.args)    # iterate over args
             if isinstance(arg, ast.Variable)        # that are variables
@@ -395,8 +429,7 @@ class Origin(object):
             if typ_arg is not None
         ]
         constraints.sort(key=lambda p: p[0])
-
-        self.var_types = {
+        return {
             # The true type would be a conjunction. But we do not want to
             # make the type unduly complex and we just keep the "Best"
             # value restriction proposed so far.
@@ -405,14 +438,26 @@ class Origin(object):
             id: reduce_conj([t for _, t in g])
             for id, g in itertools.groupby(constraints, lambda p: p[0])}
 
-    def type_tables(self):
-        """Builds table types from variable types
+    def type_variables(self):
+        """Builds a variables type from table types.
 
-        Table types are the conjunction of the types found for each rule.
-        :returns: next value of table types.
-        :rtype: map from string to array of type.
+        var_types is updated with a map from variable full ids to types.
+        """
+        self.var_types = {}
+        for rule in self.rules:
+            self.var_types.update(self.type_rule_variables(rule))
+
+    def type_table(self, table, group_rule):
+        """Builds the type of a table from variable types
+
+        The type of an argument is the disjunction of the types found for
+        each rule.
+
+        :param table: the name of the table
+        :param group_rule: the rules defining the table
+        :return: the list of the types of the arguments.
         """
-        def type_arg_at(arg, table, i, id):
+        def type_arg_at(arg, i, id):
             if isinstance(arg, ast.Variable):
                 return self.var_types.get(arg.full_id(), top)
             real = table if id is None else GroundHead(table, id)
@@ -422,15 +467,23 @@ class Origin(object):
             return not any(
                 isinstance(arg, ast.Variable) for arg in rule.head.args)
 
+        return [
+            reduce_disj(set(tlist))
+            for tlist in zip(*(
+                [type_arg_at(arg, i, id)
+                 for i, arg in enumerate(rule.head.args)]
+                for rule in group_rule
+                for id in (None if head_atom_ground(rule) else rule.id,)
+                ))]
+
+    def type_tables(self):
+        """Builds table types from variable types
+
+        :returns: next value of table types.
+        :rtype: map from string to array of type.
+        """
         return {
-            table: [
-                reduce_disj(set(tlist))
-                for tlist in zip(*(
-                    [type_arg_at(arg, table, i, id)
-                     for i, arg in enumerate(rule.head.args)]
-                    for rule in group_rule
-                    for id in (None if head_atom_ground(rule) else rule.id,)
-                    ))]
+            table: self.type_table(table, group_rule)
             for table, group_rule in itertools.groupby(self.rules,
                                                        key=head_table)}
 
@@ -443,13 +496,50 @@ class Origin(object):
         heads. Table types are comparable and the fixpoint is achieved when
         table types do not evolve.
 
+        The computation is incremental but gives the same result as typing
+        all the rules at each iteration: only the rules using a table whose
+        type changed at the previous iteration are typed again and only the
+        tables defined by a rule whose variable types changed are typed
+        again.
+
         It is the type structure that guarantees convergence.
         """
         self.initialize_types()
+        consumers = {}
+        definitions = collections.OrderedDict()
+        for (pos, rule) in enumerate(self.rules):
+            definitions.setdefault(rule.head.table, []).append(rule)
+            for atom in rule.body:
+                consumers.setdefault(atom.table, set()).add(pos)
+        rule_types = {}
+        self.var_types = {}
+        to_type = range(len(self.rules))
         while True:
-            self.type_variables()
-            new_table_types = self.type_tables()
-            if (new_table_types == self.table_types):
+            modified = set()
+            for pos in to_type:
+                rule = self.rules[pos]
+                new_types = self.type_rule_variables(rule)
+                old_types = rule_types.get(pos, None)
+                if new_types != old_types:
+                    for var in (old_types or ()):
+                        del self.var_types[var]
+                    self.var_types.update(new_types)
+                    rule_types[pos] = new_types
+                    modified.add(rule.head.table)
+                elif old_types is None:
+                    rule_types[pos] = new_types
+                    modified.add(rule.head.table)
+            new_table_types = {
+                table: self.type_table(table, definitions[table])
+                for table in modified}
+            changed = [
+                table for (table, typ) in six.iteritems(new_table_types)
+                if typ != self.table_types[table]]
+            if not changed:
                 break
-            self.table_types = new_table_types
+            for table in changed:
+                self.table_types[table] = new_table_types[table]
+            to_type = sorted(set(
+                pos for table in changed
+                for pos in consumers.get(table, ())))
         return self.var_types
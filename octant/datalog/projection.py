@@ -18,6 +18,7 @@ import six
 import z3
 
 from octant.common import ast
+from octant.common import instrumentation as instr
 
 
 def head_table(rule):
@@ -80,6 +81,19 @@ class Projection(object):
         self.count = 0
         self.relations = None
 
+    def __getstate__(self):
+        # Z3 objects cannot be pickled. Relations and specialized
+        # predicates belong to a context and are set again for each one.
+        state = dict(self.__dict__)
+        del state['bool']
+        state['items'] = {}
+        state['relations'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.bool = z3.BoolSort()
+
     def compute(self):
         self.grounded = self.get_partially_ground_preds()
 
@@ -149,6 +163,7 @@ class Projection(object):
         self.count += 1
         pred = z3.Function(pred_name, *pred_typs)
         context.register_relation(pred)
+        instr.count('specialized_predicates')
         row[fixed_args] = pred
         return pred
 
@@ -17,17 +17,23 @@
 from __future__ import print_function
 
 from collections import OrderedDict
+import ctypes
 import logging
+import multiprocessing
 import six
+import time
 from six import moves
 import z3
+from z3 import z3core
 
 from oslo_config import cfg
 
 from octant.common import ast
 from octant.common import base
+from octant.common import instrumentation as instr
 from octant.common import primitives
 from octant.datalog import compiler
+from octant.datalog import magic
 from octant.datalog import operations
 from octant.datalog import unfolding
 from octant.datalog import z3_comparison as z3c
@@ -38,40 +44,336 @@ from octant.source import skydive_source
 from octant.source import source
 
 
+class RecordingContext(object):
+    """Proxy on a fixpoint context recording relations and rules
+
+    The recorded declarations can be replayed on a fresh context that only
+    differs by its facts.
+
+    :param context: the Z3 fixpoint context to forward calls to.
+    """
+
+    def __init__(self, context):
+        self.context = context
+        self.relations = []
+        self.rules = []
+
+    def __getattr__(self, name):
+        return getattr(self.context, name)
+
+    def __str__(self):
+        return str(self.context)
+
+    def register_relation(self, *relations):
+        self.relations.extend(relations)
+        self.context.register_relation(*relations)
+
+    def rule(self, head, body=None, name=None):
+        self.rules.append((head, body, name))
+        self.context.rule(head, body, name)
+
+    def replay(self, context):
+        """Declares the recorded relations and rules in another context"""
+        if self.relations:
+            context.register_relation(*self.relations)
+        for (head, body, name) in self.rules:
+            context.rule(head, body, name)
+
+
+#: Largest size of bit vectors that can be given as raw integers to Z3
+MAX_BULK_SIZE = 32
+
+
+def add_rows(context, relation, rows):
+    """Adds rows of integers as facts of a relation
+
+    Rows are added in order so that answers do not depend on the iteration
+    order of sets.
+
+    :param context: a Z3 fixpoint context
+    :param relation: the relation (a Z3 function declaration)
+    :param rows: an iterable of tuples of integers
+    """
+    sorts = [relation.domain(i) for i in moves.xrange(relation.arity())]
+    if all(z3.is_bv_sort(sort) and sort.size() <= MAX_BULK_SIZE
+           for sort in sorts):
+        add_facts(context, relation, sorted(rows))
+    else:
+        for row in sorted(rows):
+            context.fact(relation(*[
+                z3.BitVecVal(val, sort)
+                for (val, sort) in zip(row, sorts)]))
+
+
+def add_facts(context, relation, rows):
+    """Adds rows of integers as facts of a relation
+
+    The rows are given directly to the Z3 API as arrays of unsigned integers
+    without building a Z3 term for each fact. It is only possible if the
+    arguments of the relation are bit vectors of at most 32 bits.
+
+    :param context: a Z3 fixpoint context
+    :param relation: the relation (a Z3 function declaration)
+    :param rows: an iterable of tuples of integers
+    """
+    arity = relation.arity()
+    row_type = ctypes.c_uint * arity
+    ctx = context.ctx.ref()
+    fixedpoint = context.fixedpoint
+    decl = relation.ast
+    for row in rows:
+        z3core.Z3_fixedpoint_add_fact(
+            ctx, fixedpoint, decl, arity, row_type(*row))
+
+
+#: Theory and queries inherited by the processes forked by query_parallel
+FORKED = {}
+
+#: Errors of workers forwarded to the caller of query_parallel
+FORWARDED_ERRORS = (
+    base.Z3NotWellFormed, base.Z3TypeError, base.Z3SourceError)
+
+
+def query_group(indexes):
+    """Answers a group of queries in a process forked by query_parallel
+
+    :param indexes: positions of the queries in the forked list of atoms.
+    :return: a pair of an error (its class and arguments) or None and the
+        result of query_batch or None.
+    """
+    theory = FORKED['theory']
+    atoms = FORKED['atoms']
+    try:
+        return None, theory.query_batch([atoms[i] for i in indexes])
+    except FORWARDED_ERRORS as exc:
+        return (exc.__class__, exc.args[1:]), None
+
+
+def make_datasource():
+    """Creates a datasource with all the sources registered"""
+    datasource = source.Datasource(primitives.TYPES)
+    openstack_source.register(datasource)
+    skydive_source.register(datasource)
+    file.register(datasource)
+    return datasource
+
+
 class Z3Theory(object):
     """A theory of Z3 rules."""
 
-    def __init__(self, rules):
-        self.rules = rules
-        self.datasource = source.Datasource(primitives.TYPES)
-        openstack_source.register(self.datasource)
-        skydive_source.register(self.datasource)
-        file.register(self.datasource)
-
-        self.compiler = (
-            compiler.Z3Compiler(rules, primitives.CONSTANTS, self.datasource))
+    def __init__(self, rules, goals=None, adornments=None, datasource=None):
+        """Theory constructor
 
-        def constant_compiler(expr):
-            return self.datasource.types[expr.type].to_z3(expr.val)
+        :param rules: the AST rules of the theory
+        :param goals: when given, the only tables that will be queried.
+            Rules they do not depend on are ignored and tables they do not
+            use are not retrieved.
+        :param adornments: the pairs of a table and of a binding pattern
+            (see magic.adornment) of the queries that will be asked. With
+            the magic option, rules are rewritten for those queries.
+        :param datasource: a datasource made by make_datasource shared with
+            other theories. A new one is created when not given.
+        """
+        # Comparison predicates and sizes of types of a previous theory must
+        # not leak in this one
+        z3c.reset()
+        operations.reset()
+        primitives.unfit_types()
+        if datasource is None:
+            datasource = make_datasource()
+        self.datasource = datasource
 
-        self.compiler.compile(constant_compiler)
+        self.compiler = compiler.Z3Compiler(
+            rules, primitives.CONSTANTS, self.datasource, goals, adornments)
+        self.rules = self.compiler.rules
+        self.compiler.compile(self.compile_constant)
         self.relations = {}
+        self.facts = {}
+        self.compiled_rules = None
+        self.context = self.make_context()
 
+    @staticmethod
+    def make_context():
+        """Creates a fresh Z3 fixpoint context configured for octant"""
         context = z3.Fixedpoint()
         z3_config = {"engine": "datalog"}
         if cfg.CONF.doc:
             z3_config["datalog.default_relation"] = "doc"
         context.set(**z3_config)
-        self.context = context
+        return context
+
+    def compile_constant(self, expr):
+        """Compiles an AST constant to Z3"""
+        return self.datasource.types[expr.type].to_z3(expr.val)
 
     def build_theory(self):
         """Builds the Z3 theory"""
+        self.retrieve_data()
         self.build_relations()
         if self.compiler.project is not None:
             self.compiler.project.set_relations(self.relations)
-        self.retrieve_data()
+        self.load_data()
         logging.getLogger().debug("AST of rules:\n%s", self.rules)
-        self.build_rules()
+        with instr.phase('rules'):
+            self.build_rules()
+
+    def refresh(self):
+        """Retrieves the data again and updates the theory with the changes
+
+        :return: the changes as a dictionary associating to each modified
+            table the number of added and removed facts.
+        """
+        self.datasource.retrieved = {}
+        facts = self.fetch_facts()
+        facts = self.remap_facts(facts, primitives.save_intern_tables())
+        return self.ingest(facts)
+
+    def remap_facts(self, facts, changed):
+        """Translates the codes of retrieved rows changed by intern tables
+
+        The rows of shared tables kept by the datasource for the next
+        theories (see retrieve_rows) are translated in place.
+
+        :param facts: a dictionary from table names to sets of rows
+        :param changed: the codes changed for each type name as given by
+            primitives.save_intern_tables
+        :return: the facts with the new codes
+        """
+        if not changed:
+            return facts
+
+        def remap(table_name, fields, rows):
+            """Translates rows of a table restricted to some fields"""
+            types = self.datasource.get_table_types(table_name, fields)
+            codes = [changed.get(type_name, None) for type_name in types]
+            if all(code is None for code in codes):
+                return rows
+            return {
+                tuple(
+                    val if code is None else code.get(val, val)
+                    for (val, code) in zip(row, codes))
+                for row in rows}
+
+        retrieved = self.datasource.retrieved
+        for (table_name, (fields, rows)) in list(six.iteritems(retrieved)):
+            retrieved[table_name] = (
+                fields, remap(table_name, fields, rows))
+        return {
+            table_name: remap(
+                table_name, self.compiler.extensible_tables[table_name],
+                rows)
+            for (table_name, rows) in six.iteritems(facts)}
+
+    def fit_types(self):
+        """Sizes the string types from the values in use
+
+        The constants of the theory are encoded first so that they are
+        counted. Ground idb tables used by the unfolding are compiled again
+        with the new sizes.
+
+        :return: True if the size of a type changed.
+        """
+        def encode(args):
+            for arg in args:
+                if isinstance(arg, ast.StringConstant):
+                    self.datasource.types[arg.type].to_int(arg.val)
+                elif isinstance(arg, ast.Operation):
+                    encode(arg.args)
+
+        for rule in self.rules:
+            encode(rule.head.args)
+            for atom in rule.body:
+                if atom is not None:
+                    encode(atom.args)
+        changed = primitives.fit_types()
+        plan = self.compiler.unfold_plan
+        if plan is not None:
+            plan.idb = unfolding.compile_idb(
+                unfolding.idb_constants(self.rules), self.compile_constant)
+        return changed
+
+    def ingest(self, tables):
+        """Updates the facts of extensible tables
+
+        New rows are compared with the facts last loaded. If facts are only
+        added to tables that are not used to unfold rules, they are added to
+        the current fixpoint context. Otherwise a new context is created
+        with the current facts. The compiled rules are reused unless the
+        unfolding depends on a modified table. Type checking, unfolding
+        plan and projection are never computed again.
+
+        :param tables: a dictionary associating to table names the complete
+            set of their rows. Each row is a tuple of integers (the value of
+            the Z3 bit vectors). Tables not mentioned are unchanged.
+        :return: the changes as a dictionary associating to each modified
+            table the number of added and removed facts.
+        """
+        delta = {}
+        for table_name, rows in six.iteritems(tables):
+            if table_name not in self.compiler.extensible_tables:
+                raise base.Z3NotWellFormed(
+                    "Unknown extensible table {}".format(table_name))
+            rows = set(rows)
+            old_rows = self.facts.get(table_name, set())
+            added = rows - old_rows
+            removed = old_rows - rows
+            if added or removed:
+                delta[table_name] = (added, removed)
+            self.facts[table_name] = rows
+        if not delta:
+            return {}
+        resized = self.fit_types()
+        if resized:
+            # Sorts have changed: relations and rules are compiled again.
+            self.relations = {}
+            self.context = self.make_context()
+            self.build_relations()
+        unfold_changed = (
+            resized or not self.unfold_tables().isdisjoint(delta))
+        if (not unfold_changed and
+                all(not removed for (_, removed) in delta.values())):
+            for table_name, (added, _) in six.iteritems(delta):
+                self.load_facts(table_name, added)
+        else:
+            if not resized:
+                self.context = self.make_context()
+                self.context.register_relation(*self.relations.values())
+            for table_name, rows in six.iteritems(self.facts):
+                self.load_facts(table_name, rows)
+            if unfold_changed or self.compiled_rules is None:
+                if self.compiler.project is not None:
+                    self.compiler.project.set_relations(self.relations)
+                self.build_rules()
+            else:
+                self.compiled_rules.replay(self.context)
+        return {
+            table_name: (len(added), len(removed))
+            for table_name, (added, removed) in six.iteritems(delta)}
+
+    def copy_context(self):
+        """Creates a new context with the facts and the compiled rules
+
+        Queries that declare goal relations or add magic seeds are answered
+        on such a copy so that the program of the theory does not grow.
+        """
+        context = self.make_context()
+        context.register_relation(*self.relations.values())
+        for table_name, rows in six.iteritems(self.facts):
+            add_rows(context, self.relations[table_name], rows)
+        self.compiled_rules.replay(context)
+        return context
+
+    def unfold_tables(self):
+        """Extensible tables whose content drives the unfolding of rules"""
+        plan = self.compiler.unfold_plan
+        if plan is None:
+            return set()
+        return {
+            table
+            for rule_plan in plan.plan.values()
+            for (subplan, _) in rule_plan
+            for (table, _) in subplan
+            if table in self.compiler.extensible_tables}
 
     def build_relations(self):
         """Builds the compiled relations"""
@@ -93,19 +395,76 @@ class Z3Theory(object):
             self.relations[name] = relation
 
     def retrieve_data(self):
-        """Retrieve the network configuration data over the REST api"""
+        """Retrieve the network configuration data over the REST api
+
+        The size of string types is computed from the values retrieved.
+        """
+        with instr.phase('retrieval'):
+            facts = self.fetch_facts()
+            self.facts = self.remap_facts(
+                facts, primitives.save_intern_tables())
+        self.fit_types()
+
+    def load_data(self):
+        """Adds the facts retrieved to the context"""
+        with instr.phase('facts'):
+            for table_name, rows in six.iteritems(self.facts):
+                self.load_facts(table_name, rows)
 
-        # implementation warning: do not define in loop.
-        # Use an explicit closure.
-        def mk_relation(relation):
-            "Builds the Z3 relation"
-            return lambda args: self.context.fact(relation(args))
+    def fetch_facts(self):
+        """Retrieve the rows of the extensible tables
+
+        :return: a dictionary associating to each table name the set of its
+            rows. Rows are tuples of integers.
+        """
+        facts = {}
         with self.datasource:
+            self.datasource.prefetch(
+                [table_name
+                 for table_name in self.compiler.extensible_tables
+                 if table_name not in self.datasource.retrieved],
+                cfg.CONF.workers)
             for table_name, fields in six.iteritems(
                     self.compiler.extensible_tables):
-                relation = self.relations[table_name]
-                self.datasource.retrieve_table(
-                    table_name, fields, mk_relation(relation))
+                with instr.phase('retrieval:' + table_name):
+                    rows = facts[table_name] = self.retrieve_rows(
+                        table_name, fields)
+                instr.count('rows:' + table_name, len(rows))
+        return facts
+
+    def retrieve_rows(self, table_name, fields):
+        """Retrieve the rows of an extensible table
+
+        Tables shared with other theories (see Datasource.share) are
+        retrieved once with all the fields the theories use and kept in the
+        datasource.
+
+        :return: the set of rows. Rows are tuples of integers.
+        """
+        shared = self.datasource.shared.get(table_name, None)
+        retrieved = self.datasource.retrieved.get(table_name, None)
+        if retrieved is None:
+            all_fields = (
+                fields if shared is None
+                else sorted(shared.union(fields)))
+            rows = set()
+            self.datasource.retrieve_table(
+                table_name, all_fields, lambda args: rows.add(tuple(args)),
+                raw=True)
+            if shared is None:
+                return rows
+            retrieved = (all_fields, rows)
+            self.datasource.retrieved[table_name] = retrieved
+        (all_fields, rows) = retrieved
+        if all_fields == fields:
+            return set(rows)
+        positions = [all_fields.index(field) for field in fields]
+        return {tuple(row[pos] for pos in positions) for row in rows}
+
+    def load_facts(self, table_name, rows):
+        """Adds rows as facts of a relation in the current context"""
+        add_rows(self.context, self.relations[table_name], rows)
+        instr.count('facts', len(rows))
 
     def compile_expr(self, variables, expr, env):
         """Compile an expression to Z3"""
@@ -123,21 +482,24 @@ class Z3Theory(object):
             variables[full_id] = var
             return var
         elif isinstance(expr, ast.Operation):
-            operator = operations.OPERATIONS[expr.operation].z3
-            return operator(
-                *(self.compile_expr(variables, arg, env) for arg in expr.args))
+            return operations.operation(
+                expr.operation,
+                [self.compile_expr(variables, arg, env) for arg in expr.args])
         else:
             raise base.Z3NotWellFormed(
                 "cannot proceed with {}".format(expr))
 
-    def compile_atom(self, variables, atom, env):
-        """Compiles an atom to Z3"""
+    def compile_atom(self, variables, atom, env, specialize=True):
+        """Compiles an atom to Z3
+
+        :param specialize: when false, specialized predicates are not used
+            and the atom always refers to the generic relation.
+        """
         args = [self.compile_expr(variables, expr, env) for expr in atom.args]
         if operations.is_primitive(atom):
-            compiled_atom = z3.simplify(
-                operations.COMPARISON[atom.table](args))
+            compiled_atom = operations.comparison(atom.table, args)
         else:
-            if (self.compiler.project is not None and
+            if (specialize and self.compiler.project is not None and
                     self.compiler.project.is_specialized(atom.table)):
                 compiled_atom = self.compiler.project.translate(
                     self.context, atom, args)
@@ -162,27 +524,179 @@ class Z3Theory(object):
             term1 if vars == {}
             else z3.ForAll(list(vars.values()), term1))
         self.context.rule(term2)
+        instr.count('rules')
+
+    def compile_template_atom(self, variables, atom, placeholders):
+        """Compiles an atom with placeholders for the variables of environments
+
+        :param variables: the Z3 constants of the other variables
+        :param atom: the AST atom
+        :param placeholders: a dictionary from full ids of variables bound by
+            environments to the Z3 constants standing for their values
+        :return: the compiled atom if it can be instantiated by substitution.
+            Otherwise a function giving back the compiled atom for an
+            environment.
+        """
+        bound = sorted(
+            var.full_id() for var in atom.variables()
+            if var.full_id() in placeholders)
+        specialized = (
+            self.compiler.project is not None and
+            self.compiler.project.is_specialized(atom.table))
+        primitive = operations.is_primitive(atom)
+        if not bound or not (primitive or specialized):
+            return self.compile_atom(variables, atom, placeholders)
+        # Other variables are compiled once.
+        for expr in atom.args:
+            self.compile_expr(variables, expr, placeholders)
+
+        def instantiate(env):
+            # Comparisons with constants and specialized relations depend
+            # on the values of the arguments.
+            compiled_args = [
+                self.compile_expr(variables, expr, env) for expr in atom.args]
+            if primitive:
+                compiled_atom = operations.comparison(
+                    atom.table, compiled_args)
+            else:
+                compiled_atom = self.compiler.project.translate(
+                    self.context, atom, compiled_args)
+            return z3.Not(compiled_atom) if atom.negated else compiled_atom
+
+        if specialized:
+            return instantiate
+        # The same values occur in many environments.
+        compiled = {}
+
+        def instantiate_cached(env):
+            values = [env[full_id] for full_id in bound]
+            key = tuple(value.get_id() for value in values)
+            entry = compiled.get(key, None)
+            if entry is None:
+                # Values are kept so that their ids are not reused.
+                entry = (values, instantiate(env))
+                compiled[key] = entry
+            return entry[1]
+        return instantiate_cached
+
+    def build_rule_template(self, rule, full_ids):
+        """Compiles a rule once for environments binding some variables
+
+        Variables bound by environments are compiled as placeholder constants.
+        Atoms whose compilation depends on values are compiled for each
+        environment and also represented by placeholders. The compiled rule
+        is then instantiated by a single substitution of all placeholders.
+
+        :param rule: the AST rule
+        :param full_ids: the full ids bound by environments. Environments
+            may also bind ids that are not variables of the rule. They are
+            ignored.
+        :return: a function adding the rule to the context for an environment
+        """
+        placeholders = {
+            var.full_id(): z3.Const(
+                "_env_%s" % var.id, self.datasource.types[var.type].type())
+            for atom in [rule.head] + rule.body
+            if atom is not None
+            for var in atom.variables()
+            if var.full_id() in full_ids}
+        full_ids = sorted(placeholders)
+        vars = {}
+        atoms = [
+            self.compile_template_atom(vars, atom, placeholders)
+            for atom in [rule.head] + rule.body
+            if atom is not None]
+        if any(z3.is_false(at) for at in atoms if not callable(at)):
+            return lambda env: None
+        atoms = [at for at in atoms if callable(at) or not z3.is_true(at)]
+        dynamic = [
+            (pos, z3.Bool("_atom_%d" % pos))
+            for (pos, at) in enumerate(atoms) if callable(at)]
+        compiled = [at for at in atoms]
+        for (pos, placeholder) in dynamic:
+            compiled[pos] = placeholder
+        # The arrays only hold pointers: the Z3 objects are kept alive by
+        # the closure.
+        source_exprs = [placeholders[full_id] for full_id in full_ids] + [
+            placeholder for (_, placeholder) in dynamic]
+        sources = (z3.Ast * len(source_exprs))(
+            *[source.as_ast() for source in source_exprs])
+        # Values of atoms may contain variables of the rule. They are
+        # quantified after the substitution.
+        var_exprs = list(vars.values())
+        bound_vars = (z3.Ast * len(var_exprs))(
+            *[var.as_ast() for var in var_exprs])
+        terms = {}
+
+        def term(dropped):
+            """The body of the rule without the atoms found true"""
+            head = compiled[0]
+            body = [
+                at for (pos, at) in enumerate(compiled)
+                if pos > 0 and pos not in dropped]
+            body_conj = body[0] if len(body) == 1 else z3.And(*body)
+            return head if body == [] else z3.Implies(body_conj, head)
+
+        def instantiate(env):
+            values = [atoms[pos](env) for (pos, _) in dynamic]
+            if any(z3.is_false(value) for value in values):
+                return
+            dropped = frozenset(
+                pos for ((pos, _), value) in zip(dynamic, values)
+                if z3.is_true(value))
+            template = terms.get(dropped, None)
+            if template is None:
+                template = term(dropped)
+                terms[dropped] = template
+            target_exprs = [env[full_id] for full_id in full_ids] + values
+            targets = (z3.Ast * len(target_exprs))(
+                *[target.as_ast() for target in target_exprs])
+            ctx = template.ctx
+            rule_term = z3.BoolRef(z3core.Z3_substitute(
+                ctx.ref(), template.as_ast(), len(source_exprs), sources,
+                targets), ctx)
+            if var_exprs:
+                rule_term = z3.BoolRef(z3core.Z3_mk_forall_const(
+                    ctx.ref(), 1, len(var_exprs), bound_vars, 0, None,
+                    rule_term.as_ast()), ctx)
+            self.context.rule(rule_term)
+            instr.count('rules')
+        return instantiate
 
     def build_rules(self):
         """Compiles rules to Z3"""
         if self.compiler.unfold_plan is not None:
             plan = self.compiler.unfold_plan
-            env = unfolding.plan_to_program(
-                plan, self.context, self.datasource,
-                self.relations, self.rules)
+            env = unfolding.plan_environments(
+                plan, self.facts, self.datasource, self.rules)
         else:
             env = {}
-        for rule in self.rules:
-            env_rule = env.get(rule.id, None)
-            if env_rule is not None:
-                for rec in env_rule:
-                    self.build_rule(rule, rec)
-            else:
-                self.build_rule(rule, {})
-        z3c.register(self.context)
-        logging.getLogger().debug("Compiled rules:\n%s", self.context)
-        if self.compiler.project is not None:
-            self.compiler.project.reconciliate(self.context)
+        # Rules are recorded so that they can be replayed on a new context
+        # when facts are retracted.
+        context = self.context
+        self.context = RecordingContext(context)
+        try:
+            for rule in self.rules:
+                env_rule = env.get(rule.id, None)
+                if env_rule is not None:
+                    templates = {}
+                    for rec in env_rule:
+                        full_ids = frozenset(rec)
+                        template = templates.get(full_ids, None)
+                        if template is None:
+                            template = self.build_rule_template(
+                                rule, full_ids)
+                            templates[full_ids] = template
+                        template(rec)
+                else:
+                    self.build_rule(rule, {})
+            z3c.register(self.context)
+            logging.getLogger().debug("Compiled rules:\n%s", self.context)
+            if self.compiler.project is not None:
+                self.compiler.project.reconciliate(self.context)
+        finally:
+            self.compiled_rules = self.context
+            self.context = context
         if cfg.CONF.smt2 is not None:
             with open(cfg.CONF.smt2, 'w') as fd:
                 self.dump_primitive_tables(fd)
@@ -195,31 +709,157 @@ class Z3Theory(object):
                 self.compiler.extensible_tables):
             fd.write("; {}({})\n".format(table_name, ",".join(fields)))
 
-    def query(self, atom):
-        """Query a relation on the compiled theory"""
+    def prepare_query(self, atom, context):
+        """Types a query atom and compiles it to Z3
+
+        If the rules were rewritten with magic sets for the binding pattern
+        of the query, the adorned relation is queried and the constants of
+        the query are added as facts of its seed relation.
+
+        :param atom: the query as an AST atom
+        :param context: the context receiving the seed facts. It should be
+            a copy made by copy_context.
+        :return: a tuple of the list of AST variables of the query (without
+            repetition), the list of the corresponding Z3 constants and the
+            compiled atom.
+        """
         self.compiler.substitutes_constants_in_array(atom.args)
-        if atom.table not in self.compiler.typed_tables:
+        pattern = magic.adornment(atom.args)
+        (table, seed) = self.compiler.magic.get(
+            (atom.table, pattern), (atom.table, None))
+        if table not in self.compiler.typed_tables:
             raise base.Z3NotWellFormed(
                 "Unknown relation {}".format(atom.table))
-        atom.types = self.compiler.typed_tables[atom.table]
+        atom.types = self.compiler.typed_tables[table]
         if len(atom.types) != len(atom.args):
             raise base.Z3NotWellFormed(
                 "Arity of predicate inconsistency in {}".format(atom))
         for i in moves.xrange(len(atom.types)):
             atom.args[i].type = atom.types[i]
+        if seed is not None:
+            context.fact(self.relations[seed](*[
+                self.compile_expr({}, arg, {})
+                for arg in magic.bound_args(atom.args, pattern)]))
+            atom = ast.Atom(table, atom.args)
         ast_vars = list(OrderedDict.fromkeys([
             arg for arg in atom.args if isinstance(arg, ast.Variable)
         ]))
         vars = {}
-        self.compiler.project = None
-        query = self.compile_atom(vars, atom, {})
-        if vars != {}:
-            compiled_vars = [vars[ast_var.full_id()] for ast_var in ast_vars]
-            query = z3.Exists(compiled_vars, query)
-        self.context.query(query)
+        query = self.compile_atom(vars, atom, {}, specialize=False)
+        compiled_vars = [vars[ast_var.full_id()] for ast_var in ast_vars]
+        return ast_vars, compiled_vars, query
+
+    def decode_answer(self, ast_vars, raw_answer):
+        """Translates a Z3 answer back to octant values"""
         types = [self.datasource.types[ast_var.type] for ast_var in ast_vars]
         variables = [ast_var.id for ast_var in ast_vars]
-        raw_answer = self.context.get_answer()
         logging.getLogger().debug("Raw answer:\n%s", raw_answer)
         answer = z3r.z3_to_array(raw_answer, types)
         return variables, answer
+
+    def query(self, atom):
+        """Query a relation on the compiled theory
+
+        With magic sets, the query is answered on a copy of the context that
+        receives its seed facts.
+        """
+        context = self.copy_context() if self.compiler.magic else self.context
+        ast_vars, compiled_vars, query = self.prepare_query(atom, context)
+        if compiled_vars != []:
+            query = z3.Exists(compiled_vars, query)
+        with instr.phase('query:' + atom.table):
+            context.query(query)
+            raw_answer = context.get_answer()
+        with instr.phase('decode:' + atom.table):
+            return self.decode_answer(ast_vars, raw_answer)
+
+    def query_batch(self, atoms):
+        """Answers several queries with a single saturation
+
+        Each query is defined as a goal relation whose arguments are the
+        variables of the query. All the goal relations are queried at once
+        so that the relations they share are computed only once. The answer
+        is then split back per query. Goal relations and magic seeds are
+        declared on a copy of the context (see copy_context): the theory
+        does not grow with the number of queries answered.
+
+        :param atoms: a list of queries as AST atoms
+        :return: a pair of the time spent in the saturation and the list of
+            results. Each result is a triple of the variable names, the
+            answer and the time spent decoding it.
+        """
+        if atoms == []:
+            return 0.0, []
+        context = self.copy_context()
+        goals = []
+        prepared = []
+        for (index, atom) in enumerate(atoms):
+            ast_vars, compiled_vars, query = self.prepare_query(atom, context)
+            param_types = [var.sort() for var in compiled_vars]
+            param_types.append(z3.BoolSort())
+            goal = z3.Function("_query_%d" % index, *param_types)
+            context.register_relation(goal)
+            rule = z3.Implies(query, goal(*compiled_vars))
+            if compiled_vars != []:
+                rule = z3.ForAll(compiled_vars, rule)
+            context.rule(rule)
+            goals.append(goal)
+            prepared.append(ast_vars)
+        start = time.time()
+        with instr.phase('saturation'):
+            context.query(*goals)
+            raw_answer = context.get_answer()
+        saturation_time = time.time() - start
+        raw_answers = z3r.split_answer(raw_answer, len(goals))
+        results = []
+        for (atom, ast_vars, raw) in zip(atoms, prepared, raw_answers):
+            start = time.time()
+            with instr.phase('decode:' + atom.table):
+                variables, answer = self.decode_answer(ast_vars, raw)
+            results.append((variables, answer, time.time() - start))
+        return saturation_time, results
+
+    def query_parallel(self, atoms, jobs):
+        """Answers queries in parallel in forked processes
+
+        The theory is built once. Worker processes are then forked and
+        inherit its Z3 context. Queries are spread over the workers and each
+        worker answers its share with query_batch. Results are given back
+        in the order of the queries.
+
+        :param atoms: a list of queries as AST atoms
+        :param jobs: the number of worker processes
+        :return: the same result as query_batch. The time given for the
+            saturation is the wall clock time of the parallel evaluation.
+        """
+        jobs = min(jobs, len(atoms))
+        if jobs <= 1:
+            return self.query_batch(atoms)
+        groups = [
+            list(moves.xrange(i, len(atoms), jobs))
+            for i in moves.xrange(jobs)]
+        get_context = getattr(multiprocessing, 'get_context', None)
+        # Workers must share the state of this process: they are forked.
+        mp = multiprocessing if get_context is None else get_context('fork')
+        FORKED['theory'] = self
+        FORKED['atoms'] = atoms
+        start = time.time()
+        try:
+            with instr.phase('saturation'):
+                pool = mp.Pool(jobs)
+                try:
+                    outcomes = pool.map(query_group, groups, chunksize=1)
+                finally:
+                    pool.close()
+                    pool.join()
+        finally:
+            FORKED.clear()
+        saturation_time = time.time() - start
+        results = [None] * len(atoms)
+        for (group, (error, outcome)) in zip(groups, outcomes):
+            if error is not None:
+                (error_class, args) = error
+                raise error_class(*args)
+            for (index, result) in zip(group, outcome[1]):
+                results[index] = result
+        return saturation_time, results
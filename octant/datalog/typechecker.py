@@ -13,6 +13,8 @@
 #    under the License.
 
 """Type-checker for Datalog"""
+import collections
+import itertools
 import logging
 from six import moves
 
@@ -188,14 +190,35 @@ def type_theory(rules, extensible_tables, datasource):
                 work_done = True
         return work_done
     dict_tables = prepare_typing()
-    work_done = True
-    while work_done:
-        work_done = False
-        for rule in rules:
-            new_work = type_atom(rule.head)
-            work_done = work_done or new_work
-            for atom in rule.body:
-                new_work = type_atom(atom)
-                work_done = work_done or new_work
+    atoms = [
+        atom
+        for rule in rules
+        for atom in [rule.head] + rule.body]
+    # Atoms sharing a type slot: a column of a table or a variable.
+    users = {}
+    slots = []
+    for (pos, atom) in enumerate(atoms):
+        atom_slots = [
+            ('var', var.full_id())
+            for arg in atom.args for var in arg.variables()]
+        if not operations.is_primitive(atom):
+            atom_slots.append(('table', atom.table))
+        slots.append(atom_slots)
+        for slot in atom_slots:
+            users.setdefault(slot, []).append(pos)
+    # Worklist of atoms to type, in the order of the program. An atom is
+    # typed again only when a slot it shares with a modified atom changed.
+    pending = collections.deque(moves.range(len(atoms)))
+    queued = [True] * len(atoms)
+    while pending:
+        pos = pending.popleft()
+        queued[pos] = False
+        if not type_atom(atoms[pos]):
+            continue
+        for other in itertools.chain(
+                [pos], (user for slot in slots[pos] for user in users[slot])):
+            if not queued[other]:
+                queued[other] = True
+                pending.append(other)
     logging.getLogger().debug("Infered types:\n%s", dict_tables)
     return dict_tables
@@ -18,12 +18,10 @@ from collections import namedtuple
 import itertools
 import logging
 import six
-import z3
 
 from octant.common import ast
 from octant.datalog import operations
 from octant.datalog import origin
-from octant.datalog import z3_result
 
 
 loc_type = namedtuple("loc_type", ["type", "occ"])
@@ -109,117 +107,133 @@ def candidates(problems):
     return {var for (vl, _) in problems for var in vl}
 
 
-def plan_to_program(unfold_plan, context, datasource, relations, rules):
-    """Extracts the specialization environment
+def plan_environments(unfold_plan, facts, datasource, rules):
+    """Computes the specialization environments without Z3
 
-    Transform a plan into a program and executes the program to extract
-    a list of potential environments for each rule.
+    Each step of the plan of a rule is the union of projections of tables.
+    Steps are joined on their common variables with hash joins. Tables are
+    either extensible tables whose rows are taken from the retrieved facts,
+    ground idb tables or ground heads of rules.
 
     :param unfold_plan: the plan to execute
-    :param context: a compilation context for Z3
+    :param facts: a dictionary from extensible table names to their rows.
+        Rows are tuples of integers.
     :param datasource: the datasource for constant compilation
-    :param relations: A dictionary from table name to z3 function
     :param rules: all the rules
-    :returns: a dictionary for each rule id the list of potential
+    :returns: a dictionary associating to each rule id an iterator on its
         environments. Each environment associates full id of expanded
-        variable to their value.
+        variables to their value. Environments are computed as they are
+        consumed.
     """
-    debug = logging.getLogger().debug
-    z3bool = z3.BoolSort()
-
-    def mk_type(typ):
-        return datasource.types[typ].type()
-
-    def mk_pred(name, avars):
-        param_types = [mk_type(var.type) for var in avars]
-        param_types.append(z3bool)
-        relation = z3.Function(name, *param_types)
-        context.register_relation(relation)
-        return relation
-
-    def comp_constant(expr):
-        return datasource.types[expr.type].to_z3(expr.val)
-
-    result = {}
-    idb = unfold_plan.idb
-    needed = {}
-
-    for rule in rules:
-        rid = rule.id
-        plan = unfold_plan.plan.get(rid, None)
-        if plan is None:
-            continue
-        debug("Generating rules for %s" % rule)
-        used_vars = list({var for (_, varlist) in plan for var in varlist})
-        used_vars.sort(key=lambda v: v.full_id())
-        name = "_env_%d" % rid
-        main_pred = mk_pred(name, used_vars)
-        main_pred_body = []
-        for (i, (subplan, subvars)) in enumerate(plan):
-            # TODO(pc) may be we can avoid this predicate if there is only one
-            # level. But we need to take care of the variable order.
-            # Defereed for later optimization.
-            subname = "_env_%d_%d" % (rid, i)
-            subpred = mk_pred(subname, subvars)
-            main_pred_body.append((subpred, subvars))
-            for (table, positions) in subplan:
-                if isinstance(table, origin.GroundHead):
-                    rid = table.rid
-                    rule = next(rule for rule in rules if rule.id == rid)
-                    head_args = rule.head.args
-                    args = [comp_constant(head_args[pos]) for pos in positions]
-                    rule = subpred(*args)
-                else:
-                    if table in idb:
-                        pred_table = needed.get(table, None)
-                        if pred_table is None:
-                            back_table = relations[table]
-                            argtyps = [
-                                back_table.domain(i)
-                                for i in range(back_table.arity())]
-                            argtyps.append(z3bool)
-                            gname = "_ground_%s" % table
-                            pred_table = z3.Function(gname, *argtyps)
-                            context.register_relation(pred_table)
-                            # Now we have a declared name for it.
-                            needed[table] = pred_table
-                            # We inject the ground idb content.
-                            for row in idb[table]:
-                                context.rule(pred_table(*row))
-                    else:
-                        pred_table = relations[table]
-                    pred_args = [
-                        z3.Const("V%d" % i, pred_table.domain(i))
-                        for i in range(pred_table.arity())]
-                    head_args = [pred_args[pos] for pos in positions]
-                    rule = z3.ForAll(
-                        pred_args,
-                        z3.Implies(
-                            pred_table(*pred_args), subpred(*head_args)))
-                debug("  Subrule: %s " % rule)
-                context.rule(rule)
-        env = {
-            var: z3.Const(var.id, mk_type(var.type)) for var in used_vars
-        }
-        row = [env[var] for var in used_vars]
-        head = main_pred(*row)
-        body = [
-            pred(*[env[var] for var in predvars])
-            for (pred, predvars) in main_pred_body
+    by_id = {rule.id: rule for rule in rules}
+    idb = {
+        table: [tuple(val.as_long() for val in row) for row in rows]
+        for table, rows in six.iteritems(unfold_plan.idb)}
+
+    def table_rows(table):
+        if isinstance(table, origin.GroundHead):
+            return [tuple(
+                datasource.types[arg.type].to_int(arg.val)
+                for arg in by_id[table.rid].head.args)]
+        if table in idb:
+            return idb[table]
+        return facts.get(table, ())
+
+    def step_index(subplan, subvars, bound):
+        """Hash table of the values of a step keyed by the bound variables
+
+        :param bound: a dictionary from the variables bound by the previous
+            steps to their position in a row.
+        :return: the list of positions in a row of the key and the hash
+            table from keys to the list of new values.
+        """
+        key = []
+        local = {}
+        equal = []
+        new = []
+        for (i, var) in enumerate(subvars):
+            if var in bound:
+                key.append((i, bound[var]))
+            elif var in local:
+                equal.append((i, local[var]))
+            else:
+                local[var] = i
+                new.append(i)
+        values = {
+            tuple(row[pos] for pos in positions)
+            for (table, positions) in subplan
+            for row in table_rows(table)}
+        index = {}
+        for value in sorted(values):
+            if all(value[i] == value[j] for (i, j) in equal):
+                index.setdefault(
+                    tuple(value[i] for (i, _) in key), []).append(
+                        tuple(value[i] for i in new))
+        for i in new:
+            bound[subvars[i]] = len(bound)
+        return [j for (_, j) in key], index
+
+    def environments(plan):
+        bound = {}
+        steps = [
+            step_index(subplan, subvars, bound)
+            for (subplan, subvars) in plan]
+        variables = sorted(bound, key=lambda var: bound[var])
+        compilers = [datasource.types[var.type].constant for var in variables]
+        full_ids = [var.full_id() for var in variables]
+
+        def expand(level, row):
+            if level == len(steps):
+                yield {
+                    full_id: compiler(val)
+                    for (full_id, compiler, val) in zip(
+                        full_ids, compilers, row)}
+                return
+            (key, index) = steps[level]
+            for values in index.get(tuple(row[j] for j in key), ()):
+                for env in expand(level + 1, row + values):
+                    yield env
+        return expand(0, ())
+
+    return {
+        rid: environments(plan)
+        for (rid, plan) in six.iteritems(unfold_plan.plan)}
+
+
+def idb_constants(rules):
+    """Enumerates the ground idb tables as AST constants
+
+    :param rules: the rules of the theory
+    :return: a map from tablenames to arrays of records. Records contain
+             AST constants.
+    """
+    grouped_rules = {
+        headname: list(group)
+        for (headname, group) in itertools.groupby(
+            sorted(rules, key=origin.head_table), key=origin.head_table)
+    }
+    return {
+        table: [
+            list(args)
+            for rule in group
+            for args in (rule.head.args,)
+            if all(not isinstance(arg, ast.Variable) for arg in args)
         ]
-        debug("-" * 80)
-        mainrule = z3.ForAll(row, z3.Implies(z3.And(body), head))
-        debug(mainrule)
-        context.rule(mainrule)
-        query = z3.Exists(row, head)
-        context.query(query)
-        raw_answer = context.get_answer()
-        used_varsid = [var.full_id() for var in used_vars]
-        records = z3_result.z3_to_array_simple(raw_answer, used_varsid)
-        debug("Found %d records" % len(records))
-        result[rid] = records
-        debug("=" * 80)
-    return result
+        for table, group in grouped_rules.items()
+    }
+
+
+def compile_idb(idb, compiler):
+    """Compiles the records of ground idb tables
+
+    :param idb: a map from tablenames to arrays of records of AST constants
+    :param compiler: a compiler of constants to Z3
+    :return: the same map with compiled values.
+    """
+    return {
+        table: [[compiler(arg) for arg in row] for row in rows]
+        for table, rows in six.iteritems(idb)
+    }
 
 
 class Unfolding(object):
@@ -332,21 +346,7 @@ class Unfolding(object):
                  compiled values.
         :rtype: dictionnary
         """
-        grouped_rules = {
-            headname: list(group)
-            for (headname, group) in itertools.groupby(
-                self.rules, key=origin.head_table)
-        }
-        idb = {
-            table: [
-                [self.compiler(arg) for arg in args]
-                for rule in group
-                for args in (rule.head.args,)
-                if all(not isinstance(arg, ast.Variable) for arg in args)
-            ]
-            for table, group in grouped_rules.items()
-        }
-        return idb
+        return compile_idb(idb_constants(self.rules), self.compiler)
 
     def strategy(self, var_types):
         """Computes a strategy to unfold.
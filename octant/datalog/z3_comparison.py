@@ -18,6 +18,8 @@ import z3
 
 from oslo_config import cfg
 
+from octant.common import instrumentation as instr
+
 inferior_to = {}
 superior_to = {}
 
@@ -62,6 +64,8 @@ def register(context):
         register_define(context, n, s, f, True)
     for ((n, s), f) in six.iteritems(superior_to):
         register_define(context, n, s, f, False)
+    instr.count('inf_predicates', len(inferior_to))
+    instr.count('sup_predicates', len(superior_to))
 
 
 def is_ground(v):
@@ -209,6 +209,26 @@ def z3_to_array(expr, types):
         raise base.Z3NotWellFormed("Bad result {}: {}".format(expr, kind))
 
 
+def split_answer(expr, count):
+    """Splits the answer of a query on several relations
+
+    Z3 gives back the conjunction of the answers for each relation in the
+    order of the query, or false if all the relations are empty.
+
+    :param expr: the answer of the query
+    :param count: the number of relations queried
+    :return: the list of the answers for each relation
+    """
+    if count == 1:
+        return [expr]
+    if z3.is_false(expr):
+        return [expr] * count
+    if not z3.is_and(expr) or expr.num_args() != count:
+        raise base.Z3NotWellFormed(
+            "Bad result for {} relations: {}".format(count, expr))
+    return expr.children()
+
+
 def z3_to_array_simple(expr, vars):
     def extract_eq(expr):
         kind = expr.decl().kind()
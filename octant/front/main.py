@@ -17,17 +17,20 @@
 import logging
 import sys
 import textwrap
-import time
 
 
 from oslo_config import cfg
 
 from octant.common import base
+from octant.common import instrumentation as instr
 from octant.common import primitives
+from octant.datalog import dependency
+from octant.datalog import magic
 from octant.datalog import theory as datalog_theory
 from octant.front import options
 from octant.front import parser
 from octant.front import printer
+from octant.front import server
 
 
 def print_result(query, variables, answers, time_used, show_pretty):
@@ -49,6 +52,71 @@ def print_result(query, variables, answers, time_used, show_pretty):
             print(line)
 
 
+def phase_time(name):
+    """Wall clock time recorded for a phase"""
+    return instr.report()['phases'].get(name, {}).get('wall', 0.0)
+
+
+def write_stats(filename):
+    """Writes the timings and counters as JSON"""
+    if filename == '-':
+        print(instr.to_json())
+    else:
+        with open(filename, 'w') as fd:
+            fd.write(instr.to_json())
+
+
+def print_build_times(time_required):
+    """Prints the time spent building the theories"""
+    if time_required:
+        print("Compilation time: {}".format(phase_time('compile')))
+        print("Data retrieval: {}".format(phase_time('retrieval')))
+        print("Rules time: {}".format(phase_time('rules')))
+
+
+def evaluate(rules, atoms):
+    """Answers queries
+
+    The theory is restricted to the rules the queries need. Unless disabled
+    with the split option, queries are grouped when they depend on common
+    intensional tables and each group is answered by its own theory.
+    Theories are built one after the other as they share the state of
+    primitive types. They also share the datasource: connections are made
+    once and each table is retrieved once. The whole theory is built when a
+    backup or a dump of the Z3 program is requested.
+
+    :return: the same result as Z3Theory.query_batch
+    """
+    tables = [atom.table for atom in atoms]
+    if not atoms or cfg.CONF.save is not None or cfg.CONF.smt2 is not None:
+        groups = [None]
+    elif cfg.CONF.split:
+        groups = dependency.components(rules, tables)
+    else:
+        groups = [set(tables)]
+    datasource = datalog_theory.make_datasource()
+    if len(groups) > 1:
+        datasource.share(rules)
+    saturation_time = 0.0
+    results = [None] * len(atoms)
+    for goals in groups:
+        selected = [
+            pos for (pos, atom) in enumerate(atoms)
+            if goals is None or atom.table in goals]
+        adornments = [
+            (atoms[pos].table, magic.adornment(atoms[pos].args))
+            for pos in selected]
+        theory = datalog_theory.Z3Theory(
+            rules, goals, adornments, datasource)
+        theory.build_theory()
+        group_time, group_results = theory.query_parallel(
+            [atoms[pos] for pos in selected], cfg.CONF.jobs)
+        saturation_time += group_time
+        for (pos, result) in zip(selected, group_results):
+            results[pos] = result
+    return saturation_time, results
+
+
 def main():
     """Octant entry point"""
     logging.basicConfig(stream=sys.stderr, level=logging.WARNING)
@@ -57,6 +125,11 @@ def main():
     if cfg.CONF.ipsize != 32:
         primitives.TYPES['ip_address'] = (
             primitives.IpAddressType(size=cfg.CONF.ipsize))
+    if cfg.CONF.ipv6size != primitives.MAX_DATALOG_SIZE:
+        primitives.TYPES['ipv6_address'] = (
+            primitives.Ipv6AddressType(size=cfg.CONF.ipv6size))
+    if cfg.CONF.intern is not None:
+        primitives.use_intern_tables(cfg.CONF.intern)
     time_required = cfg.CONF.time
     csv_out = cfg.CONF.csv
     pretty = cfg.CONF.pretty
@@ -67,34 +140,41 @@ def main():
         print("Cannot use option --csv with --time or --pretty.")
         sys.exit(1)
     rules = []
-    start = time.clock()
+    instr.reset()
     try:
-        for rule_file in cfg.CONF.theory:
-            rules += parser.parse_file(rule_file)
+        with instr.phase('parse'):
+            for rule_file in cfg.CONF.theory:
+                rules += parser.parse_file(rule_file)
     except base.Z3ParseError as exc:
         print(exc.args[1])
         sys.exit(1)
     if time_required:
-        print("Parsing time: {}".format(time.clock() - start))
-    start = time.clock()
+        print("Parsing time: {}".format(phase_time('parse')))
     try:
-        theory = datalog_theory.Z3Theory(rules)
-        theory.build_theory()
+        if cfg.CONF.serve:
+            theory = datalog_theory.Z3Theory(rules)
+            theory.build_theory()
+            print_build_times(time_required)
+            server.serve(theory, cfg.CONF.bind_host, cfg.CONF.bind_port)
+            return
+        queries = cfg.CONF.query
+        atoms = [parser.parse_atom(query) for query in queries]
+        saturation_time, results = evaluate(rules, atoms)
+        print_build_times(time_required)
         if time_required:
-            print("Data retrieval: {}".format(time.clock() - start))
-        for query in cfg.CONF.query:
-            start = time.clock()
-            atom = parser.parse_atom(query)
-            variables, answers = theory.query(atom)
+            print("Saturation time: {}".format(saturation_time))
+        for (query, (variables, answers, time_used)) in zip(queries, results):
             if csv_out:
                 printer.print_csv(variables, answers)
             else:
                 print_result(
                     query, variables, answers,
-                    time.clock() - start if time_required else None,
+                    time_used if time_required else None,
                     cfg.CONF.pretty)
         if not csv_out:
             print("*" * 80)
+        if cfg.CONF.stats is not None:
+            write_stats(cfg.CONF.stats)
     except base.Z3NotWellFormed as exc:
         print("Badly formed program: {}".format(exc.args[1]))
         sys.exit(1)
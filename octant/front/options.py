@@ -61,11 +61,50 @@ CLI_OPTIONS = [
     cfg.BoolOpt('csv', default=False, help="Output as csv file."),
     cfg.BoolOpt(
         'time', default=False, help="Print timing of the different phases."),
+    cfg.StrOpt(
+        'stats', default=None,
+        help="File where the timings of the phases and the counters are "
+        "written as JSON ('-' for the standard output)."),
     cfg.BoolOpt('debug', default=False, help="Set loglevel to debug"),
     cfg.BoolOpt('doc', default=False, help="Uses Difference of Cubes (DoC)"),
     cfg.BoolOpt('spec', default=True, help="Specialize predicates."),
     cfg.BoolOpt('unfold', default=True, help="Unfolds when using DoC"),
-    cfg.IntOpt('ipsize', default=32, help='Size of IP address (for test only)')
+    cfg.BoolOpt(
+        'magic', default=False,
+        help="Rewrites rules with magic sets for queries with constant "
+        "arguments."),
+    cfg.BoolOpt(
+        'split', default=True,
+        help="Evaluates independent queries in separate contexts with only "
+        "the rules they need."),
+    cfg.IntOpt(
+        'ipsize', default=32, help='Size of IP address (for test only)'),
+    cfg.IntOpt(
+        'jobs', default=1, min=1,
+        help='Number of processes answering the queries in parallel.'),
+    cfg.IntOpt(
+        'ipv6size', default=63, min=1, max=63,
+        help='Number of bits of IPv6 addresses kept after their most '
+        'significant bit, which is dropped.'),
+    cfg.StrOpt(
+        'cache', default=None,
+        help='Directory where compiled theories are cached.'),
+    cfg.StrOpt(
+        'intern', default=None,
+        help='Directory of the tables giving stable codes to strings and '
+        'ids across runs.'),
+    cfg.IntOpt(
+        'workers', default=4, min=1,
+        help='Number of tables retrieved concurrently from the cloud.'),
+    cfg.BoolOpt(
+        'serve', default=False,
+        help="Keep the theory in memory and answer queries over HTTP."),
+    cfg.StrOpt(
+        'bind_host', default='127.0.0.1',
+        help='Address the server listens on (with --serve).'),
+    cfg.PortOpt(
+        'bind_port', default=8765,
+        help='Port the server listens on (with --serve).')
 ]
 
 cfg.CONF.register_opts(OPENSTACK_OPTIONS, group='openstack')
@@ -16,6 +16,7 @@
 
 from __future__ import print_function
 
+import ipaddress
 import six
 
 from ply import lex
@@ -29,7 +30,7 @@ from octant.common import base
 # pylint: disable=invalid-name
 
 tokens = (
-    'IDENT', 'VAR', 'NUMBER', 'STRING', 'IP', 'ENTAIL', 'OPAR', 'BANG',
+    'IDENT', 'VAR', 'NUMBER', 'STRING', 'IP', 'IP6', 'ENTAIL', 'OPAR', 'BANG',
     'CPAR', 'COLON', 'COMMA', 'EQUAL', 'DOT', 'TILDE', 'AMPERSAND', 'BAR',
     'LT', 'LE', 'GT', 'GE'
 )
@@ -54,6 +55,20 @@ t_GE = r'>='
 t_ignore_COMMENT = r'\#.*'
 
 
+# IP6 rule must have higher precedence than IDENT and NUMBER. An IPv6
+# address contains either '::' or eight groups.
+def t_IP6(t):
+    (r'(?:[0-9a-fA-F]{1,4}:){7}[0-9a-fA-F]{1,4}'
+     r'|(?:[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4})*)?::'
+     r'(?:[0-9a-fA-F]{1,4}(?::[0-9a-fA-F]{1,4})*)?')
+    try:
+        t.value = ipaddress.IPv6Address(six.text_type(t.value)).compressed
+    except ValueError:
+        print('Bad IPv6 address %s at %d' % (t.value, t.lexer.lineno))
+        t.value = u'::'
+    return t
+
+
 # IP rule must have higher precedence than NUMBER. It must be specified
 # before NUMBER and must be a function not a simple token.
 def t_IP(t):
@@ -220,7 +235,8 @@ def p_sexpr_string(t):
 
 
 def p_sexpr_ip(t):
-    'sexpr : IP'
+    '''sexpr : IP
+             | IP6'''
     t[0] = ast.IpConstant(t[1])
 
 
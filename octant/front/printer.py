@@ -103,3 +103,44 @@ def print_csv(variables, answers):
     else:
         print(str(answers))
     print()
+
+
+def jsonable_result(variables, answers):
+    """Gives back the result of a query as a JSON compatible structure
+
+    Each alternative is a dictionary with a ``base`` row and an optional
+    ``diffs`` list of rows substracted from it. Unconstrained values are
+    represented by ``*`` as in the csv output and masked values by a
+    dictionary with a ``value`` and a ``mask``.
+
+    :param variables: list of requested variables
+    :param answers: list of alternative doc results or a boolean
+    :return: a dictionary with the variables and the answers.
+    """
+
+    def jsonable_value(val):
+        if isinstance(val, z3r.Masked):
+            if val[1] is None:
+                return val[0]
+            return {'value': val[0], 'mask': val[1]}
+        if isinstance(val, z3r.Any):
+            return str(val)
+        return val
+
+    def row_of_cube(cube):
+        return [
+            jsonable_value(cube.faces[i]) if i in cube.faces else '*'
+            for i in range(len(variables))]
+
+    def jsonable_elt(elt):
+        if isinstance(elt, z3r.Doc):
+            return {
+                'base': row_of_cube(elt.base),
+                'diffs': [row_of_cube(d) for d in elt.diffs]}
+        return {'base': row_of_cube(elt)}
+
+    if isinstance(answers, list):
+        content = [jsonable_elt(elt) for elt in answers]
+    else:
+        content = answers
+    return {'variables': variables, 'answers': content}
@@ -0,0 +1,144 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Octant daemon answering queries on a theory kept in memory
+
+The theory is parsed, compiled and populated once. Queries are then answered
+over HTTP on the same Z3 context:
+
+* ``GET /query?q=<atom>`` answers one or several queries (``q`` can be
+  repeated). The result is a JSON list with one element per query.
+* ``POST /refresh`` retrieves the data again and updates the facts that
+  changed. The result gives the number of facts added and removed for each
+  modified table.
+
+Requests are served one at a time as a Z3 context cannot be shared between
+threads.
+"""
+
+import json
+import logging
+
+from six.moves import BaseHTTPServer
+from six.moves.urllib import parse
+
+from octant.common import base
+from octant.front import parser
+from octant.front import printer
+
+
+class QueryService(object):
+    """Answers queries on a theory that has already been built
+
+    :param theory: a built Z3Theory.
+    """
+
+    def __init__(self, theory):
+        self.theory = theory
+
+    def query(self, queries):
+        """Answers a list of queries
+
+        :param queries: a list of queries as text.
+        :return: a list of JSON compatible results, one per query.
+        """
+        atoms = [parser.parse_atom(query) for query in queries]
+        _, answers = self.theory.query_batch(atoms)
+        results = []
+        for (query, (variables, answer, _)) in zip(queries, answers):
+            result = printer.jsonable_result(variables, answer)
+            result['query'] = query
+            results.append(result)
+        return results
+
+    def refresh(self):
+        """Retrieves the data again and updates the theory"""
+        changes = self.theory.refresh()
+        return {
+            'refreshed': True,
+            'changes': {
+                table: {'added': added, 'removed': removed}
+                for (table, (added, removed)) in changes.items()}}
+
+
+def error_message(exc):
+    """Message to send back for an error raised by octant"""
+    if isinstance(exc, base.Z3NotWellFormed):
+        return "Badly formed program: {}".format(exc.args[1])
+    if isinstance(exc, base.Z3TypeError):
+        return "Type error: {}".format(exc.args[1])
+    if isinstance(exc, base.Z3SourceError):
+        return "Error in datasource: {}".format(exc.args[1])
+    return "Parser error in query."
+
+
+def make_handler(service):
+    """Builds an HTTP request handler class bound to a query service"""
+
+    class Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+        """HTTP front-end of the query service"""
+
+        def send_json(self, code, content):
+            body = json.dumps(content).encode('utf-8')
+            self.send_response(code)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def protect(self, action):
+            try:
+                self.send_json(200, action())
+            except (base.Z3NotWellFormed, base.Z3TypeError,
+                    base.Z3SourceError, base.Z3ParseError) as exc:
+                self.send_json(400, {'error': error_message(exc)})
+
+        # pylint: disable=invalid-name
+        def do_GET(self):
+            url = parse.urlparse(self.path)
+            if url.path != '/query':
+                self.send_json(404, {'error': 'Unknown path'})
+                return
+            queries = parse.parse_qs(url.query).get('q', [])
+            self.protect(lambda: service.query(queries))
+
+        # pylint: disable=invalid-name
+        def do_POST(self):
+            if self.path != '/refresh':
+                self.send_json(404, {'error': 'Unknown path'})
+                return
+            self.protect(service.refresh)
+
+        def log_message(self, fmt, *args):
+            logging.getLogger().info(fmt, *args)
+
+    return Handler
+
+
+def serve(theory, host, port):
+    """Serves queries on a built theory until interrupted
+
+    :param theory: a built Z3Theory
+    :param host: address to listen on
+    :param port: port to listen on
+    """
+    service = QueryService(theory)
+    httpd = BaseHTTPServer.HTTPServer((host, port), make_handler(service))
+    print("Octant serving on {}:{}".format(host, port))
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
@@ -0,0 +1,202 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Backup files used by --save and --restore
+
+Two formats are supported. The format is chosen from the extension of the
+file name: files ending with ``.snap`` use the binary columnar snapshot
+format (see :mod:`octant.source.snapshot`), other files use the csv format.
+
+In the csv format, each table starts with a row containing the table name
+followed by the names of the saved fields. Each row of the table is then
+the table name followed by the marshalled values of the fields.
+
+Readers give back the rows of a table as lists of raw values (the values
+expected by the ``to_int`` and ``to_z3`` methods of the types). Writers
+receive raw values.
+"""
+
+import csv
+
+import six
+
+from octant.common import base
+from octant.source import snapshot
+
+
+def field_positions(table_name, index, fields):
+    """Positions of the fields requested in the saved fields of a table
+
+    :param table_name: the name of the table (for error messages)
+    :param index: the list of saved field names
+    :param fields: the list of requested field names
+    :return: a list of integers
+    """
+    positions = []
+    for field in fields:
+        try:
+            positions.append(index.index(field))
+        except ValueError:
+            raise base.Z3NotWellFormed(
+                "Field {} was not saved for table {}".format(
+                    field,
+                    table_name))
+    return positions
+
+
+class CsvBackupReader(object):
+    """Reader of a backup in csv format
+
+    The file is only indexed when it is opened: the position of the section
+    of each table is recorded. Rows are parsed when the table is requested
+    and streamed from the file.
+
+    :param filename: the name of the backup file
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.tables = self.index()
+
+    def index(self):
+        """Find the start and the end of the section of each table
+
+        A record may span several lines if a quoted value contains a line
+        break. As quotes are escaped by doubling them, a record is complete
+        when it contains an even number of quotes.
+
+        :return: a dictionary associating to each table name the byte
+            offsets of its header row and of the end of its section.
+        """
+        tables = {}
+        current = None
+        start = 0
+        position = 0
+        record = b''
+        for line in self.file:
+            record += line
+            position += len(line)
+            if record.count(b'"') % 2 == 1:
+                continue
+            tablename = record_table(record)
+            if tablename != current:
+                current = tablename
+                tables[tablename] = [start, position]
+            else:
+                tables[tablename][1] = position
+            start = position
+            record = b''
+        return tables
+
+    def lines(self, start, end):
+        """Lines of the file between two byte offsets"""
+        self.file.seek(start)
+        position = start
+        while position < end:
+            line = self.file.readline()
+            if not line:
+                return
+            position += len(line)
+            yield line.decode('utf-8') if six.PY3 else line
+
+    def rows(self, table_name, fields, types):
+        """Rows of a table
+
+        :param table_name: the name of the table
+        :param fields: the list of field names requested
+        :param types: the list of the types of those fields
+        :return: an iterable of rows. Each row is a list of raw values
+            ordered as fields.
+        """
+        if table_name not in self.tables:
+            field_positions(table_name, [], fields)
+            return iter([])
+        (start, end) = self.tables[table_name]
+        csvreader = csv.reader(self.lines(start, end))
+        index = next(csvreader)[1:]
+        access = [
+            (pos + 1, typ.unmarshall)
+            for (pos, typ) in zip(
+                field_positions(table_name, index, fields), types)]
+        return (
+            [unmarshall(row[pos]) for (pos, unmarshall) in access]
+            for row in csvreader)
+
+    def close(self):
+        """Release the backup"""
+        self.file.close()
+
+
+def record_table(record):
+    """Table name of a csv record given as bytes"""
+    if record.startswith(b'"'):
+        text = record.decode('utf-8') if six.PY3 else record
+        return next(csv.reader([text]))[0]
+    return record.split(b',', 1)[0].rstrip(b'\r\n').decode('utf-8')
+
+
+class CsvBackupWriter(object):
+    """Writer of a backup in csv format
+
+    :param filename: the name of the backup file
+    """
+
+    def __init__(self, filename):
+        self.csvfile = open(filename, mode='w')
+        self.csv_writer = csv.writer(self.csvfile)
+        self.marshalls = {}
+
+    def add_table(self, table_name, fields, types):
+        """Starts a new table
+
+        :param table_name: the name of the table
+        :param fields: the list of field names saved
+        :param types: the list of the types of those fields
+        """
+        self.marshalls[table_name] = [typ.marshall for typ in types]
+        self.csv_writer.writerow([table_name] + fields)
+
+    def add_row(self, table_name, values):
+        """Adds a row to the last table started
+
+        :param table_name: the name of the table
+        :param values: the list of raw values of the row
+        """
+        self.csv_writer.writerow(
+            [table_name] +
+            [marshall(raw)
+             for (marshall, raw) in zip(self.marshalls[table_name], values)])
+
+    def close(self):
+        """Terminates the backup"""
+        self.csvfile.close()
+
+
+def is_snapshot(filename):
+    """Check if the backup file uses the binary snapshot format"""
+    return filename.endswith(snapshot.SNAPSHOT_EXTENSION)
+
+
+def open_reader(filename):
+    """Opens a backup for reading, choosing the format from the file name"""
+    if is_snapshot(filename):
+        return snapshot.SnapshotReader(filename)
+    return CsvBackupReader(filename)
+
+
+def open_writer(filename):
+    """Opens a backup for writing, choosing the format from the file name"""
+    if is_snapshot(filename):
+        return snapshot.SnapshotWriter(filename)
+    return CsvBackupWriter(filename)
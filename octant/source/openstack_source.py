@@ -24,6 +24,7 @@ from openstack import connection
 from oslo_config import cfg
 
 from octant.common import primitives
+from octant.source import source
 
 
 def normalize_status(raw):
@@ -158,6 +159,7 @@ OPENSTACK_TABLES = {
         "port_id": ("id", lambda pi: pi[0]),
         "subnet_id": ("id", lambda pi: pi[1]['subnet_id']),
         "ip": ("ip_address", lambda pi: pi[1]['ip_address']),
+        "ip6": ("ipv6_address", lambda pi: pi[1]['ip_address']),
     }),
     "port_sg": (_get_port_sgs, {
         "port_id": ("id", lambda psg: psg[0]),
@@ -177,6 +179,15 @@ OPENSTACK_TABLES = {
         "gateway_ip": (
             "ip_address",
             lambda s: s.gateway_ip if s.gateway_ip is not None else "0.0.0.0"),
+        "cidr6_prefix": (
+            "ipv6_address",
+            lambda s: primitives.prefix_of_network(s.cidr)),
+        "cidr6_mask": (
+            "ipv6_address",
+            lambda s: primitives.mask_of_network(s.cidr)),
+        "gateway_ip6": (
+            "ipv6_address",
+            lambda s: s.gateway_ip if s.gateway_ip is not None else "::"),
         "ip_version": (
             "ip_version",
             lambda s: ip_version(s.ip_version))
@@ -241,6 +252,12 @@ OPENSTACK_TABLES = {
          "remote_ip_mask": ("ip_address", (
              lambda p: primitives.mask_of_network(p.remote_ip_prefix)
          )),
+         "remote_ip6_prefix": ("ipv6_address", (
+             lambda p: primitives.prefix_of_network(p.remote_ip_prefix)
+         )),
+         "remote_ip6_mask": ("ipv6_address", (
+             lambda p: primitives.mask_of_network(p.remote_ip_prefix)
+         )),
          "security_group_id": ("id", lambda p: p.security_group_id)}
     ),
     "server": (
@@ -539,8 +556,11 @@ def register(datasource):
             urllib3.disable_warnings()
         auth = identity.Password(**auth_args)
         sess = session.Session(auth=auth, verify=openstack_conf.verify)
-        openstack_cnx = connection.Connection(
-            session=sess, identity_api_version='3')
-        neutron_cnx = neutronclient.Client(session=sess)
+        # Several tables share the same listings: they are done once per
+        # retrieval.
+        openstack_cnx = source.ListingCache(connection.Connection(
+            session=sess, identity_api_version='3'))
+        neutron_cnx = source.ListingCache(
+            neutronclient.Client(session=sess))
     datasource.register(neutron_cnx, NEUTRON_TABLES)
     datasource.register(openstack_cnx, OPENSTACK_TABLES)
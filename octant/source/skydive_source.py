@@ -13,6 +13,8 @@
 #    under the License.
 
 """Skydive Data Source"""
+import threading
+
 from six.moves import reduce
 
 from oslo_config import cfg
@@ -23,15 +25,21 @@ from octant.common import primitives
 
 class SkydiveCnx(object):
     """Representation of skydive connection with auxiliary data"""
-    __slots__ = "socket", "initialized", "filters", "actions"
+    __slots__ = "socket", "initialized", "filters", "actions", "lock"
 
     def __init__(self, socket):
         self.socket = socket
         self.initialized = False
         self.filters = {}
         self.actions = {}
+        # Tables sharing the connection may be retrieved concurrently.
+        self.lock = threading.Lock()
 
     def fill(self):
+        with self.lock:
+            self._fill()
+
+    def _fill(self):
         if (self.initialized):
             return
         rules = self.socket.lookup_nodes('G.V().Has("Type", "ofrule")')
@@ -0,0 +1,311 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Binary columnar snapshot of retrieved tables
+
+A snapshot stores each table as a set of columns. The file layout is:
+
+* a header: the magic string ``OCTSNAP1`` followed by the offset and the
+  length of the directory (two little endian unsigned 64 bits integers),
+* column blocks, each aligned on 8 bytes,
+* the string pool: an array of ``n + 1`` offsets (unsigned 64 bits) followed
+  by the utf-8 encoding of the ``n`` strings,
+* the directory, a JSON document describing the tables, their number of
+  rows and the kind and position of each column.
+
+There are four kinds of columns:
+
+* ``int``: signed 64 bits integers,
+* ``bool``: one signed byte per value,
+* ``str``: unsigned 32 bits indexes in the string pool. ``None`` is
+  represented by the index ``0xffffffff``. Each distinct string is stored
+  once in the pool.
+* ``marshalled``: like ``str`` but the strings are the values marshalled
+  by the type of the field, as in csv backups. It is used for columns whose
+  values have no native kind (mixed kinds or integers out of 64 bits).
+
+``int`` and ``bool`` columns containing ``None`` also have a null bitmap
+block: bit ``i % 8`` of byte ``i // 8`` is set if the value of row ``i`` is
+``None``.
+
+The file is memory mapped when read. Only the directory is decoded when it
+is opened. Columns are decoded when a table is requested and only for the
+fields requested. Strings of the pool are decoded on first use.
+"""
+
+import array
+from collections import OrderedDict
+import json
+import mmap
+import struct
+import sys
+
+import six
+
+from octant.common import base
+
+SNAPSHOT_EXTENSION = '.snap'
+MAGIC = b'OCTSNAP1'
+HEADER = struct.Struct('<8sQQ')
+NULL_STRING = 0xffffffff
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+#: Array type codes used for each kind of column
+KIND_CODES = {
+    'int': 'q', 'bool': 'b', 'str': 'I', 'marshalled': 'I', 'offsets': 'Q'}
+
+
+def _to_bytes(arr):
+    """Little endian encoding of an array"""
+    if sys.byteorder == 'big':
+        arr = array.array(arr.typecode, arr)
+        arr.byteswap()
+    return arr.tobytes() if six.PY3 else arr.tostring()
+
+
+def _from_bytes(code, data):
+    """Decodes a little endian array"""
+    arr = array.array(code)
+    if six.PY3:
+        arr.frombytes(data)
+    else:
+        arr.fromstring(data)
+    if sys.byteorder == 'big':
+        arr.byteswap()
+    return arr
+
+
+def column_kind(values):
+    """Chooses the most compact kind of column for a list of values
+
+    ``None`` values are ignored: they are represented by a null bitmap or
+    by the null string.
+    """
+    values = [val for val in values if val is not None]
+    if all(isinstance(val, bool) for val in values):
+        return 'bool'
+    if all(isinstance(val, six.integer_types) and
+           not isinstance(val, bool) and
+           INT64_MIN <= val <= INT64_MAX
+           for val in values):
+        return 'int'
+    if all(isinstance(val, six.string_types) for val in values):
+        return 'str'
+    return 'marshalled'
+
+
+def null_bitmap(values):
+    """Bitmap of the positions of None in a list of values"""
+    bitmap = bytearray((len(values) + 7) // 8)
+    for (i, val) in enumerate(values):
+        if val is None:
+            bitmap[i // 8] |= 1 << (i % 8)
+    return bytes(bitmap)
+
+
+class SnapshotWriter(object):
+    """Writer of a snapshot
+
+    Columns are accumulated in memory and the file is written when the
+    writer is closed.
+
+    :param filename: the name of the snapshot file
+    """
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.tables = OrderedDict()
+
+    def add_table(self, table_name, fields, types):
+        """Starts a new table
+
+        :param table_name: the name of the table
+        :param fields: the list of field names saved
+        :param types: the list of the types of those fields
+        """
+        self.tables[table_name] = (
+            list(fields), [[] for _ in fields], list(types))
+
+    def add_row(self, table_name, values):
+        """Adds a row to a table
+
+        :param table_name: the name of the table
+        :param values: the list of raw values of the row
+        """
+        for (column, val) in zip(self.tables[table_name][1], values):
+            column.append(val)
+
+    def close(self):
+        """Encodes the columns and writes the snapshot file"""
+        pool = OrderedDict()
+
+        def intern(val):
+            if val is None:
+                return NULL_STRING
+            text = six.text_type(val)
+            code = pool.get(text, None)
+            if code is None:
+                code = len(pool)
+                pool[text] = code
+            return code
+
+        blocks = []
+        position = [HEADER.size]
+
+        def add_block(data):
+            offset = position[0]
+            padding = (-len(data)) % 8
+            blocks.append(data + b'\0' * padding)
+            position[0] += len(data) + padding
+            return offset
+
+        directory = {'version': 2, 'tables': OrderedDict()}
+        for (table_name, (fields, columns, types)) in six.iteritems(
+                self.tables):
+            descr = OrderedDict()
+            for (field, values, typ) in zip(fields, columns, types):
+                kind = column_kind(values)
+                column = {'kind': kind}
+                if kind == 'str':
+                    values = [intern(val) for val in values]
+                elif kind == 'marshalled':
+                    values = [
+                        intern(None if val is None else typ.marshall(val))
+                        for val in values]
+                elif None in values:
+                    column['nulls'] = add_block(null_bitmap(values))
+                    values = [0 if val is None else val for val in values]
+                arr = array.array(KIND_CODES[kind], values)
+                column['offset'] = add_block(_to_bytes(arr))
+                descr[field] = column
+            directory['tables'][table_name] = {
+                'rows': len(columns[0]) if columns else 0,
+                'columns': descr}
+        encoded = [text.encode('utf-8') for text in pool]
+        offsets = array.array(KIND_CODES['offsets'], [0])
+        for item in encoded:
+            offsets.append(offsets[-1] + len(item))
+        directory['pool'] = {
+            'count': len(encoded),
+            'offsets': add_block(_to_bytes(offsets)),
+            'data': add_block(b''.join(encoded))}
+        raw_directory = json.dumps(directory).encode('utf-8')
+        dir_offset = position[0]
+        with open(self.filename, 'wb') as fd:
+            fd.write(HEADER.pack(MAGIC, dir_offset, len(raw_directory)))
+            for block in blocks:
+                fd.write(block)
+            fd.write(raw_directory)
+
+
+class SnapshotReader(object):
+    """Reader of a snapshot
+
+    :param filename: the name of the snapshot file
+    """
+
+    def __init__(self, filename):
+        self.file = open(filename, 'rb')
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, dir_offset, dir_len) = HEADER.unpack(
+            self.data[:HEADER.size])
+        if magic != MAGIC:
+            raise base.Z3SourceError(
+                "{} is not an octant snapshot".format(filename))
+        directory = json.loads(
+            self.data[dir_offset:dir_offset + dir_len].decode('utf-8'))
+        self.tables = directory['tables']
+        self.pool = directory['pool']
+        self.pool_offsets = None
+        self.strings = {}
+
+    def string(self, code):
+        """Decodes a string of the pool"""
+        if code == NULL_STRING:
+            return None
+        text = self.strings.get(code, None)
+        if text is None:
+            if self.pool_offsets is None:
+                start = self.pool['offsets']
+                size = 8 * (self.pool['count'] + 1)
+                self.pool_offsets = _from_bytes(
+                    KIND_CODES['offsets'], self.data[start:start + size])
+            base_offset = self.pool['data']
+            start = base_offset + self.pool_offsets[code]
+            end = base_offset + self.pool_offsets[code + 1]
+            text = self.data[start:end].decode('utf-8')
+            self.strings[code] = text
+        return text
+
+    def column(self, table_name, field, typ):
+        """Decodes a single column of a table
+
+        :param typ: the type of the field, used to unmarshall the values
+            of marshalled columns
+        :return: the list of raw values of the column
+        """
+        table = self.tables[table_name]
+        descr = table['columns'][field]
+        kind = descr['kind']
+        code = KIND_CODES[kind]
+        start = descr['offset']
+        size = array.array(code).itemsize * table['rows']
+        values = _from_bytes(code, self.data[start:start + size])
+        string = self.string
+        if kind == 'str':
+            return [string(val) for val in values]
+        if kind == 'marshalled':
+            return [
+                None if val == NULL_STRING else typ.unmarshall(string(val))
+                for val in values]
+        if kind == 'bool':
+            values = [val != 0 for val in values]
+        if 'nulls' in descr:
+            start = descr['nulls']
+            bitmap = bytearray(
+                self.data[start:start + (table['rows'] + 7) // 8])
+            values = [
+                None if bitmap[i // 8] & (1 << (i % 8)) else val
+                for (i, val) in enumerate(values)]
+        return values
+
+    def rows(self, table_name, fields, types):
+        """Rows of a table
+
+        Only the columns of the requested fields are decoded.
+
+        :param table_name: the name of the table
+        :param fields: the list of field names requested
+        :param types: the list of the types of those fields
+        :return: an iterable of rows. Each row is a list of raw values
+            ordered as fields.
+        """
+        table = self.tables.get(table_name, {'rows': 0, 'columns': {}})
+        for field in fields:
+            if field not in table['columns']:
+                raise base.Z3NotWellFormed(
+                    "Field {} was not saved for table {}".format(
+                        field, table_name))
+        columns = [
+            self.column(table_name, field, typ)
+            for (field, typ) in zip(fields, types)]
+        return (
+            [column[i] for column in columns]
+            for i in six.moves.range(table['rows']))
+
+    def close(self):
+        """Releases the memory mapping"""
+        self.data.close()
+        self.file.close()
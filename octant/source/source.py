@@ -17,15 +17,83 @@
 from __future__ import print_function
 
 from collections import namedtuple
-import csv
+from multiprocessing import pool
+import operator
+import threading
 
 from oslo_config import cfg
 
 from octant.common import base
+from octant.source import backup
 
 TableAccessor = namedtuple('TableAccessor', ['session', 'access', 'fields'])
 
 
+class ListingCache(object):
+    """Proxy on a client that performs each listing call only once
+
+    Several tables are often derived from the same REST collection (for
+    example ``port``, ``port_ip`` and ``port_sg`` all list the ports). The
+    proxy forwards attribute accesses to the client. Method calls are
+    memoized using the path of the method and its arguments as key and the
+    result is materialized so that it can be shared by all the tables.
+    Concurrent calls with the same key are done only once.
+
+    The memoized results are kept until ``reset`` is called, usually at the
+    end of the retrieval of the data by the datasource.
+
+    :param client: the client to wrap (openstack connection, neutron
+        client, etc.)
+    """
+
+    def __init__(self, client, path=(), store=None):
+        self._client = client
+        self._path = path
+        self._store = _ListingStore() if store is None else store
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        path = self._path + (name,)
+        if not callable(attr):
+            return ListingCache(attr, path=path, store=self._store)
+
+        def listing(*args, **kwargs):
+            key = (path, args, tuple(sorted(kwargs.items())))
+            return self._store.get(key, lambda: attr(*args, **kwargs))
+        return listing
+
+    def reset(self):
+        """Forget all the memoized listings"""
+        self._store.reset()
+
+
+class _ListingStore(object):
+    """Memoized results shared by the proxies of a ListingCache"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.entries = {}
+
+    def get(self, key, call):
+        with self.lock:
+            entry = self.entries.get(key, None)
+            if entry is None:
+                entry = [threading.Lock(), None, False]
+                self.entries[key] = entry
+        with entry[0]:
+            if not entry[2]:
+                result = call()
+                if not isinstance(result, (list, tuple, dict)):
+                    result = list(result)
+                entry[1] = result
+                entry[2] = True
+        return entry[1]
+
+    def reset(self):
+        with self.lock:
+            self.entries = {}
+
+
 class Datasource(object):
     """Represents the source of facts used by the Datalog interpreter
 
@@ -34,35 +102,31 @@ class Datasource(object):
 
     def __init__(self, types):
         self.backup = None
+        self.saver = None
         self.datasources = {}
-        self.csv_writer = None
-        self.csvfile = None
+        self.prefetched = {}
         self.types = types
+        self.shared = {}
+        self.retrieved = {}
 
     def __enter__(self):
         """Configure the datasources"""
         if cfg.CONF.restore is not None:
-            with open(cfg.CONF.restore, 'r') as csvfile:
-                csvreader = csv.reader(csvfile)
-                backup = {}
-                current = ''
-                table = []
-                for row in csvreader:
-                    tablename = row[0]
-                    if tablename != current:
-                        table = []
-                        current = tablename
-                        backup[tablename] = (row[1:], table)
-                    else:
-                        table.append(row[1:])
-            self.backup = backup
+            self.backup = backup.open_reader(cfg.CONF.restore)
         if cfg.CONF.save is not None:
-            self.csvfile = open(cfg.CONF.save, mode='w')
-            self.csv_writer = csv.writer(self.csvfile)
+            self.saver = backup.open_writer(cfg.CONF.save)
 
     def __exit__(self, typ, value, traceback):
-        if self.csvfile is not None:
-            self.csvfile.close()
+        self.prefetched = {}
+        for accessor in self.datasources.values():
+            if isinstance(accessor.session, ListingCache):
+                accessor.session.reset()
+        if self.backup is not None:
+            self.backup.close()
+            self.backup = None
+        if self.saver is not None:
+            self.saver.close()
+            self.saver = None
 
     def register(self, session, accessors):
         """Registers a new source.
@@ -98,6 +162,23 @@ class Datasource(object):
             self.datasources[tablename] = (
                 TableAccessor(session=session, access=access, fields=fields))
 
+    def share(self, rules):
+        """Keeps the rows retrieved for several theories
+
+        Theories built on this datasource then retrieve each table once
+        (see ``retrieved``) with all the fields the rules use.
+
+        :param rules: the rules of all the theories
+        """
+        self.shared = {}
+        self.retrieved = {}
+        for rule in rules:
+            for atom in rule.body:
+                if (atom is not None and self.is_extensible(atom) and
+                        atom.labels is not None):
+                    self.shared.setdefault(atom.table, set()).update(
+                        atom.labels)
+
     def is_extensible(self, atom):
         """Check if the atom uses a table registered in the datasource
 
@@ -130,73 +211,88 @@ class Datasource(object):
         """check if it uses the cache"""
         return cfg.CONF.restore is not None
 
-    def retrieve_table(self, table_name, fields, mk_relation):
-        """Get the facts on the cloud or in the csv cache.
+    def prefetch(self, table_names, workers):
+        """Fetch the rows of several tables concurrently.
+
+        Each table is listed in a pool of threads and its rows are kept
+        until ``retrieve_table`` processes them. Only the REST calls are
+        done in parallel: the translation of rows to Z3 stays sequential.
+        Nothing is done when a backup is used.
+
+        :param table_names: the names of the tables to fetch
+        :param workers: the maximum number of tables fetched at the same time
+        """
+        if self.backup is not None or workers <= 1:
+            return
+        accessors = [
+            (table_name, self.datasources[table_name])
+            for table_name in table_names
+            if table_name in self.datasources]
+        if len(accessors) < 2:
+            return
+
+        def fetch(item):
+            """Get all the rows of a table"""
+            (table_name, accessor) = item
+            return table_name, list(accessor.access(accessor.session))
+
+        threads = pool.ThreadPool(min(workers, len(accessors)))
+        try:
+            self.prefetched.update(threads.map(fetch, accessors))
+        finally:
+            threads.close()
+            threads.join()
+
+    def retrieve_table(self, table_name, fields, mk_relation, raw=False):
+        """Get the facts on the cloud or in a backup.
 
         :param table_name: the name of the table to retrieve
         :param fields: the list of field names of the table used
         :param mk_relation: a callback called on each row an taking a row
           value as a list of Z3 objects associated to each field and
           creating a fact in the Z3 context for the row.
-        :param extract: an optional list of integer indexes defining the
-          args to give back as a result (used by unfolding)
-        :returns: None or a list of tuples for the columns requested in
-          extract.
+        :param raw: when true, the row values given to mk_relation are the
+          integer encodings of the values instead of Z3 objects.
         """
-        use_cache = self.backup is not None
-        if table_name in self.datasources:
-            accessor = self.datasources[table_name]
-            if use_cache:
-                (index, objs) = self.backup.get(table_name, ([], []))
-            else:
-                index = None
-                objs = accessor.access(accessor.session)
-        else:
+        if table_name not in self.datasources:
             raise base.Z3TypeError(
                 'Unknown primitive relation {}'.format(table_name))
+        accessor = self.datasources[table_name]
 
-        def get_field(field):
-            """Get a field compilation functions for cloud access"""
+        def get_type(field):
+            """Get the type of a field"""
             try:
-                type_name, access = accessor.fields[field]
+                type_name, _ = accessor.fields[field]
             except KeyError:
                 raise base.Z3TypeError(
                     'Unknown field {} in {}'.format(field, table_name))
-            type_field = self.types[type_name]
-            return (type_field.to_z3, access, type_field.marshall)
+            return self.types[type_name]
 
-        def get_field_from_cache(field):
-            """Get a field compilation functions for csv access"""
-            type_name, _ = accessor.fields[field]
-            type_field = self.types[type_name]
-            try:
-                pos = index.index(field)
-            except ValueError:
-                raise base.Z3NotWellFormed(
-                    "Field {} was not saved for table {}".format(
-                        field,
-                        table_name))
-            return (
-                type_field.to_z3,
-                lambda row: type_field.unmarshall(row[pos]),
-                type_field.marshall)
-
-        if use_cache:
-            access_fields = [get_field_from_cache(field) for field in fields]
+        types = [get_type(field) for field in fields]
+        encoders = [
+            typ.to_int if raw else typ.to_z3 for typ in types]
+        if self.backup is not None:
+            objs = self.backup.rows(table_name, fields, types)
+            access_fields = [
+                (encoder, operator.itemgetter(pos))
+                for (pos, encoder) in enumerate(encoders)]
         else:
-            access_fields = [get_field(field) for field in fields]
-        if self.csv_writer is not None:
-            self.csv_writer.writerow([table_name] + fields)
+            objs = self.prefetched.pop(table_name, None)
+            if objs is None:
+                objs = accessor.access(accessor.session)
+            access_fields = [
+                (encoder, accessor.fields[field][1])
+                for (field, encoder) in zip(fields, encoders)]
+        if self.saver is not None:
+            self.saver.add_table(table_name, fields, types)
         for obj in objs:
             try:
-                extracted = [
-                    (typ, acc(obj), marshall)
-                    for (typ, acc, marshall) in access_fields]
-                if self.csv_writer is not None:
-                    self.csv_writer.writerow(
-                        [table_name] +
-                        [marshall(raw) for (_, raw, marshall) in extracted])
-                args = [typ(raw) for (typ, raw, _) in extracted]
+                extracted = [acc(obj) for (_, acc) in access_fields]
+                if self.saver is not None:
+                    self.saver.add_row(table_name, extracted)
+                args = [
+                    to_z3(value)
+                    for ((to_z3, _), value) in zip(access_fields, extracted)]
                 mk_relation(args)
             except Exception as exc:
                 print(
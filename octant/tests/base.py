@@ -22,6 +22,8 @@ import sys
 
 from oslotest import base
 
+from octant.common import primitives
+
 
 @contextmanager
 def capture_stdout():
@@ -36,3 +38,8 @@ def capture_stdout():
 class TestCase(base.BaseTestCase):
 
     """Test case base class for all unit tests."""
+
+    def setUp(self):
+        super(TestCase, self).setUp()
+        # Types are global and sized by each theory.
+        self.addCleanup(primitives.unfit_types)
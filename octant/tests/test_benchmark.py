@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_benchmark
+--------------
+
+Smoke tests for the `octant_benchmark` runner.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+
+import mock
+from oslo_config import cfg
+
+from octant.common import primitives
+from octant.tests import base
+from octant_benchmark import runner
+
+
+class TestRunner(base.TestCase):
+    """Test the benchmark runner"""
+
+    def setUp(self):
+        super(TestRunner, self).setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.addCleanup(cfg.CONF.reset)
+        patcher = mock.patch.dict(primitives.TYPES)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_run(self):
+        output = os.path.join(self.folder, 'result.json')
+        self.assertEqual(0, runner.main([
+            'run', '--sizes', '0', '--ipsizes', '8', '--doc', 'off,on',
+            '--unfold', 'on', '--spec', 'on', '--repeat', '1',
+            '-o', output]))
+        with open(output) as fd:
+            report = json.load(fd)
+        names = [scenario['name'] for scenario in report['scenarios']]
+        self.assertEqual(
+            ['size=0,ipsize=8,plain', 'size=0,ipsize=8,doc+unfold+spec'],
+            names)
+        for scenario in report['scenarios']:
+            self.assertEqual({'result(X)': 6}, scenario['answers'])
+            for phase in runner.PHASES:
+                self.assertIn(phase, scenario['phases'])
+        lines = runner.compare_reports(report, report, 1.2)
+        self.assertEqual(
+            sum(len(scenario['phases']) for scenario in report['scenarios']),
+            len(lines))
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_datalog_cache
+----------------------------------
+
+Tests for the cache of compiled theories.
+"""
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from octant.common import primitives
+from octant.datalog import cache
+from octant.datalog import compiler
+from octant.datalog import theory
+from octant.datalog import z3_result as z3r
+from octant.front import parser
+from octant.source import source
+from octant.tests import base
+from octant.tests import test_datalog_theory as ttheory
+
+PROG = """
+    p(X) :- q(a=X), r(X).
+    r(421:int).
+    r(12:int).
+    s(X) :- q(a=X), !r(X).
+    t("a":string).
+    t("b":string).
+    u(Y) :- t(Y), !Y = "b":string.
+"""
+
+
+def mocked_register(ds):
+    content = {
+        "q": (
+            lambda s: [422, 568],
+            {"a": ("int", lambda s: s - 1)})
+    }
+    ds.register({}, content)
+
+
+class TestCache(base.TestCase):
+    """Test the cache of compiled theories"""
+
+    def setUp(self):
+        super(TestCache, self).setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.theory_file = os.path.join(self.folder, 'prog.dtl')
+        with open(self.theory_file, 'w') as fd:
+            fd.write(PROG)
+
+    def datasource(self):
+        datasource = source.Datasource(primitives.TYPES)
+        mocked_register(datasource)
+        return datasource
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_key(self, mock_cfg):
+        ttheory.standard_cfg(mock_cfg)
+        mock_cfg.spec = True
+        mock_cfg.unfold = True
+        mock_cfg.ipsize = 32
+
+        def key(text, datasource=None, goals=None):
+            return cache.theory_key(
+                parser.wrapped_parse(text),
+                self.datasource() if datasource is None else datasource,
+                goals)
+
+        key_plain = key(PROG)
+        self.assertEqual(key_plain, key(PROG))
+        mock_cfg.doc = True
+        key_doc = key(PROG)
+        self.assertNotEqual(key_plain, key_doc)
+        self.assertNotEqual(key_doc, key(PROG + "r(3:int)."))
+        self.assertNotEqual(
+            key_doc, key(PROG, source.Datasource(primitives.TYPES)))
+        key_goals = key(PROG, goals=['p', 's'])
+        self.assertNotEqual(key_doc, key_goals)
+        self.assertEqual(key_goals, key(PROG, goals=['s', 'p']))
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_key_rules(self, mock_cfg):
+        # No theory file: the key depends only on the rules given.
+        ttheory.standard_cfg(mock_cfg)
+        mock_cfg.theory = []
+        keys = [
+            cache.theory_key(parser.wrapped_parse(text), self.datasource())
+            for text in [
+                'p(X) :- q(a=X).', 'p(X) :- q(a=X).', 'p(X) :- q(b=X).',
+                'p(X) :- q(a=X), !X = 2:int.', 'p(X) :- q(a=X), !X = 2:int4.',
+                'p("a":string).', 'p("a":id).', 'p(X) :- q(a=X), X = C.']]
+        self.assertEqual(keys[0], keys[1])
+        self.assertEqual(len(keys) - 1, len(set(keys)))
+
+    def test_store_load(self):
+        self.assertIsNone(cache.load(self.folder, 'key'))
+        cache.store(self.folder, 'key', {'a': [1, 2]})
+        self.assertEqual({'a': [1, 2]}, cache.load(self.folder, 'key'))
+        with open(cache.cache_file(self.folder, 'bad'), 'w') as fd:
+            fd.write('garbage')
+        self.assertIsNone(cache.load(self.folder, 'bad'))
+        subfolder = os.path.join(self.folder, 'sub')
+        cache.store(subfolder, 'key', 1)
+        self.assertEqual(1, cache.load(subfolder, 'key'))
+
+    @mock.patch("octant.source.openstack_source.register", new=mocked_register)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_cached_theory(self, mock_cfg, src1):
+        ttheory.standard_cfg(mock_cfg)
+        mock_cfg.doc = True
+        mock_cfg.spec = True
+        mock_cfg.unfold = True
+        mock_cfg.ipsize = 32
+        mock_cfg.theory = [self.theory_file]
+        mock_cfg.cache = os.path.join(self.folder, 'cache')
+
+        def answers():
+            theo = theory.Z3Theory(parser.parse_file(self.theory_file))
+            theo.build_theory()
+            return [
+                theo.query(parser.parse_atom(query))
+                for query in ["p(X)", "s(X)", "u(X)"]]
+
+        expected = answers()
+        self.assertEqual(
+            (['X'], [z3r.Cube({0: 421}, 1)]), expected[0])
+        self.assertEqual(1, len(os.listdir(mock_cfg.cache)))
+        with mock.patch.object(compiler.Z3Compiler, 'analyze') as analyze:
+            self.assertEqual(expected, answers())
+        analyze.assert_not_called()
@@ -21,6 +21,7 @@ Tests for `datalog_compiler` module which preprocess Datalog rules.
 
 from octant.common import ast
 from octant.common import base as obase
+from octant.common import instrumentation as instr
 from octant.datalog import compiler
 from octant.front import parser
 from octant.tests import base
@@ -125,3 +126,21 @@ class TestCompiler(base.TestCase):
             rules[2].body[0].args[2].id
         ]
         self.assertIs(True, distinct(vars))
+
+    def test_goals(self):
+        rules = pp("""
+            p(X) :- q(l1=X), s(X).
+            s(X) :- r(l1=X).
+            t(X) :- u(l1=X), q(l2=X).
+        """)
+        instr.reset()
+        comp = compiler.Z3Compiler(
+            rules, {}, MockDatasource(['q', 'r', 'u']), goals=['p'])
+        self.assertEqual(
+            ['p', 's'], [rule.head_table() for rule in comp.rules])
+        self.assertEqual(3, len(rules))
+        comp.find_base_relations()
+        self.assertEqual({'q': ['l1'], 'r': ['l1']}, comp.extensible_tables)
+        counters = instr.report()['counters']
+        self.assertEqual(1, counters['dropped_rules'])
+        self.assertEqual(1, counters['skipped_tables'])
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_datalog_dependency
+----------------------------------
+
+Tests for `datalog_dependency` module.
+"""
+
+from octant.datalog import dependency
+from octant.front import parser
+from octant.tests import base
+
+PROG = """
+    p(X) :- q(a=X), r(X).
+    r(X) :- s(X), X > 2.
+    s(3).
+    t(X) :- u(X).
+    u(X) :- q(a=X).
+    v(X) :- s(X), u(X).
+    w(X) :- q(a=X).
+"""
+
+
+class TestDependency(base.TestCase):
+    """Test the dependency graph of theories"""
+
+    def setUp(self):
+        super(TestDependency, self).setUp()
+        self.rules = parser.wrapped_parse(PROG)
+
+    def test_graph(self):
+        graph = dependency.dependency_graph(self.rules)
+        self.assertEqual({'q', 'r'}, graph['p'])
+        self.assertEqual({'s', '>'}, graph['r'])
+        self.assertEqual(set(), graph['s'])
+        self.assertNotIn('q', graph)
+
+    def test_relevant_rules(self):
+        self.assertEqual(
+            ['p', 'r', 's'],
+            [rule.head_table()
+             for rule in dependency.relevant_rules(self.rules, ['p'])])
+        self.assertEqual(
+            ['t', 'u', 'w'],
+            [rule.head_table()
+             for rule in dependency.relevant_rules(self.rules, ['w', 't'])])
+        self.assertEqual([], dependency.relevant_rules(self.rules, ['x']))
+
+    def test_components(self):
+        self.assertEqual(
+            [{'p'}, {'t'}, {'w'}, {'x'}],
+            dependency.components(self.rules, ['p', 't', 'w', 'x', 'p']))
+        # v joins the component of p (through s) and the one of t (through u)
+        self.assertEqual(
+            [{'p', 't', 'v'}, {'w'}],
+            dependency.components(self.rules, ['p', 'w', 't', 'v']))
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_datalog_magic
+----------------------------------
+
+Tests for `datalog_magic` module.
+"""
+
+from octant.datalog import magic
+from octant.front import parser
+from octant.tests import base
+
+PROG = """
+    r(X, Y) :- e(X, Y).
+    r(X, Z) :- r(X, Y), e(Y, Z), !b(Z), Y < Z.
+    s(X) :- t(X).
+    q(X, Z) :- r(X, Y), e(Y, Z), r(Z, W), W < X.
+"""
+
+
+def show(rules):
+    return sorted(str(rule).split(': ', 1)[1] for rule in rules)
+
+
+class TestMagic(base.TestCase):
+    """Test the magic sets rewriting"""
+
+    def test_adornment(self):
+        atom = parser.parse_atom('p(X, 1, "a", Y, none)')
+        self.assertEqual('fbbfb', magic.adornment(atom.args))
+        self.assertEqual(
+            'bbbfb', magic.adornment(atom.args, {atom.args[0]}))
+
+    def test_rewrite(self):
+        rules = parser.wrapped_parse(PROG)
+        (new_rules, entries) = magic.rewrite(
+            rules, [('q', 'bf'), ('r', 'ff'), ('s', 'f'), ('u', 'b')])
+        self.assertEqual(
+            {('q', 'bf'): ('_adorned_bf_q', '_seed_bf_q')}, entries)
+        self.assertEqual(rules, new_rules[:len(rules)])
+        self.assertEqual(sorted([
+            '_magic_bf_q(V0) :- [_seed_bf_q(V0)]',
+            '_adorned_bf_q(X, Z) :- [_magic_bf_q(X), _adorned_bf_r(X, Y), '
+            'e(Y, Z), _adorned_bf_r(Z, W), <(W, X)]',
+            '_magic_bf_r(X) :- [_magic_bf_q(X)]',
+            '_magic_bf_r(Z) :- [_magic_bf_q(X), _adorned_bf_r(X, Y), '
+            'e(Y, Z)]',
+            '_adorned_bf_r(X, Y) :- [_magic_bf_r(X), e(X, Y)]',
+            '_adorned_bf_r(X, Z) :- [_magic_bf_r(X), _adorned_bf_r(X, Y), '
+            'e(Y, Z), ~b(Z), <(Y, Z)]']), show(new_rules[len(rules):]))
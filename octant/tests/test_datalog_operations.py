@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_datalog_operations
+-----------------------
+
+Tests for `operations` module.
+"""
+
+import mock
+import z3
+
+from octant.datalog import operations
+from octant.datalog import z3_comparison as z3c
+from octant.tests import base
+
+
+def bv(value):
+    return z3.BitVecVal(value, 8)
+
+
+class TestOperations(base.TestCase):
+    """Test primitive operations"""
+
+    def setUp(self):
+        super(TestOperations, self).setUp()
+        operations.reset()
+        z3c.reset()
+
+    def test_operation_ground(self):
+        def apply(name, *args):
+            return operations.operation(name, [bv(arg) for arg in args])
+        self.assertEqual(0x0c, apply('&', 0x3c, 0x0f).as_long())
+        self.assertEqual(0x3f, apply('|', 0x3c, 0x0f).as_long())
+        self.assertEqual(0xc3, apply('~', 0x3c).as_long())
+        result = apply('~', 0x3c)
+        self.assertIs(result, apply('~', 0x3c))
+        self.assertEqual(z3.BitVecSort(8), result.sort())
+
+    def test_operation_symbolic(self):
+        x = z3.BitVec('x', 8)
+        result = operations.operation('&', [x, bv(0x0f)])
+        self.assertEqual(True, z3.eq(x & bv(0x0f), result))
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_comparison_ground(self, mock_cfg):
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            for (name, args, expected) in [
+                    ('=', [3, 3], True), ('=', [3, 4], False),
+                    ('<', [3, 4], True), ('<', [4, 4], False),
+                    ('<=', [4, 4], True), ('<=', [5, 4], False),
+                    ('>', [5, 4], True), ('>', [4, 4], False),
+                    ('>=', [4, 4], True), ('>=', [3, 4], False)]:
+                result = operations.comparison(
+                    name, [bv(arg) for arg in args])
+                self.assertEqual(expected, z3.is_true(result))
+                self.assertEqual(not expected, z3.is_false(result))
+        # No comparison predicate is introduced for constants
+        self.assertEqual({}, z3c.inferior_to)
+        self.assertEqual({}, z3c.superior_to)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_comparison_sign(self, mock_cfg):
+        # Z3 comparisons are signed, comparisons to constants are not.
+        args = [bv(0x80), bv(0x01)]
+        mock_cfg.doc = False
+        self.assertEqual(
+            z3.is_true(z3.simplify(args[0] < args[1])),
+            z3.is_true(operations.comparison('<', args)))
+        self.assertEqual(True, z3.is_true(operations.comparison('<', args)))
+        mock_cfg.doc = True
+        self.assertEqual(True, z3.is_false(operations.comparison('<', args)))
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_comparison_symbolic(self, mock_cfg):
+        mock_cfg.doc = True
+        x = z3.BitVec('x', 8)
+        result = operations.comparison('<', [x, bv(4)])
+        self.assertEqual('_inf_4_8(x)', str(result))
+        mock_cfg.doc = False
+        result = operations.comparison('<', [x, bv(4)])
+        self.assertEqual(True, z3.eq(z3.simplify(x < bv(4)), result))
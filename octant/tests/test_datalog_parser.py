@@ -62,6 +62,18 @@ class TestLexer(base.TestCase):
             self.assertEqual(s, t.value)
             self.assertIs(None, lex.token())
 
+    def test_ip6(self):
+        lex = parser.lexer
+        for s, r in [('2001:db8::1', '2001:db8::1'),
+                     ('::', '::'),
+                     ('fe80::', 'fe80::'),
+                     ('2001:DB8:0:0:0:0:0:1', '2001:db8::1')]:
+            lex.input(s)
+            t = lex.token()
+            self.assertEqual('IP6', t.type)
+            self.assertEqual(r, t.value)
+            self.assertIs(None, lex.token())
+
     def test_string(self):
         lex = parser.lexer
         for s, r in [('"192.168.122.1"', '192.168.122.1'),
@@ -175,6 +187,15 @@ class TestParser(base.TestCase):
             [ast.Rule(ast.Atom('p', [ast.IpConstant('192.168.0.1')]), [])],
             r)
 
+    def test_expr_ip6(self):
+        reset()
+        r = pp("p(X) :- X = 2001:db8::1, q(3:int4).")
+        reset()
+        self.assertEqual(
+            'ipv6_address', r[0].body[0].args[1].type)
+        self.assertEqual('2001:db8::1', r[0].body[0].args[1].val)
+        self.assertEqual('int4', r[0].body[1].args[0].type)
+
     def test_expr_constant(self):
         reset()
         r = pp("p(c).")
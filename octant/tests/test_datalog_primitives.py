@@ -23,6 +23,7 @@ Tests for `primitives` module.
 
 import z3
 
+from octant.common import base as obase
 from octant.common import primitives
 from octant.tests import base
 
@@ -48,6 +49,10 @@ class TestBoolType(base.TestCase):
         self.assertEqual(TestBoolType.bool_true, self.type.to_z3(True))
         self.assertEqual(TestBoolType.bool_false, self.type.to_z3(False))
 
+    def test_to_int(self):
+        self.assertEqual(1, self.type.to_int(True))
+        self.assertEqual(0, self.type.to_int(False))
+
     def test_from_z3(self):
         self.assertEqual(True, TestBoolType.bool_true)
         self.assertEqual(False, TestBoolType.bool_false)
@@ -77,10 +82,66 @@ class TestStringType(base.TestCase):
         self.assertIs(False,
                       self.type.to_z3('bbbb').as_long() == x.as_long())
 
+    def test_to_int(self):
+        code = self.type.to_int('aaaa')
+        self.assertEqual(code, self.type.to_int('aaaa'))
+        self.assertEqual(code, self.type.to_z3('aaaa').as_long())
+        self.assertIs(self.type.to_z3('aaaa'), self.type.to_z3('aaaa'))
+        self.assertNotEqual(code, self.type.to_int('bbbb'))
+
     def test_from_z3(self):
         self.assertEqual('aaaa', self.type.to_os(self.type.to_z3('aaaa')))
 
 
+class TestFittedStringType(base.TestCase):
+    """String types sized from their content"""
+
+    def test_fit(self):
+        typ = primitives.StringType('string', size=None)
+        self.assertEqual(primitives.DEFAULT_STRING_SIZE, typ.size)
+        for val in ['a', 'b', 'c']:
+            typ.to_int(val)
+        self.assertIs(True, typ.fit())
+        self.assertEqual(3, typ.size)
+        self.assertEqual(3, typ.to_z3('c').size())
+        for i in range(4):
+            typ.to_int('v%d' % i)
+        self.assertIs(False, typ.fit())
+        self.assertEqual('v3', typ.to_os(typ.to_z3('v3')))
+        typ.to_int('v4')
+        self.assertIs(True, typ.fit())
+        self.assertEqual(4, typ.size)
+        self.assertEqual('v4', typ.to_os(typ.to_z3('v4')))
+        typ.unfit()
+        self.assertEqual(primitives.DEFAULT_STRING_SIZE, typ.size)
+
+    def test_reserved(self):
+        typ = primitives.StringType('string', size=None)
+        for val in ['a', 'b']:
+            typ.to_int(val)
+        typ.fit()
+        self.assertEqual(2, typ.size)
+        self.assertEqual(3, typ.reserved())
+        for i in range(8):
+            self.assertEqual(3, typ.to_z3('u%d' % i).as_long())
+        self.assertEqual(['a', 'b'], sorted(typ.map))
+        self.assertIs(False, typ.fit())
+        typ.to_int('c')
+        self.assertIs(False, typ.fit())
+        self.assertEqual(2, typ.to_z3('c').as_long())
+        typ.to_int('d')
+        self.assertIs(True, typ.fit())
+        self.assertEqual(3, typ.to_z3('d').as_long())
+        self.assertEqual(7, typ.to_z3('u0').as_long())
+
+    def test_fixed_size(self):
+        typ = primitives.StringType('string', size=1)
+        typ.to_int('a')
+        typ.to_int('b')
+        self.assertIs(False, typ.fit())
+        self.assertRaises(obase.Z3TypeError, typ.to_int, 'c')
+
+
 class TestNumType(base.TestCase):
     """Z3 Num values"""
 
@@ -97,6 +158,11 @@ class TestNumType(base.TestCase):
         self.assertEqual(16, x.size())
         self.assertEqual(342, x.as_long())
 
+    def test_to_int(self):
+        self.assertEqual(342, self.type.to_int(342))
+        self.assertEqual(342, self.type.to_int('342'))
+        self.assertEqual(0xffff, self.type.to_int(-1))
+
     def test_from_z3(self):
         self.assertEqual(421, self.type.to_os(self.type.to_z3(421)))
 
@@ -119,12 +185,44 @@ class TestIpType(base.TestCase):
         self.assertEqual(32, x.size())
         self.assertEqual(0x0a000004, x.as_long())
 
+    def test_to_int(self):
+        self.assertEqual(0x0a000004, self.type.to_int(u'10.0.0.4'))
+        self.assertEqual(0x04, primitives.IpAddressType(size=8).to_int(
+            u'10.0.0.4'))
+
     def test_from_z3(self):
         self.assertEqual(
             u'192.168.0.1',
             self.type.to_os(self.type.to_z3(u'192.168.0.1')))
 
 
+class TestIpv6Type(base.TestCase):
+    """Z3 IPv6 values"""
+
+    def setUp(self):
+        self.type = primitives.Ipv6AddressType()
+        super(TestIpv6Type, self).setUp()
+
+    def test_to_z3(self):
+        x = self.type.to_z3(u'2001:db8::1')
+        self.assertEqual(63, x.size())
+        self.assertEqual(0x20010db8 << 32, x.as_long())
+        self.assertEqual(0, self.type.to_int(u'10.0.0.1'))
+
+    def test_from_z3(self):
+        self.assertEqual(
+            u'2001:db8:0:1::',
+            self.type.to_os(self.type.to_z3(u'2001:db8:0:1::')))
+        self.assertEqual(
+            u'fd00::', self.type.to_os(self.type.to_z3(u'fd00::1')))
+        small = primitives.Ipv6AddressType(size=15)
+        self.assertEqual(u'2001::', small.to_os(small.to_z3(u'2001:db8::')))
+
+    def test_ipv4_type(self):
+        self.assertEqual(
+            0, primitives.IpAddressType().to_int(u'2001:db8::1'))
+
+
 class TestPrimitives(base.TestCase):
 
     def test_bit_of_masks(self):
@@ -140,6 +238,12 @@ class TestPrimitives(base.TestCase):
         self.assertEqual(
             u'10.0.0.0', primitives.prefix_of_network(u'10.0.0.0/8'))
 
+    def test_network_ipv6(self):
+        self.assertEqual(
+            u'2001:db8::', primitives.prefix_of_network(u'2001:db8::/32'))
+        self.assertEqual(
+            u'ffff:ffff::', primitives.mask_of_network(u'2001:db8::/32'))
+
     def test_mask_of_network(self):
         self.assertEqual(u'0.0.0.0', primitives.mask_of_network(None))
         self.assertEqual(
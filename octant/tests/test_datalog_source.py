@@ -21,6 +21,10 @@ test_datalog_source
 Tests for `datalog_source` module.
 """
 
+import os
+import shutil
+import tempfile
+
 import mock
 
 from octant.common import ast
@@ -53,6 +57,50 @@ BACKUP_FILE = (
     "T1,T1-S1-R3x3,T1-S1-R3x2\r\n")
 
 
+class Client(object):
+    """Fake REST client counting its listings"""
+
+    def __init__(self):
+        self.calls = 0
+        self.sub = self
+
+    def items(self, kind=None):
+        self.calls += 1
+        return (kind + str(i) for i in range(3))
+
+
+class TestListingCache(base.TestCase):
+    """Memoization of listings"""
+
+    def test_shared(self):
+        client = Client()
+        cache = source.ListingCache(client)
+        self.assertEqual(["a0", "a1", "a2"], cache.sub.items(kind="a"))
+        self.assertEqual(["a0", "a1", "a2"], cache.sub.items(kind="a"))
+        self.assertEqual(1, client.calls)
+        self.assertEqual(["b0", "b1", "b2"], cache.items("b"))
+        self.assertEqual(2, client.calls)
+        cache.reset()
+        cache.sub.items(kind="a")
+        self.assertEqual(3, client.calls)
+
+    def test_reset_on_exit(self):
+        client = Client()
+        cache = source.ListingCache(client)
+        src = source.Datasource({})
+        src.register(cache, {"T": (lambda c: c.items("t"), {})})
+        with mock.patch("oslo_config.cfg.CONF") as mock_conf:
+            mock_conf.save = None
+            mock_conf.restore = None
+            with src:
+                src.retrieve_table("T", [], lambda x: ())
+                src.retrieve_table("T", [], lambda x: ())
+            self.assertEqual(1, client.calls)
+            with src:
+                src.retrieve_table("T", [], lambda x: ())
+        self.assertEqual(2, client.calls)
+
+
 class TestDatasource(base.TestCase):
     """Basic test class"""
     def setUp(self):
@@ -98,8 +146,34 @@ class TestDatasource(base.TestCase):
             "z3T1-S0-R3x3 z3T1-S0-R3x2"]
         self.assertEqual(expected, buffer)
 
+    def test_prefetch(self):
+        calls = []
+
+        def counting(access):
+            def counted(session):
+                calls.append(session)
+                return access(session)
+            return counted
+
+        for (tablename, (access, fields)) in self.content.items():
+            self.content[tablename] = (counting(access), fields)
+        self.src.register(self.mysession, self.content)
+        self.src.prefetch(["T1", "T2", "T3"], 2)
+        self.assertEqual(2, len(calls))
+        self.assertEqual(["T2-S0-R"], self.src.prefetched["T2"])
+        buffer = []
+        self.src.retrieve_table(
+            "T2", ["f4"], lambda l: buffer.append(" ".join(l)))
+        self.assertEqual(["z3T2-S0-Rx4"], buffer)
+        self.assertEqual(2, len(calls))
+        self.assertNotIn("T2", self.src.prefetched)
+
+    def test_prefetch_sequential(self):
+        self.src.prefetch(["T1", "T2"], 1)
+        self.assertEqual({}, self.src.prefetched)
+
     @mock.patch("oslo_config.cfg.CONF")
-    @mock.patch("octant.source.source.open")
+    @mock.patch("octant.source.backup.open")
     def test_save(self, mock_open, mock_conf):
         mock_conf.save = "file"
         mock_conf.restore = None
@@ -107,7 +181,7 @@ class TestDatasource(base.TestCase):
         with self.src:
             self.src.retrieve_table("T1", ["f3", "f2"], lambda x: ())
         mock_open.assert_called_once_with('file', mode='w')
-        mock_open.write.has_calls([
+        mock_open.return_value.write.assert_has_calls([
             mock.call('T1,f3,f2\r\n'),
             mock.call('T1,T1-S0-R1x3,T1-S0-R1x2\r\n'),
             mock.call('T1,T1-S0-R2x3,T1-S0-R2x2\r\n'),
@@ -115,13 +189,14 @@ class TestDatasource(base.TestCase):
         ])
 
     @mock.patch("oslo_config.cfg.CONF")
-    @mock.patch("octant.source.source.open")
-    def test_restore(self, mock_open, mock_conf):
+    def test_restore(self, mock_conf):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        filename = os.path.join(folder, "file")
+        with open(filename, "w") as fd:
+            fd.write(BACKUP_FILE)
         mock_conf.save = None
-        mock_conf.restore = "file"
-        mock.mock_open(mock=mock_open, read_data=BACKUP_FILE)
-        # Patch the mock_open file to support iteration.
-        mock_open.return_value.__iter__ = lambda x: iter(x.readline, '')
+        mock_conf.restore = filename
         buffer = []
 
         def mk_relation(l):
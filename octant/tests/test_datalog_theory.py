@@ -22,9 +22,14 @@ Tests for `datalog_theory` module.
 """
 
 import mock
+import six
+import z3
 
 from octant.common import base as obase
+from octant.common import primitives
+from octant.datalog import magic as mg
 from octant.datalog import theory
+from octant.datalog import unfolding
 from octant.datalog import z3_result as z3r
 from octant.front import parser
 from octant.tests import base
@@ -46,6 +51,10 @@ def standard_cfg(mock_cfg):
     mock_cfg.debug = False
     mock_cfg.smt2 = None
     mock_cfg.filesource = []
+    mock_cfg.serve = False
+    mock_cfg.workers = 4
+    mock_cfg.cache = None
+    mock_cfg.magic = False
 
 
 PROG1 = """
@@ -71,6 +80,25 @@ def mocked_register(ds):
     ds.register({}, content)
 
 
+def mocked_register_names(ds):
+    content = {
+        "n": (
+            lambda s: ['a', 'b'],
+            {"name": ("string", lambda s: s)})
+    }
+    ds.register({}, content)
+
+
+def mocked_register_edges(ds):
+    content = {
+        "e": (
+            lambda s: [(1, 2), (2, 3), (3, 4), (5, 6)],
+            {"src": ("int", lambda e: e[0]),
+             "dst": ("int", lambda e: e[1])})
+    }
+    ds.register({}, content)
+
+
 class TestDatalogTheory(base.TestCase):
     """Test datalog_theory"""
 
@@ -141,3 +169,422 @@ class TestDatalogTheory(base.TestCase):
         self.assertEqual(
             (['X'], [z3r.Cube({0: 421}, 1), z3r.Cube({0: 567}, 1)]),
             theo.query(parser.parse_atom("p(X)")))
+
+    def test_add_facts(self):
+        context = z3.Fixedpoint()
+        context.set(engine='datalog')
+        sort = z3.BitVecSort(32)
+        rel = z3.Function('r', sort, sort, z3.BoolSort())
+        context.register_relation(rel)
+        theory.add_facts(context, rel, [(1, 2), (0xffffffff, 3)])
+        x = z3.Const('x', sort)
+        y = z3.Const('y', sort)
+        context.query(z3.Exists([x, y], rel(x, y)))
+        answer = context.get_answer()
+
+        def holds(*row):
+            return z3.is_true(z3.simplify(z3.substitute_vars(
+                answer, *[z3.BitVecVal(v, sort) for v in row])))
+        self.assertTrue(holds(1, 2))
+        self.assertTrue(holds(0xffffffff, 3))
+        self.assertFalse(holds(1, 3))
+
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_load_facts_large(self, mock_cfg, src1, src2):
+        standard_cfg(mock_cfg)
+        theo = theory.Z3Theory(pp("p(X) :- X = 3:int4."))
+        theo.build_theory()
+        sort = z3.BitVecSort(40)
+        rel = z3.Function('big', sort, z3.BoolSort())
+        theo.context.register_relation(rel)
+        theo.relations['big'] = rel
+        with mock.patch('octant.datalog.theory.add_facts') as bulk:
+            theo.load_facts('big', {(1 << 36,)})
+            bulk.assert_not_called()
+        x = z3.Const('x', sort)
+        theo.context.query(z3.Exists([x], rel(x)))
+        answer = theo.context.get_answer()
+        self.assertTrue(z3.is_true(z3.simplify(z3.substitute_vars(
+            answer, z3.BitVecVal(1 << 36, sort)))))
+
+    @mock.patch("octant.source.openstack_source.register", new=mocked_register)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_ingest(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        theo = theory.Z3Theory(pp("p(X) :- q(a=X)."))
+        theo.build_theory()
+        self.assertEqual({'q': {(421,), (567,)}}, theo.facts)
+        context = theo.context
+        self.assertEqual({}, theo.ingest({'q': [(421,), (567,)]}))
+        self.assertEqual(
+            {'q': (1, 0)}, theo.ingest({'q': [(421,), (567,), (12,)]}))
+        self.assertIs(context, theo.context)
+        (variables, answers) = theo.query(parser.parse_atom("p(X)"))
+        self.assertEqual(['X'], variables)
+        self.assertEqual(
+            [12, 421, 567], sorted(cube.faces[0] for cube in answers))
+        self.assertEqual({'q': (0, 2)}, theo.ingest({'q': [(12,)]}))
+        self.assertIsNot(context, theo.context)
+        self.assertEqual(
+            (['X'], [z3r.Cube({0: 12}, 1)]),
+            theo.query(parser.parse_atom("p(X)")))
+        self.assertRaises(
+            obase.Z3NotWellFormed, theo.ingest, {'r': []})
+
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_ipv6(self, mock_cfg, src1, src2):
+        standard_cfg(mock_cfg)
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            theo = theory.Z3Theory(pp(
+                "a(2001:db8:0:1::5). a(2001:db8:0:2::5). a(fe80::1)."
+                "in(X) :- a(X), 2001:db8:0:1:: = X & ffff:ffff:ffff:ffff::."))
+            theo.build_theory()
+            self.assertEqual(
+                (['X'], [z3r.Cube({0: '2001:db8:0:1::'}, 1)]),
+                theo.query(parser.parse_atom("in(X)")))
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_names)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_fit_types(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        theo = theory.Z3Theory(pp('p(X) :- n(name=X). p("c").'))
+        theo.build_theory()
+        typ = primitives.TYPES['string']
+        self.assertLess(typ.size, primitives.DEFAULT_STRING_SIZE)
+        self.assertEqual(typ.size, theo.relations['n'].domain(0).size())
+        (_, answers) = theo.query(parser.parse_atom("p(X)"))
+        self.assertEqual(
+            ['a', 'b', 'c'], sorted(cube.faces[0] for cube in answers))
+        names = ['v%d' % i for i in range(1 << typ.size)]
+        rows = [(typ.to_int(name),) for name in names]
+        self.assertEqual({'n': (len(names), 2)}, theo.ingest({'n': rows}))
+        self.assertEqual(typ.size, theo.relations['n'].domain(0).size())
+        (_, answers) = theo.query(parser.parse_atom("p(X)"))
+        self.assertEqual(
+            sorted(names + ['c']), sorted(cube.faces[0] for cube in answers))
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_names)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_remap_facts(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        theo = theory.Z3Theory(pp('p(X) :- n(name=X).'))
+        facts = {'n': {(1,), (2,)}}
+        self.assertIs(facts, theo.remap_facts(facts, {}))
+        theo.datasource.retrieved['n'] = (['name'], {(1,), (3,)})
+        self.assertEqual(
+            {'n': {(2,), (5,)}},
+            theo.remap_facts(facts, {'string': {1: 5}, 'id': {2: 7}}))
+        self.assertEqual(
+            {'n': (['name'], {(3,), (5,)})}, theo.datasource.retrieved)
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_names)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_fit_types_unknown_constants(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        typ = primitives.StringType('string', size=None)
+        patcher = mock.patch.dict(primitives.TYPES, {'string': typ})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        theo = theory.Z3Theory(pp('p(X, Y) :- n(name=X), n(name=Y).'))
+        theo.build_theory()
+        self.assertEqual(2, typ.size)
+        unknown = ['u%d' % i for i in range(1 << typ.size)]
+        for name in unknown:
+            self.assertEqual(
+                ([], False),
+                theo.query(parser.parse_atom('n("{}")'.format(name))))
+            self.assertEqual(
+                (['X'], False),
+                theo.query(parser.parse_atom('p(X, "{}")'.format(name))))
+        queries = ['p("a", X)'] + [
+            'p(X, "{}")'.format(name) for name in unknown]
+        _, results = theo.query_batch(
+            [parser.parse_atom(query) for query in queries])
+        self.assertEqual(
+            [(['X'], False)] * len(unknown),
+            [(variables, answer) for (variables, answer, _) in results[1:]])
+        self.assertEqual(
+            ['a', 'b'], sorted(cube.faces[0] for cube in results[0][1]))
+        self.assertEqual(2, typ.size)
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_names)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_unknown_constants_free_variable(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            typ = primitives.StringType('string', size=None)
+            with mock.patch.dict(primitives.TYPES, {'string': typ}):
+                # The second rule leaves Y free: it holds for unknown values.
+                theo = theory.Z3Theory(pp(
+                    'p(X, Y) :- n(name=X), n(name=Y). '
+                    'p(X, Y) :- n(name=X), X = "a".'))
+                theo.build_theory()
+                size = typ.size
+                for name in ['u%d' % i for i in range(1 << size)]:
+                    self.assertEqual(
+                        (['X'], [z3r.Cube({0: 'a'}, 1)]),
+                        theo.query(parser.parse_atom(
+                            'p(X, "{}")'.format(name))))
+                    self.assertEqual(
+                        ([], True),
+                        theo.query(parser.parse_atom(
+                            'p("a", "{}")'.format(name))))
+                self.assertEqual(size, typ.size)
+
+    @mock.patch("octant.source.openstack_source.register", new=mocked_register)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_query_batch(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            theo = theory.Z3Theory(pp(
+                "p(X) :- q(a=X). r(X, Y) :- p(X), p(Y), X < Y. s(X) :- p(X)."))
+            theo.build_theory()
+            queries = ["p(X)", "r(X, Y)", "p(421)", "p(3)", "s(X)"]
+            expected = [
+                theo.query(parser.parse_atom(query)) for query in queries]
+            _, results = theo.query_batch(
+                [parser.parse_atom(query) for query in queries])
+            self.assertEqual(
+                expected,
+                [(variables, answer) for (variables, answer, _) in results])
+            _, results = theo.query_batch([parser.parse_atom("r(X, X)")])
+            self.assertEqual([(['X'], False)],
+                             [(v, a) for (v, a, _) in results])
+            self.assertEqual((0.0, []), theo.query_batch([]))
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_edges)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_query_batch_bounded(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        mock_cfg.magic = True
+        prog = """
+            reach(X, Y) :- e(src=X, dst=Y).
+            reach(X, Z) :- reach(X, Y), e(src=Y, dst=Z).
+        """
+        atoms = [parser.parse_atom("reach(1, X)")]
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            theo = theory.Z3Theory(pp(prog), adornments=[
+                (atom.table, mg.adornment(atom.args)) for atom in atoms])
+            theo.build_theory()
+            program = str(theo.context)
+            for start in [1, 2, 5, 1]:
+                query = "reach({}, X)".format(start)
+                _, results = theo.query_batch([parser.parse_atom(query)])
+                self.assertEqual(
+                    results[0][:2], theo.query(parser.parse_atom(query)))
+            self.assertEqual(
+                [2, 3, 4],
+                sorted(cube.faces[0] for cube in results[0][1]))
+            self.assertEqual(program, str(theo.context))
+
+    @mock.patch("octant.source.openstack_source.register", new=mocked_register)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_query_parallel(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            theo = theory.Z3Theory(pp(
+                "p(X) :- q(a=X). r(X, Y) :- p(X), p(Y), X < Y. s(X) :- p(X)."))
+            theo.build_theory()
+            queries = ["p(X)", "r(X, Y)", "p(421)", "p(3)", "s(X)"]
+            expected = [
+                theo.query(parser.parse_atom(query)) for query in queries]
+            _, results = theo.query_parallel(
+                [parser.parse_atom(query) for query in queries], 2)
+            self.assertEqual(
+                expected,
+                [(variables, answer) for (variables, answer, _) in results])
+            self.assertEqual((0.0, []), theo.query_parallel([], 2))
+            self.assertRaises(
+                obase.Z3NotWellFormed, theo.query_parallel,
+                [parser.parse_atom("p(X)"), parser.parse_atom("u(X)")], 2)
+
+    @mock.patch("octant.source.openstack_source.register", new=mocked_register)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_goals(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            theo = theory.Z3Theory(
+                pp("p(X) :- q(a=X). r(3). s(X) :- r(X). t(X) :- s(X)."),
+                goals=['s'])
+            self.assertEqual(['r', 's'], [
+                rule.head_table() for rule in theo.rules])
+            self.assertEqual({}, theo.compiler.extensible_tables)
+            theo.build_theory()
+            self.assertEqual(
+                (['X'], [z3r.Cube({0: 3}, 1)]),
+                theo.query(parser.parse_atom("s(X)")))
+            self.assertRaises(
+                obase.Z3NotWellFormed, theo.query, parser.parse_atom("p(X)"))
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_edges)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_magic(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        prog = """
+            reach(X, Y) :- e(src=X, dst=Y).
+            reach(X, Z) :- reach(X, Y), e(src=Y, dst=Z).
+            unreach(X, Y) :- e(src=X), e(dst=Y), !reach(X, Y).
+            next2(X, Z) :- reach(X, Y), reach(Y, Z), Y < 3.
+        """
+        queries = [
+            "reach(1, X)", "reach(X, 4)", "reach(1, 4)", "reach(X, Y)",
+            "unreach(1, X)", "next2(1, X)"]
+
+        def answers(magic):
+            mock_cfg.magic = magic
+            atoms = [parser.parse_atom(query) for query in queries]
+            theo = theory.Z3Theory(pp(prog), adornments=[
+                (atom.table, mg.adornment(atom.args)) for atom in atoms])
+            theo.build_theory()
+            if magic:
+                self.assertIn(('reach', 'bf'), theo.compiler.magic)
+                self.assertNotIn(('reach', 'ff'), theo.compiler.magic)
+            _, results = theo.query_batch(atoms)
+            return [
+                (variables,
+                 sorted(sorted(cube.faces.items()) for cube in answer)
+                 if isinstance(answer, list) else answer)
+                for (variables, answer, _) in results]
+
+        for doc in [False, True]:
+            mock_cfg.doc = doc
+            expected = answers(False)
+            self.assertEqual(
+                (['X'], [[(0, 2)], [(0, 3)], [(0, 4)]]), expected[0])
+            self.assertEqual(expected, answers(True))
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_edges)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_unfold(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        mock_cfg.spec = False
+        prog = """
+            up(X, Y) :- e(src=X, dst=Y), X < Y.
+            down(X, Y) :- e(src=X, dst=Y), Y < X.
+            skip(X, Z) :- e(src=X, dst=Y), e(src=Y, dst=Z), X < Z.
+        """
+        queries = ["up(X, Y)", "down(X, Y)", "skip(X, Y)"]
+
+        def answers(doc):
+            # The difference of cubes engine needs unfolding for comparisons
+            mock_cfg.doc = doc
+            mock_cfg.unfold = doc
+            theo = theory.Z3Theory(pp(prog))
+            theo.build_theory()
+            if doc:
+                self.assertEqual(3, len(theo.compiler.unfold_plan.plan))
+                self.assertNotIn('_env_', str(theo.context))
+            _, results = theo.query_batch(
+                [parser.parse_atom(query) for query in queries])
+            return [
+                sorted(sorted(cube.faces.items()) for cube in answer)
+                if isinstance(answer, list) else answer
+                for (_, answer, _) in results]
+
+        expected = answers(False)
+        self.assertEqual([[(0, 1), (1, 3)], [(0, 2), (1, 4)]], expected[2])
+        self.assertEqual(False, expected[1])
+        self.assertEqual(expected, answers(True))
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_edges)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_unfold_specialized(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        prog = """
+            up(X, Y) :- e(src=X, dst=Y), X < Y, !X = 1.
+            far(X) :- e(src=X, dst=Y), e(src=Y, dst=Z), Z < 5, X > 1.
+        """
+        queries = ["up(X, Y)", "far(X)"]
+
+        def answers(doc):
+            mock_cfg.doc = doc
+            mock_cfg.unfold = doc
+            mock_cfg.spec = doc
+            theo = theory.Z3Theory(pp(prog))
+            theo.build_theory()
+            if doc:
+                self.assertNotIn('_env_', str(theo.context))
+                self.assertNotIn('_atom_', str(theo.context))
+            _, results = theo.query_batch(
+                [parser.parse_atom(query) for query in queries])
+            return [
+                sorted(sorted(cube.faces.items()) for cube in answer)
+                if isinstance(answer, list) else answer
+                for (_, answer, _) in results]
+
+        expected = answers(False)
+        self.assertEqual([[(0, 2)]], expected[1])
+        self.assertEqual(expected, answers(True))
+
+    @mock.patch("octant.source.openstack_source.register",
+                new=mocked_register_edges)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_unfold_extra_environment(self, mock_cfg, src1):
+        standard_cfg(mock_cfg)
+        mock_cfg.unfold = True
+        prog = "up(X, Y) :- e(src=X, dst=Y), X < Y, !X = 1."
+        plan_environments = unfolding.plan_environments
+
+        def extend(env):
+            # Environments may bind ids that are not variables of the rule
+            env = dict(env)
+            env[('::1', None)] = z3.BitVecVal(1, 32)
+            env[('P', 1)] = z3.BitVecVal(2, 32)
+            return env
+
+        def extended(*args):
+            return {
+                rid: (extend(env) for env in envs)
+                for (rid, envs) in six.iteritems(plan_environments(*args))}
+
+        def answers(doc, spec):
+            mock_cfg.doc = doc
+            mock_cfg.spec = spec
+            theo = theory.Z3Theory(pp(prog))
+            with mock.patch(
+                    "octant.datalog.unfolding.plan_environments",
+                    new=extended):
+                theo.build_theory()
+            self.assertEqual(doc, theo.compiler.unfold_plan is not None)
+            _, results = theo.query_batch([parser.parse_atom("up(X, Y)")])
+            return [
+                sorted(sorted(cube.faces.items()) for cube in answer)
+                if isinstance(answer, list) else answer
+                for (_, answer, _) in results]
+
+        expected = answers(False, False)
+        self.assertEqual([[(0, 2), (1, 3)], [(0, 3), (1, 4)],
+                          [(0, 5), (1, 6)]], expected[0])
+        for spec in [False, True]:
+            self.assertEqual(expected, answers(True, spec))
@@ -136,3 +136,12 @@ class TestTypechecker(base.TestCase):
         self.assertRaises(
             obase.Z3TypeError,
             lambda: typechecker.type_theory(prog, {}, MockSource({})))
+
+    def test_backward_chain(self):
+        # Types flow from the last rule to the first one.
+        prog = parser.wrapped_parse(
+            "\n".join("p%d(X) :- p%d(X)." % (i, i + 1) for i in range(50)) +
+            "p50(X) :- q(X).")
+        tables = typechecker.type_theory(prog, PRIM1, MockSource(SRC1))
+        for i in range(51):
+            self.assertEqual(["t1"], tables["p%d" % i])
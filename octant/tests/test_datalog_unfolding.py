@@ -16,6 +16,8 @@
 
 """Tests for datalog_unfolding module"""
 
+import copy
+
 import z3
 
 from octant.common import ast
@@ -113,6 +115,16 @@ class TestUnfolding(base.TestCase):
         result = origin.reduce_conj([t1, t2, t4, t5])
         self.assertIsInstance(result, origin.UFConj)
         self.assertEqual(set(result.args), {t1, t2})
+        self.assertEqual(t4, origin.reduce_conj([t4, origin.top]))
+        self.assertEqual(origin.top, origin.reduce_conj([origin.top]))
+
+    def test_members_order(self):
+        t1 = origin.UFGround(1, "t", None)
+        t2 = origin.UFGround(2, "u", None)
+        for cls in (origin.UFDisj, origin.UFConj):
+            self.assertEqual(cls((t1, t2)), cls((t2, t1)))
+            self.assertEqual(hash(cls((t1, t2))), hash(cls((t2, t1))))
+            self.assertNotEqual(cls((t1, t2)), cls((t1,)))
 
     def test_get_to_solve(self):
         prog = parser.wrapped_parse("t(X) :- p(X,Y), X = Y & 1, q(X), X < 10.")
@@ -192,6 +204,28 @@ class TestUnfolding(base.TestCase):
         typ_s0 = result['s'][0]
         self.assertIsInstance(typ_s0, origin.UFDisj)
 
+    def test_type_incremental(self):
+        prog = "\n".join(
+            "t{0}(X, Y) :- t{1}(X, Z), q(Z, Y)."
+            " u{0}(X, Y) :- t{0}(X, Y), u{0}(Y, X)."
+            " u{0}(X, Y) :- q(X, Y).".format(i, i + 1)
+            for i in range(6)) + "t6(X, Y) :- q(X, Y)."
+        rules = parser.wrapped_parse(prog)
+        external = {'q': ['int', 'int']}
+        unfold = origin.Origin(copy.deepcopy(rules), external)
+        var_types = unfold.type()
+        # Full iteration over all the rules until table types are stable
+        expected = origin.Origin(rules, external)
+        expected.initialize_types()
+        while True:
+            expected.type_variables()
+            table_types = expected.type_tables()
+            if table_types == expected.table_types:
+                break
+            expected.table_types = table_types
+        self.assertEqual(expected.table_types, unfold.table_types)
+        self.assertEqual(expected.var_types, var_types)
+
     def test_strategy_1(self):
         rules = parser.wrapped_parse(prog1)
         external = {'q': ['int', 'int'], 'p': ['int'], 'r': ['int']}
@@ -216,36 +250,18 @@ class TestUnfolding(base.TestCase):
             for (plan, _) in result]
         self.assertEqual([[('p', [0])], [('p', [0]), ('q', [0])]], filtered)
 
-    def test_plan_to_program(self):
-        rules = parser.wrapped_parse(prog0)   # arbitrary not really used
-        rules[0].id = 0         # but we need a zero rule
-        fp = z3.Fixedpoint()
+    def test_plan_environments(self):
         datasource = source.Datasource(primitives.TYPES)
-        octant_type = datasource.types["int4"]
-        z3_type = octant_type.type()
-
-        def mkv(v):
-            return z3.BitVecVal(v, z3_type)
-
-        p = z3.Function('p', z3_type, z3_type, z3.BoolSort())
-        q = z3.Function('q', z3_type, z3_type, z3.BoolSort())
-        for (x, y) in [(3, 0), (4, 1)]:
-            fp.add_rule(p(mkv(x), mkv(y)))
-        for (x, y) in [(5, 0), (6, 1)]:
-            fp.add_rule(q(mkv(x), mkv(y)))
-        relations = {'p': p, 'q': q}
         x = ast.Variable("X", "int4")
         y = ast.Variable("Y", "int4")
         z = ast.Variable("Z", "int4")
-        for f in [p, q]:
-            fp.register_relation(f)
+        facts = {'p': {(3, 0), (4, 1)}, 'q': {(5, 0), (6, 1), (7, 2)}}
         unfold_plan = unfolding.UnfoldPlan(
             {0: [((('p', [1, 0]),), [x, y]),
                  ((('q', [0, 1]),), [z, x])]},
             {})
-        records = unfolding.plan_to_program(
-            unfold_plan, fp, datasource, relations, rules)
-        self.assertIn(0, records)
+        records = unfolding.plan_environments(
+            unfold_plan, facts, datasource, [])
         trimmed = sorted([
             sorted((var, val.as_long()) for ((var, _), val) in rec.items())
             for rec in records[0]
@@ -256,37 +272,24 @@ class TestUnfolding(base.TestCase):
         ]
         self.assertEqual(expected, trimmed)
 
-    def test_plan_to_program_idb(self):
-        rules = parser.wrapped_parse(prog0)   # arbitrary not really used
-        rules[0].id = 0
-        fp = z3.Fixedpoint()
+    def test_plan_environments_idb_content(self):
         datasource = source.Datasource(primitives.TYPES)
-        octant_type = datasource.types["int4"]
-        z3_type = octant_type.type()
+        z3_type = datasource.types["int4"].type()
 
         def mkv(v):
             return z3.BitVecVal(v, z3_type)
 
-        p = z3.Function('p', z3_type, z3_type, z3.BoolSort())
-        q = z3.Function('q', z3_type, z3_type, z3.BoolSort())
-        content = {
-            'p': [(mkv(3), mkv(0)), (mkv(4), mkv(1))]
-        }
-        for (x, y) in [(5, 0), (6, 1)]:
-            fp.add_rule(q(mkv(x), mkv(y)))
-        relations = {'p': p, 'q': q}
         x = ast.Variable("X", "int4")
         y = ast.Variable("Y", "int4")
         z = ast.Variable("Z", "int4")
-        for f in [p, q]:
-            fp.register_relation(f)
+        facts = {'q': {(5, 0), (6, 1)}}
+        # p is a ground idb table whose content is computed by unfolding
         unfold_plan = unfolding.UnfoldPlan(
             {0: [((('p', [1, 0]),), [x, y]),
                  ((('q', [0, 1]),), [z, x])]},
-            content)
-        records = unfolding.plan_to_program(
-            unfold_plan, fp, datasource, relations, rules)
-        self.assertIn(0, records)
+            {'p': [(mkv(3), mkv(0)), (mkv(4), mkv(1))]})
+        records = unfolding.plan_environments(
+            unfold_plan, facts, datasource, [])
         trimmed = sorted([
             sorted((var, val.as_long()) for ((var, _), val) in rec.items())
             for rec in records[0]
@@ -296,3 +299,30 @@ class TestUnfolding(base.TestCase):
             [('X', 1), ('Y', 4), ('Z', 6)]
         ]
         self.assertEqual(expected, trimmed)
+
+    def test_plan_environments_idb(self):
+        rules = parser.wrapped_parse("g(2:int4, 5:int4).")
+        datasource = source.Datasource(primitives.TYPES)
+        z3_type = datasource.types["int4"].type()
+
+        def mkv(v):
+            return z3.BitVecVal(v, z3_type)
+
+        x = ast.Variable("X", "int4")
+        y = ast.Variable("Y", "int4")
+        facts = {'q': {(5, 0), (6, 1), (7, 2), (8, 5)}}
+        # X comes from either p or the head of the rule defining g
+        unfold_plan = unfolding.UnfoldPlan(
+            {1: [((('p', [0]), (origin.GroundHead('g', rules[0].id), [1])),
+                  [x]),
+                 ((('q', [1, 0]),), [x, y])]},
+            {'p': [[mkv(0)], [mkv(1)]]})
+        records = unfolding.plan_environments(
+            unfold_plan, facts, datasource, rules)
+        trimmed = sorted(
+            sorted((var, val.as_long()) for ((var, _), val) in rec.items())
+            for rec in records[1])
+        expected = [
+            [('X', 0), ('Y', 5)], [('X', 1), ('Y', 6)], [('X', 5), ('Y', 8)]
+        ]
+        self.assertEqual(expected, trimmed)
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Tests for the instrumentation of octant phases"""
+
+import json
+
+from octant.common import instrumentation as instr
+from octant.tests import base
+
+
+class TestInstrumentation(base.TestCase):
+
+    def test_phase(self):
+        recorder = instr.Instrumentation()
+        for _ in range(2):
+            with recorder.phase('p'):
+                pass
+        record = recorder.report()['phases']['p']
+        self.assertEqual(2, record['calls'])
+        self.assertGreaterEqual(record['wall'], 0.0)
+        self.assertGreaterEqual(record['cpu'], 0.0)
+
+    def test_phase_exception(self):
+        recorder = instr.Instrumentation()
+
+        def failing():
+            with recorder.phase('p'):
+                raise ValueError()
+        self.assertRaises(ValueError, failing)
+        self.assertEqual(1, recorder.report()['phases']['p']['calls'])
+
+    def test_count(self):
+        recorder = instr.Instrumentation()
+        recorder.count('c')
+        recorder.count('c', 3)
+        self.assertEqual({'c': 4}, recorder.report()['counters'])
+        recorder.reset()
+        self.assertEqual({}, recorder.report()['counters'])
+
+    def test_hook(self):
+        recorder = instr.Instrumentation()
+        events = []
+        recorder.hooks.append(
+            lambda kind, name, value: events.append((kind, name)))
+        recorder.count('c', 2)
+        with recorder.phase('p'):
+            pass
+        self.assertEqual([('counter', 'c'), ('phase', 'p')], events)
+
+    def test_json(self):
+        recorder = instr.Instrumentation()
+        recorder.count('c', 2)
+        with recorder.phase('p'):
+            pass
+        result = json.loads(recorder.to_json())
+        self.assertEqual(2, result['counters']['c'])
+        self.assertIn('p', result['phases'])
+
+    def test_global_hook(self):
+        events = []
+
+        def hook(kind, name, value):
+            events.append((kind, name, value))
+        instr.add_hook(hook)
+        try:
+            instr.count('test_global_hook', 5)
+        finally:
+            instr.remove_hook(hook)
+        instr.count('test_global_hook')
+        self.assertEqual([('counter', 'test_global_hook', 5)], events)
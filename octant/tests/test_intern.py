@@ -0,0 +1,159 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Tests for the persistent intern tables"""
+
+import os
+import shutil
+import stat
+import tempfile
+import threading
+
+from octant.common import base as obase
+from octant.common import intern
+from octant.common import primitives
+from octant.tests import base
+
+
+class TestInternTable(base.TestCase):
+
+    def setUp(self):
+        super(TestInternTable, self).setUp()
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        self.filename = os.path.join(folder, 'id.intern')
+
+    def test_codes(self):
+        table = intern.InternTable(self.filename)
+        self.assertEqual(intern.NONE_CODE, table.code(None))
+        code_a = table.code(u'a')
+        code_b = table.code(u'b')
+        self.assertNotEqual(code_a, code_b)
+        self.assertEqual(code_a, table.code(u'a'))
+        self.assertEqual(u'b', table.value(code_b))
+        self.assertIsNone(table.value(intern.NONE_CODE))
+
+    def test_stable(self):
+        values = [u'v%d' % i for i in range(100)] + [u'été']
+        table = intern.InternTable(self.filename)
+        codes = [table.code(v) for v in values]
+        table.save()
+        self.assertEqual(codes, [table.code(v) for v in values])
+        table.close()
+        table = intern.InternTable(self.filename)
+        self.assertEqual(len(values), table.count)
+        self.assertEqual(
+            codes[::-1], [table.code(v) for v in reversed(values)])
+        self.assertEqual(values, [table.value(c) for c in codes])
+        new_code = table.code(u'new')
+        self.assertEqual(len(values) + 1, new_code)
+        table.save()
+        table.close()
+        table = intern.InternTable(self.filename)
+        self.assertEqual(new_code, table.code(u'new'))
+        self.assertEqual(codes[0], table.code(values[0]))
+        self.assertEqual(
+            sorted(values + [u'new']), sorted(v for (v, _) in table.items()))
+
+    def test_concurrent(self):
+        table1 = intern.InternTable(self.filename)
+        table2 = intern.InternTable(self.filename)
+        code1 = table1.code(u'x')
+        table2.code(u'y')
+        self.assertEqual({}, table2.save())
+        changed = table1.save()
+        table = intern.InternTable(self.filename)
+        self.assertEqual(
+            [u'x', u'y'], sorted(v for (v, _) in table.items()))
+        # The first table follows the codes stored by the second one.
+        self.assertEqual({code1: table.code(u'x')}, changed)
+        self.assertEqual(table.code(u'x'), table1.code(u'x'))
+        self.assertEqual(table.code(u'y'), table1.code(u'y'))
+
+    def test_concurrent_threads(self):
+        values = [[u'a%d' % i for i in range(50)] + [u'shared'],
+                  [u'b%d' % i for i in range(50)] + [u'shared']]
+        tables = [intern.InternTable(self.filename) for _ in values]
+        for (table, table_values) in zip(tables, values):
+            for value in table_values:
+                table.code(value)
+        start = threading.Event()
+        changes = [None, None]
+
+        def save(pos):
+            start.wait()
+            changes[pos] = tables[pos].save()
+
+        threads = [
+            threading.Thread(target=save, args=(pos,)) for pos in range(2)]
+        for thread in threads:
+            thread.start()
+        start.set()
+        for thread in threads:
+            thread.join()
+        # Only the table saved last has codes that changed
+        self.assertEqual(1, len([codes for codes in changes if codes]))
+        stored = intern.InternTable(self.filename)
+        self.assertEqual(101, stored.count)
+        for (table, table_values) in zip(tables, values):
+            self.assertEqual(
+                [stored.code(value) for value in table_values],
+                [table.code(value) for value in table_values])
+
+    def test_string_type_remap(self):
+        typ = primitives.StringType('id', size=None)
+        typ.use_table(intern.InternTable(self.filename))
+        code_x = typ.to_int(u'x')
+        other = intern.InternTable(self.filename)
+        other.code(u'y')
+        other.save()
+        typ.remap(typ.table.save())
+        self.assertEqual(other.code(u'y'), typ.table.code(u'y'))
+        self.assertNotEqual(code_x, typ.to_int(u'x'))
+        self.assertEqual(typ.table.code(u'x'), typ.to_int(u'x'))
+        self.assertEqual(u'x', typ.to_os(typ.to_z3(u'x')))
+
+    def test_mode(self):
+        umask = os.umask(0o027)
+        self.addCleanup(os.umask, umask)
+        table = intern.InternTable(self.filename)
+        table.code(u'a')
+        table.save()
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.filename).st_mode))
+        os.chmod(self.filename, 0o664)
+        table.code(u'b')
+        table.save()
+        self.assertEqual(0o664, stat.S_IMODE(os.stat(self.filename).st_mode))
+        table.close()
+
+    def test_bad_file(self):
+        with open(self.filename, 'wb') as fd:
+            fd.write(b'x' * 32)
+        self.assertRaises(
+            obase.Z3SourceError, intern.InternTable, self.filename)
+
+    def test_string_type(self):
+        typ = primitives.StringType('id', size=2)
+        typ.use_table(intern.InternTable(self.filename))
+        self.assertEqual(0, typ.to_int(None))
+        codes = [typ.to_int(v) for v in [u'a', u'b', u'c']]
+        self.assertEqual([1, 2, 3], codes)
+        self.assertEqual(u'b', typ.to_os(typ.to_z3(u'b')))
+        self.assertRaises(obase.Z3TypeError, typ.to_int, u'd')
+        typ.table.save()
+        typ2 = primitives.StringType('id', size=2)
+        typ2.use_table(intern.InternTable(self.filename))
+        self.assertEqual(u'c', typ2.to_os(typ.to_z3(u'c')))
@@ -14,7 +14,9 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import json
 import mock
+import re
 
 from octant.datalog import z3_result as z3r
 from octant.front import main as octant
@@ -33,6 +35,16 @@ def standard_cfg(mock_cfg):
     mock_cfg.debug = False
     mock_cfg.smt2 = None
     mock_cfg.filesource = []
+    mock_cfg.serve = False
+    mock_cfg.workers = 4
+    mock_cfg.cache = None
+    mock_cfg.stats = None
+    mock_cfg.ipsize = 32
+    mock_cfg.ipv6size = 63
+    mock_cfg.intern = None
+    mock_cfg.jobs = 1
+    mock_cfg.split = True
+    mock_cfg.magic = False
 
 
 class TestDatalogTheory(base.TestCase):
@@ -97,6 +109,128 @@ class TestDatalogTheory(base.TestCase):
         self.assertIs(True, "3452" in result)
         self.assertIs(True, "421" in result)
 
+    @mock.patch("octant.front.main.sys.exit")
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("octant.front.parser.open")
+    def test_main_jobs(self, mock_open, mock_cfg, mock_src1, mock_src2,
+                       mock_exit):
+        standard_cfg(mock_cfg)
+        mock_cfg.time = False
+        mock_cfg.jobs = 2
+        mock_cfg.query = ["p(X)", "q(X)", "p(3)"]
+        mock.mock_open(mock=mock_open, read_data="p(3452). q(421).")
+        with base.capture_stdout() as out:
+            octant.main()
+        result = out.getvalue()
+        self.assertLess(result.index("3452"), result.index("421"))
+        self.assertLess(result.index("421"), result.index("False"))
+
+    @mock.patch("octant.front.main.sys.exit")
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("octant.front.parser.open")
+    def test_main_split(self, mock_open, mock_cfg, mock_src1, mock_src2,
+                        mock_exit):
+        standard_cfg(mock_cfg)
+        mock_cfg.time = False
+        mock_cfg.query = ["r(X)", "s(X)", "p(X)"]
+        mock.mock_open(
+            mock=mock_open,
+            read_data="p(3452). q(421). r(X) :- p(X). s(X) :- q(X).")
+        for split in [True, False]:
+            mock_cfg.split = split
+            with mock.patch(
+                    "octant.datalog.theory.Z3Theory",
+                    wraps=octant.datalog_theory.Z3Theory) as theory_class:
+                with base.capture_stdout() as out:
+                    octant.main()
+            self.assertEqual(2 if split else 1, theory_class.call_count)
+            if not split:
+                self.assertEqual(
+                    {'p', 'r', 's'}, theory_class.call_args[0][1])
+            result = out.getvalue()
+            self.assertLess(result.index("3452"), result.index("421"))
+            self.assertLess(result.index("421"), result.rindex("3452"))
+
+    @mock.patch("octant.front.main.sys.exit")
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("octant.front.parser.open")
+    def test_main_split_shared(self, mock_open, mock_cfg, mock_src1,
+                               mock_src2, mock_exit):
+        listing = mock.Mock(return_value=[(1, 2), (3, 4)])
+
+        def register_edges(ds):
+            ds.register({}, {
+                "e": (listing,
+                      {"src": ("int", lambda e: e[0]),
+                       "dst": ("int", lambda e: e[1])})})
+        mock_src1.side_effect = register_edges
+        standard_cfg(mock_cfg)
+        mock_cfg.time = False
+        mock_cfg.query = ["r(X)", "s(X)"]
+        mock.mock_open(
+            mock=mock_open,
+            read_data="r(X) :- e(src=X). s(X) :- e(dst=X).")
+        with mock.patch(
+                "octant.datalog.theory.Z3Theory",
+                wraps=octant.datalog_theory.Z3Theory) as theory_class:
+            with base.capture_stdout() as out:
+                octant.main()
+        self.assertEqual(2, theory_class.call_count)
+        self.assertEqual(1, mock_src1.call_count)
+        self.assertEqual(1, mock_src2.call_count)
+        self.assertEqual(1, listing.call_count)
+        result = out.getvalue().split("*" * 80)
+        self.assertEqual(['1', '3'], sorted(re.findall(r'\d+', result[1])))
+        self.assertEqual(['2', '4'], sorted(re.findall(r'\d+', result[2])))
+
+    @mock.patch("octant.front.main.sys.exit")
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("octant.front.parser.open")
+    def test_main_magic(self, mock_open, mock_cfg, mock_src1, mock_src2,
+                        mock_exit):
+        standard_cfg(mock_cfg)
+        mock_cfg.time = False
+        mock_cfg.magic = True
+        mock_cfg.query = ["r(2, X)", "r(X, 2)"]
+        mock.mock_open(
+            mock=mock_open,
+            read_data="e(1, 2). e(2, 3). e(3, 4). "
+            "r(X, Y) :- e(X, Y). r(X, Z) :- r(X, Y), e(Y, Z).")
+        with base.capture_stdout() as out:
+            octant.main()
+        result = out.getvalue().split("*" * 80)
+        self.assertEqual(['3', '4'], sorted(re.findall(r'\d+', result[1])[1:]))
+        self.assertEqual(['1'], re.findall(r'\d+', result[2])[1:])
+
+    @mock.patch("octant.front.main.sys.exit")
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    @mock.patch("octant.front.parser.open")
+    def test_main_stats(self, mock_open, mock_cfg, mock_src1, mock_src2,
+                        mock_exit):
+        standard_cfg(mock_cfg)
+        mock_cfg.time = False
+        mock_cfg.stats = '-'
+        mock_cfg.query = ["p(X)", "r(X)"]
+        mock.mock_open(mock=mock_open, read_data="p(3452). r(X) :- p(X).")
+        with base.capture_stdout() as out:
+            octant.main()
+        result = out.getvalue()
+        stats = json.loads(result[result.index('{'):])
+        for phase in ['parse', 'compile', 'typecheck', 'retrieval', 'facts',
+                      'rules', 'saturation', 'decode:p']:
+            self.assertIn(phase, stats['phases'])
+        self.assertEqual(2, stats['counters']['rules'])
+
     @mock.patch("octant.front.main.sys.exit")
     @mock.patch("octant.source.openstack_source.register")
     @mock.patch("octant.source.skydive_source.register")
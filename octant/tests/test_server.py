@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_server
+----------------------------------
+
+Tests for the octant daemon.
+"""
+
+import mock
+
+from octant.common import base as obase
+from octant.datalog import theory
+from octant.front import parser
+from octant.front import server
+from octant.tests import base
+from octant.tests import test_datalog_theory as ttheory
+
+
+def mocked_register(ds):
+    content = {
+        "q": (
+            lambda s: list(mocked_register.rows),
+            {"a": ("int", lambda s: s)})
+    }
+    ds.register({}, content)
+
+
+class TestServer(base.TestCase):
+    """Test the query service of the daemon"""
+
+    @mock.patch("octant.source.openstack_source.register", new=mocked_register)
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_query_and_refresh(self, mock_cfg, src1):
+        ttheory.standard_cfg(mock_cfg)
+        mocked_register.rows = [3, 4]
+        theo = theory.Z3Theory(parser.wrapped_parse("p(X) :- q(a=X)."))
+        theo.build_theory()
+        service = server.QueryService(theo)
+        result = service.query(["p(X)", "p(4)"])
+        self.assertEqual(
+            [{'query': 'p(X)', 'variables': ['X'],
+              'answers': [{'base': [3]}, {'base': [4]}]},
+             {'query': 'p(4)', 'variables': [], 'answers': True}],
+            result)
+        mocked_register.rows = [5]
+        self.assertEqual(
+            {'refreshed': True, 'changes': {'q': {'added': 1, 'removed': 2}}},
+            service.refresh())
+        result = service.query(["p(X)"])
+        self.assertEqual([{'base': [5]}], result[0]['answers'])
+
+    @mock.patch("octant.source.openstack_source.register")
+    @mock.patch("octant.source.skydive_source.register")
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_query_errors(self, mock_cfg, src1, src2):
+        ttheory.standard_cfg(mock_cfg)
+        theo = theory.Z3Theory(parser.wrapped_parse("p(3:int4)."))
+        theo.build_theory()
+        service = server.QueryService(theo)
+        self.assertRaises(
+            obase.Z3NotWellFormed, service.query, ["r(X)"])
+        with base.capture_stdout():
+            self.assertRaises(obase.Z3ParseError, service.query, ["p("])
+
+    def test_error_message(self):
+        self.assertEqual(
+            "Type error: bad",
+            server.error_message(obase.Z3TypeError("bad")))
+        self.assertEqual(
+            "Parser error in query.",
+            server.error_message(obase.Z3ParseError("1 errors")))
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_source_backup
+----------------------------------
+
+Tests for the csv format of backups
+"""
+
+import os
+import shutil
+import tempfile
+
+from octant.common import base as obase
+from octant.common import primitives
+from octant.source import backup
+from octant.tests import base
+
+
+BACKUP = (
+    'T1,a,b\r\n'
+    'T1,x,1\r\n'
+    'T1,"multi\r\nline ""quoted""",2\r\n'
+    'T2,c\r\n'
+    'T2,y\r\n'
+    'T3,d\r\n')
+
+
+class TestCsvBackup(base.TestCase):
+    """Read csv backups"""
+
+    def setUp(self):
+        super(TestCsvBackup, self).setUp()
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder)
+        self.filename = os.path.join(folder, 'backup.csv')
+        with open(self.filename, 'wb') as fd:
+            fd.write(BACKUP.encode('utf-8'))
+        self.string = primitives.StringType('string')
+        self.int = primitives.NumType('int')
+
+    def test_index(self):
+        reader = backup.CsvBackupReader(self.filename)
+        try:
+            self.assertEqual(['T1', 'T2', 'T3'], sorted(reader.tables))
+            (start, end) = reader.tables['T2']
+            self.assertEqual(reader.tables['T1'][1], start)
+            self.assertEqual(reader.tables['T3'][0], end)
+        finally:
+            reader.close()
+
+    def test_rows(self):
+        reader = backup.CsvBackupReader(self.filename)
+        try:
+            self.assertEqual(
+                [['y']],
+                list(reader.rows('T2', ['c'], [self.string])))
+            self.assertEqual(
+                [['1', 'x'], ['2', 'multi\r\nline "quoted"']],
+                list(reader.rows('T1', ['b', 'a'], [self.int, self.string])))
+            self.assertEqual([], list(reader.rows('T3', ['d'], [self.int])))
+            self.assertEqual([], list(reader.rows('T4', [], [])))
+        finally:
+            reader.close()
+
+    def test_missing_field(self):
+        reader = backup.CsvBackupReader(self.filename)
+        try:
+            self.assertRaises(
+                obase.Z3NotWellFormed,
+                reader.rows, 'T2', ['a'], [self.string])
+            self.assertRaises(
+                obase.Z3NotWellFormed,
+                reader.rows, 'T4', ['a'], [self.string])
+        finally:
+            reader.close()
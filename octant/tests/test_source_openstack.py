@@ -529,6 +529,22 @@ class TestSourceOpenstack(base.TestCase):
         for mck in mock_list:
             mck.assert_called_once()
 
+    def test_shared_listings(self):
+        conn = MockSession()
+        calls = []
+        ports = conn.network.ports
+
+        def counted_ports():
+            calls.append(1)
+            return ports()
+
+        conn.network.ports = counted_ports
+        cached = datasource.ListingCache(conn)
+        for name in ["port", "port_ip", "port_sg"]:
+            (access_rows, _) = source.OPENSTACK_TABLES[name]
+            list(access_rows(cached))
+        self.assertEqual(1, len(calls))
+
     def test_port_min(self):
         self.assertEqual(0, source.port_min(None))
         self.assertEqual(2, source.port_min(2))
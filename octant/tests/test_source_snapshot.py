@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+# Copyright 2019 Orange
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""
+test_source_snapshot
+----------------------------------
+
+Tests for the binary snapshot format of backups
+"""
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from octant.common import base as obase
+from octant.common import primitives
+from octant.source import backup
+from octant.source import snapshot
+from octant.source import source
+from octant.tests import base
+
+
+class TestSnapshot(base.TestCase):
+    """Write and read back snapshots"""
+
+    def setUp(self):
+        super(TestSnapshot, self).setUp()
+        self.folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.folder)
+        self.filename = os.path.join(self.folder, 'backup.snap')
+
+    def test_column_kind(self):
+        self.assertEqual('bool', snapshot.column_kind([True, False]))
+        self.assertEqual('int', snapshot.column_kind([1, -2]))
+        self.assertEqual('int', snapshot.column_kind([1, None]))
+        self.assertEqual('bool', snapshot.column_kind([False, None]))
+        self.assertEqual('marshalled', snapshot.column_kind([1 << 70]))
+        self.assertEqual('marshalled', snapshot.column_kind([1, 'a']))
+        self.assertEqual('str', snapshot.column_kind(['a', None]))
+
+    def test_roundtrip(self):
+        writer = snapshot.SnapshotWriter(self.filename)
+        writer.add_table('t1', ['a', 'b', 'c'], [None] * 3)
+        writer.add_row('t1', ['x', 1, True])
+        writer.add_row('t1', [None, -7, False])
+        writer.add_row('t1', [u'é', 3, True])
+        writer.add_table('t2', ['d'], [None])
+        writer.add_row('t2', ['x'])
+        writer.close()
+        reader = snapshot.SnapshotReader(self.filename)
+        try:
+            self.assertEqual(
+                [[1, 'x'], [-7, None], [3, u'é']],
+                list(reader.rows('t1', ['b', 'a'], [None, None])))
+            self.assertEqual([[True], [False], [True]],
+                             list(reader.rows('t1', ['c'], [None])))
+            self.assertEqual([['x']], list(reader.rows('t2', ['d'], [None])))
+            self.assertEqual([], list(reader.rows('t3', [], [])))
+            self.assertRaises(
+                obase.Z3NotWellFormed, reader.rows, 't2', ['a'], [None])
+        finally:
+            reader.close()
+
+    def test_roundtrip_none(self):
+        types = [primitives.BoolType(), primitives.NumType('int', size=8),
+                 primitives.NumType('int', size=8)]
+        rows = [[False, None, 1 << 70], [None, 3, None], [True, -1, 2]]
+        writer = snapshot.SnapshotWriter(self.filename)
+        writer.add_table('t1', ['a', 'b', 'c'], types)
+        for row in rows:
+            writer.add_row('t1', row)
+        writer.close()
+        reader = snapshot.SnapshotReader(self.filename)
+        try:
+            columns = reader.tables['t1']['columns']
+            self.assertEqual(
+                ['bool', 'int', 'marshalled'],
+                [columns[field]['kind'] for field in ['a', 'b', 'c']])
+            restored = list(reader.rows('t1', ['a', 'b', 'c'], types))
+            self.assertEqual([[False, None], [None, 3], [True, -1]],
+                             [row[:2] for row in restored])
+            self.assertEqual(
+                [1 << 70, None, 2],
+                [None if row[2] is None else int(row[2])
+                 for row in restored])
+        finally:
+            reader.close()
+
+    def test_lazy_strings(self):
+        writer = snapshot.SnapshotWriter(self.filename)
+        writer.add_table('t1', ['a', 'b'], [None, None])
+        writer.add_row('t1', ['x', 'y'])
+        writer.add_row('t1', ['x', 'z'])
+        writer.close()
+        reader = snapshot.SnapshotReader(self.filename)
+        try:
+            self.assertEqual(3, reader.pool['count'])
+            list(reader.rows('t1', ['a'], [None]))
+            self.assertEqual({0: 'x'}, reader.strings)
+        finally:
+            reader.close()
+
+    def test_bad_magic(self):
+        with open(self.filename, 'wb') as fd:
+            fd.write(b'\0' * 32)
+        self.assertRaises(
+            obase.Z3SourceError, snapshot.SnapshotReader, self.filename)
+
+    def test_dispatch(self):
+        self.assertIsInstance(
+            backup.open_writer(self.filename), snapshot.SnapshotWriter)
+        csv_name = os.path.join(self.folder, 'backup.csv')
+        writer = backup.open_writer(csv_name)
+        self.assertIsInstance(writer, backup.CsvBackupWriter)
+        writer.close()
+        self.assertIsInstance(
+            backup.open_reader(csv_name), backup.CsvBackupReader)
+
+    @mock.patch("oslo_config.cfg.CONF")
+    def test_save_restore(self, mock_conf):
+        types = {
+            'string': primitives.StringType('string', size=8),
+            'int': primitives.NumType('int', size=8),
+            'bool': primitives.BoolType()}
+        rows = [('a', 1, False), (None, 2, None), ('b', 3, True)]
+        content = {
+            'T': (
+                lambda s: rows,
+                {'s': ('string', lambda r: r[0]),
+                 'i': ('int', lambda r: r[1]),
+                 'b': ('bool', lambda r: r[2])})}
+        for name in ['backup.snap', 'backup.csv']:
+            filename = os.path.join(self.folder, name)
+            saved = []
+            restored = []
+            mock_conf.save = filename
+            mock_conf.restore = None
+            src = source.Datasource(types)
+            src.register({}, content)
+            with src:
+                src.retrieve_table('T', ['i', 's', 'b'], saved.append)
+            mock_conf.save = None
+            mock_conf.restore = filename
+            src = source.Datasource(types)
+            src.register({}, content)
+            with src:
+                src.retrieve_table('T', ['i', 's', 'b'], restored.append)
+            self.assertEqual(saved, restored)
@@ -91,6 +91,30 @@ class TestZ3Result(base.TestCase):
             obase.Z3NotWellFormed,
             lambda: z3r.z3_to_array(z3.Or(x > 2, x < 1), types))
 
+    def test_split_answer(self):
+        fp = z3.Fixedpoint()
+        fp.set(engine='datalog')
+        s = z3.BitVecSort(4)
+        a = z3.Function('a', s, z3.BoolSort())
+        b = z3.Function('b', s, s, z3.BoolSort())
+        fp.register_relation(a, b)
+        self.assertEqual(z3.unsat, fp.query(a, b))
+        self.assertEqual(
+            [True, True],
+            [z3.is_false(e) for e in z3r.split_answer(fp.get_answer(), 2)])
+        fp.fact(b(z3.BitVecVal(3, s), z3.BitVecVal(4, s)))
+        fp.query(a, b)
+        answers = z3r.split_answer(fp.get_answer(), 2)
+        self.assertEqual(True, z3.is_false(answers[0]))
+        self.assertEqual(
+            [{'X': 3, 'Y': 4}],
+            [{v: e.as_long() for (v, e) in row.items()}
+             for row in z3r.z3_to_array_simple(answers[1], ['X', 'Y'])])
+        self.assertEqual([answers[1]], z3r.split_answer(answers[1], 1))
+        self.assertRaises(
+            obase.Z3NotWellFormed,
+            lambda: z3r.split_answer(answers[1], 3))
+
     def test_z3_to_array_doc(self):
         s = z3.BitVecSort(8)
         s2 = z3.BitVecSort(2)
@@ -0,0 +1,279 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Runs benchmark scenarios and compares results
+
+Usage::
+
+    python -m octant_benchmark.runner run --sizes 0 10 100 -o new.json
+    python -m octant_benchmark.runner compare old.json new.json
+
+Each scenario is run several times in the same process. Each run measures
+separately the parsing of the theory, its compilation, the construction of
+the Z3 theory with Z3Theory.build_theory and each query. The construction
+is also detailed with the phases the theory records: the retrieval of the
+data (from a backup of the synthetic cloud), the loading of the facts and
+the construction of the rules. The results are stored as JSON with the
+minimum and median times of each phase.
+"""
+
+from __future__ import print_function
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from oslo_config import cfg
+import z3
+
+import octant
+from octant.common import instrumentation as instr
+from octant.common import primitives
+from octant.datalog import theory as datalog_theory
+from octant.front import options  # noqa: F401 (registers the options)
+from octant.front import parser
+from octant_benchmark import scenarios as scn
+
+#: Phases of Z3Theory.build_theory reported separately
+BUILD_PHASES = ['retrieval', 'facts', 'rules']
+PHASES = ['parse', 'compile', 'build'] + BUILD_PHASES
+
+
+def configure(scenario, backup, theory_file, queries):
+    """Sets the octant options for a scenario"""
+    overrides = {
+        'theory': [theory_file], 'query': queries, 'restore': backup,
+        'doc': scenario.doc, 'unfold': scenario.unfold,
+        'spec': scenario.spec, 'ipsize': scenario.ipsize, 'workers': 1}
+    for (name, value) in overrides.items():
+        cfg.CONF.set_override(name, value)
+    cfg.CONF.set_override('enabled', True, group='openstack')
+    primitives.TYPES['ip_address'] = (
+        primitives.IpAddressType(size=scenario.ipsize))
+
+
+def run_once(theory_file, queries):
+    """Runs all the phases once
+
+    :return: a dictionary from phase names to pairs of wall clock and CPU
+        time and the number of answers of each query.
+    """
+    # The phases of the runner are recorded apart: the theory records its
+    # own phases (some with the same names) in the shared instrumentation.
+    timer = instr.Instrumentation()
+    with timer.phase('parse'):
+        rules = parser.parse_file(theory_file)
+    with timer.phase('compile'):
+        theory = datalog_theory.Z3Theory(rules)
+    instr.reset()
+    with timer.phase('build'):
+        theory.build_theory()
+    # Details of the construction are the phases recorded by the theory.
+    build_phases = instr.report()['phases']
+    answers = {}
+    for query in queries:
+        with timer.phase('query:' + query):
+            _, answer = theory.query(parser.parse_atom(query))
+        answers[query] = len(answer) if isinstance(answer, list) else answer
+    phases = timer.report()['phases']
+    for name in BUILD_PHASES:
+        if name in build_phases:
+            phases[name] = build_phases[name]
+    times = {
+        name: (record['wall'], record['cpu'])
+        for (name, record) in phases.items()}
+    return times, answers
+
+
+def summarize(samples):
+    """Minimum and median of a list of (wall, cpu) samples"""
+    result = {}
+    for (pos, kind) in enumerate(['wall', 'cpu']):
+        values = sorted(sample[pos] for sample in samples)
+        result[kind] = {
+            'min': values[0],
+            'median': values[len(values) // 2],
+            'samples': values}
+    return result
+
+
+def run_scenario(scenario, backup, theory_file, queries, repeat):
+    """Runs a scenario several times
+
+    :return: a JSON compatible description of the results
+    """
+    configure(scenario, backup, theory_file, queries)
+    samples = {}
+    answers = None
+    for _ in range(repeat):
+        times, answers = run_once(theory_file, queries)
+        for (phase, sample) in times.items():
+            samples.setdefault(phase, []).append(sample)
+    result = scenario._asdict()
+    result['name'] = scn.scenario_name(scenario)
+    result['answers'] = answers
+    result['phases'] = {
+        phase: summarize(phase_samples)
+        for (phase, phase_samples) in samples.items()}
+    return result
+
+
+def git_revision():
+    """Current commit of the source tree if available"""
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], cwd=scn.ROOT,
+            stderr=subprocess.STDOUT).decode('ascii').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    """Runs all the scenarios selected by the command line"""
+    folder = tempfile.mkdtemp()
+    try:
+        backups = {}
+        for size in args.sizes:
+            backups[size] = os.path.join(folder, 'cloud-{}.csv'.format(size))
+            scn.deployment(size).dump(backups[size])
+        results = []
+        for scenario in scn.scenarios(
+                args.sizes, args.ipsizes, docs=args.doc,
+                unfolds=args.unfold, specs=args.spec):
+            print('Running {}'.format(scn.scenario_name(scenario)),
+                  file=sys.stderr)
+            results.append(run_scenario(
+                scenario, backups[scenario.size], args.theory, args.query,
+                args.repeat))
+    finally:
+        shutil.rmtree(folder)
+    report = {
+        'octant': octant.__version__,
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'z3': z3.get_version_string(),
+        'date': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'theory': args.theory,
+        'repeat': args.repeat,
+        'scenarios': results}
+    if args.output is None:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+    else:
+        with open(args.output, 'w') as fd:
+            json.dump(report, fd, indent=2, sort_keys=True)
+
+
+def compare_reports(old, new, threshold):
+    """Compares the median wall clock times of two reports
+
+    :param old: the reference report
+    :param new: the report to check
+    :param threshold: ratio above which a phase is reported as a regression
+    :return: a list of tuples (scenario, phase, old time, new time, ratio,
+        regression)
+    """
+    old_scenarios = {sc['name']: sc for sc in old['scenarios']}
+    lines = []
+    for scenario in new['scenarios']:
+        reference = old_scenarios.get(scenario['name'], None)
+        if reference is None:
+            continue
+        for (phase, stats) in sorted(scenario['phases'].items()):
+            if phase not in reference['phases']:
+                continue
+            before = reference['phases'][phase]['wall']['median']
+            after = stats['wall']['median']
+            ratio = after / before if before > 0 else float('inf')
+            lines.append(
+                (scenario['name'], phase, before, after, ratio,
+                 ratio > threshold))
+    return lines
+
+
+def compare(args):
+    """Prints the comparison of two reports"""
+    with open(args.old) as fd:
+        old = json.load(fd)
+    with open(args.new) as fd:
+        new = json.load(fd)
+    regressions = 0
+    for (name, phase, before, after, ratio, bad) in compare_reports(
+            old, new, args.threshold):
+        print('{:<40} {:<20} {:10.4f} {:10.4f} {:6.2f}{}'.format(
+            name, phase, before, after, ratio, ' REGRESSION' if bad else ''))
+        regressions += bad
+    return 1 if regressions else 0
+
+
+def boolean_list(text):
+    """Parses a comma separated list of on/off flags"""
+    return [item.strip() in ('1', 'on', 'true', 'yes')
+            for item in text.split(',')]
+
+
+def main(argv=None):
+    """Benchmark entry point"""
+    parser_ = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    commands = parser_.add_subparsers(dest='command')
+    run_parser = commands.add_parser('run', help='Run benchmark scenarios')
+    run_parser.add_argument(
+        '--sizes', type=int, nargs='+', default=[0, 10, 100],
+        help='Number of additional networks of the synthetic clouds')
+    run_parser.add_argument(
+        '--ipsizes', type=int, nargs='+', default=[8, 32],
+        help='Sizes of ip addresses')
+    run_parser.add_argument(
+        '--doc', type=boolean_list, default=[False, True],
+        help='Use DoC (comma separated list of on/off)')
+    run_parser.add_argument(
+        '--unfold', type=boolean_list, default=[True, False],
+        help='Unfold rules with DoC (comma separated list of on/off)')
+    run_parser.add_argument(
+        '--spec', type=boolean_list, default=[True, False],
+        help='Specialize predicates with DoC '
+        '(comma separated list of on/off)')
+    run_parser.add_argument(
+        '--theory', default=scn.THEORY, help='Theory file')
+    run_parser.add_argument(
+        '--query', nargs='+', default=scn.QUERIES, help='Queries')
+    run_parser.add_argument(
+        '--repeat', type=int, default=3, help='Number of runs per scenario')
+    run_parser.add_argument(
+        '-o', '--output', default=None, help='Output file (JSON)')
+    compare_parser = commands.add_parser(
+        'compare', help='Compare two benchmark results')
+    compare_parser.add_argument('old', help='Reference results')
+    compare_parser.add_argument('new', help='New results')
+    compare_parser.add_argument(
+        '--threshold', type=float, default=1.2,
+        help='Ratio of median times reported as a regression')
+    args = parser_.parse_args(argv)
+    cfg.CONF([], project='octant')
+    if args.command == 'compare':
+        return compare(args)
+    if args.command == 'run':
+        run(args)
+        return 0
+    parser_.print_help()
+    return 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
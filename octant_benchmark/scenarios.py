@@ -0,0 +1,120 @@
+#    Copyright 2019 Orange
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Synthetic clouds and benchmark scenarios
+
+Clouds are generated with the topology generator of the simulator example.
+The base topology is the one of ``examples/simulator/test2.py``: five
+networks, three routers and six servers. The scale of the cloud is the
+number of additional networks routed through the routers. Each additional
+network adds a port and two routes.
+"""
+
+import collections
+import itertools
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIMULATOR = os.path.join(ROOT, 'examples', 'simulator')
+#: Default theory used by benchmarks
+THEORY = os.path.join(SIMULATOR, 'test.dtl')
+#: Default queries used by benchmarks
+QUERIES = ['result(X)']
+
+if SIMULATOR not in sys.path:
+    sys.path.append(SIMULATOR)
+
+import topology_gen as topo  # noqa: E402
+
+
+#: Without DoC, tables over ip addresses are explicit. Larger ip sizes are
+#: not tractable.
+MAX_PLAIN_IPSIZE = 10
+
+Scenario = collections.namedtuple(
+    'Scenario', ['size', 'ipsize', 'doc', 'unfold', 'spec'])
+
+
+def scenario_name(scenario):
+    """A short unique name for a scenario"""
+    flags = [
+        flag for (flag, on) in [
+            ('doc', scenario.doc), ('unfold', scenario.unfold),
+            ('spec', scenario.spec)]
+        if on]
+    return 'size={},ipsize={},{}'.format(
+        scenario.size, scenario.ipsize, '+'.join(flags) or 'plain')
+
+
+def deployment(size):
+    """Builds a deployment with size additional networks
+
+    :param size: the number of additional networks
+    :return: a topology_gen Deployment
+    """
+    aux_nets = [
+        topo.Network('AN{}'.format(i), (256 + i) * 256, offset=8)
+        for i in range(size)]
+    aux_routes_net = [('AN{}'.format(i), 10) for i in range(size)]
+    aux_routes_router = [('AN{}'.format(i), 'N4', 10) for i in range(size)]
+    aux_ports = [topo.Port('AN{}'.format(i), 1) for i in range(size)]
+    descr = [
+        topo.Network('N1', 1, routes=[('N3', 10)]),
+        topo.Network('N2', 2),
+        topo.Network('N3', 3),
+        topo.Network('N4', 4, routes=[('N5', 10)] + aux_routes_net),
+        topo.Network('N5', 5),
+        topo.Router(
+            'R1', [topo.Port('N1', 1), topo.Port('N2', 1), topo.Port('N4', 1)],
+            routes=[('N5', 'N4', 10)] + aux_routes_router),
+        topo.Router('R2', [topo.Port('N1', 10), topo.Port('N3', 1)]),
+        topo.Router(
+            'R3', [topo.Port('N4', 10), topo.Port('N5', 1)] + aux_ports),
+        topo.Server('M1', [topo.Port('N1', 21, ["SG1"])]),
+        topo.Server('M2', [topo.Port('N2', 22, ["SG1"])]),
+        topo.Server('M3', [topo.Port('N4', 23, ["SG1"])]),
+        topo.Server('M4', [topo.Port('N5', 24, ["SG1"])]),
+        topo.Server('M5', [topo.Port('N3', 25, ["SG1"])]),
+        topo.Server('M6', [topo.Port('N1', 26, ["SG1"])]),
+        topo.SG('SG1', [
+            topo.Rule(sg='SG1'), topo.Rule(dir='ingress', sg='SG1')])
+    ] + aux_nets
+    return topo.Deployment(descr, netsize=5)
+
+
+def scenarios(sizes, ipsizes, docs=(False, True), unfolds=(True, False),
+              specs=(True, False)):
+    """Enumerates scenarios
+
+    Unfolding and specialization are only used with DoC. Without DoC, only
+    one scenario is generated for each size and ip size and only for ip
+    sizes up to ``MAX_PLAIN_IPSIZE``.
+
+    :param sizes: the list of cloud sizes
+    :param ipsizes: the list of sizes of ip addresses
+    :param docs: the list of values for the doc option
+    :param unfolds: the list of values for the unfold option
+    :param specs: the list of values for the spec option
+    :return: a list of scenarios
+    """
+    result = []
+    for (size, ipsize, doc) in itertools.product(sizes, ipsizes, docs):
+        if doc:
+            result.extend(
+                Scenario(size, ipsize, True, unfold, spec)
+                for (unfold, spec) in itertools.product(unfolds, specs))
+        elif ipsize <= MAX_PLAIN_IPSIZE:
+            result.append(Scenario(size, ipsize, False, False, False))
+    return result